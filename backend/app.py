@@ -1,21 +1,47 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, send_file, stream_with_context, url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from datetime import datetime, timezone
 from flask_jwt_extended import (
-    JWTManager, create_access_token, jwt_required, get_jwt_identity
+    JWTManager, create_access_token, current_user, jwt_required, get_jwt_identity
 )
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-from backend.models import db, User, ParkingLot, ParkingSpot, Reservation
+from itsdangerous import BadSignature, SignatureExpired
+from backend.models import (
+    db, User, ParkingLot, ParkingSpot, Reservation, ReservationArchive,
+    ReservationMonthlyRollup
+)
+from backend.reports import (
+    add_to_monthly_rollup, completed_revenue_by_month, ongoing_revenue_by_lot,
+    rebuild_monthly_rollup, rollup_month, user_month_summary
+)
+from backend.outbox import enqueue_task
+from backend.identity import identity_cache, load_identity
+from backend.metrics import init_metrics
+from backend.query_budget import init_query_budgets, query_budget
+from backend.slow_queries import init_slow_query_log, slow_query_log
+from backend.profiling import (
+    TOKEN_MAX_AGE as PROFILE_TOKEN_MAX_AGE, PROFILE_HEADER, PROFILE_PARAM,
+    init_profiling, list_profiles, make_profile_token, profile_file, pstats_text
+)
+from backend.billing import billed_cost, billed_hours, duration_seconds, release_values
+from backend.export import (
+    LINK_MAX_AGE, export_chunks, export_filename, export_mimetype,
+    load_export_token, make_export_token
+)
+from backend.streaming import YIELD_PER, stream_json, wants_stream
+from backend.pagination import (
+    PaginationError, decode_cursor, paginate, parse_datetime, parse_id, parse_limit
+)
 from flask import request
-import math
-from sqlalchemy import func
-from math import ceil
+from sqlalchemy import Float, String, func, literal, select, union_all, update
+from sqlalchemy.exc import IntegrityError
 import traceback
+import os
+import click
 from datetime import datetime, timezone
-from math import ceil
 from flask_jwt_extended import get_jwt, verify_jwt_in_request
 from flask import Flask
 from flask_mail import Mail
@@ -38,13 +64,40 @@ MAIL_USE_TLS=False,
     MAIL_DEFAULT_SENDER='sugisubramanii@gmail.com'
 )
 
+# Pooled SMTP delivery for the Celery mail tasks (see backend/mailer.py)
+app.config.update(
+    MAIL_POOL_MAX_MESSAGES=100,     # recycle the connection after this many sends
+    MAIL_POOL_KEEPALIVE=30,         # NOOP-check a connection idle this long (s)
+    MAIL_POOL_MAX_IDLE=240,         # reconnect outright after this long idle (s)
+    MAIL_MICRO_BATCH=os.environ.get('MAIL_MICRO_BATCH') == '1',
+    MAIL_BATCH_SIZE=50,
+    MAIL_BATCH_WINDOW=2,            # seconds booking/release mail may wait
+    MAIL_QUEUE_URL=os.environ.get('MAIL_QUEUE_URL', 'redis://localhost:6379/0'),
+)
+
 mail = Mail(app)
 
 # ----- Configuration -----
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///parking.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///parking.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'super-secret-key'
 
+# Slow-query log (see backend/slow_queries.py); off unless SLOW_QUERY_LOG=1
+app.config.update(
+    SLOW_QUERY_LOG=os.environ.get('SLOW_QUERY_LOG') == '1',
+    SLOW_QUERY_THRESHOLD_MS=float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100)),
+    SLOW_QUERY_EXPLAIN=True,        # capture EXPLAIN QUERY PLAN on SQLite
+    SLOW_QUERY_LOG_PARAMS=os.environ.get('SLOW_QUERY_LOG_PARAMS') == '1',   # record parameter values too
+)
+
+# On-demand request profiling (see backend/profiling.py); off unless PROFILING_ENABLED=1
+app.config.update(
+    PROFILING_ENABLED=os.environ.get('PROFILING_ENABLED') == '1',
+    PROFILER=os.environ.get('PROFILER', 'auto'),    # auto | sampling | cprofile
+    PROFILE_DIR=os.environ.get('PROFILE_DIR'),      # default: <instance path>/profiles
+    PROFILE_KEEP=50,                                # newest profiles kept on disk
+)
+
 
 # CORS config
 CORS(app,
@@ -55,9 +108,28 @@ CORS(app,
 
 # ----- Initialize Extensions -----
 db.init_app(app)                  
+init_metrics(app, db)             # first, so every request is timed
+init_query_budgets(app, db)
+init_slow_query_log(app, db)
+init_profiling(app)
 migrate = Migrate(app, db)
 jwt = JWTManager(app)
 
+
+@jwt.user_lookup_loader
+def load_current_user(_jwt_header, jwt_data):
+    """Resolve the token's user once per request (cached, see backend/identity.py)."""
+    try:
+        user_id = int(jwt_data['sub'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return load_identity(user_id)
+
+
+@jwt.user_lookup_error_loader
+def current_user_not_found(_jwt_header, jwt_data):
+    return jsonify({"msg": "User not found"}), 401
+
 # ----- Handle CORS Preflight -----
 @app.before_request
 def handle_options_request():
@@ -93,14 +165,11 @@ def create_admin_once():
 def admin_required_route(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        # Enforce JWT + admin role
-        try:
-            user_id = int(get_jwt_identity())
-        except (TypeError, ValueError):
-            return jsonify({"msg": "Invalid token identity"}), 400
-
-        user = User.query.get(user_id)
-        if not user or user.role != 'admin':
+        # Enforce JWT + admin role. The token's role claim is signed at
+        # login and roles never change afterwards, so no DB lookup is needed;
+        # the user lookup loader has already checked the user still exists.
+        role = get_jwt().get('role') or current_user.role
+        if role != 'admin':
             return jsonify({"msg": "Admin access required"}), 403
 
         # Call the original view without injecting user_id
@@ -134,10 +203,12 @@ def user_required(fn):
 # ============================
 
 @app.route('/')
+@query_budget(0)
 def home():
     return jsonify({"msg": "Parking App API is running"})
 
 @app.route('/test-email')
+@query_budget(0)
 def test_email():
     try:
         msg = Message(
@@ -153,6 +224,7 @@ def test_email():
 
 # ✅ 2. Patch your /register route to issue role in JWT
 @app.route('/register', methods=['POST'])
+@query_budget(3)
 def register():
     data = request.get_json() or {}
 
@@ -192,27 +264,27 @@ def register():
 
 
 @app.route('/admin/lots/<int:lot_id>', methods=['DELETE'])
+@query_budget(8)
 @jwt_required()
 @admin_required_route
 def delete_parking_lot(lot_id):
     try:
-        lot = ParkingLot.query.filter_by(
-            id=lot_id,
-            created_by=int(get_jwt_identity())
-        ).first()
-        if not lot:
+        owned = db.session.query(
+            select(ParkingLot.id)
+            .where(ParkingLot.id == lot_id,
+                   ParkingLot.created_by == int(get_jwt_identity()))
+            .exists()
+        ).scalar()
+        if not owned:
             return jsonify(msg='Lot not found'), 404
 
         # ensure no occupied spots
-        if any(spot.is_reserved for spot in lot.spots):
+        if lot_in_use(lot_id):
             return jsonify(msg='Cannot delete a lot with reserved spots'), 400
 
-        # delete all spots/reservations if you need, or rely on cascade
-        for spot in lot.spots:
-            db.session.delete(spot)
-        db.session.delete(lot)
+        archived = archive_and_delete_lot(lot_id)
         db.session.commit()
-        return jsonify(msg='Lot deleted'), 200
+        return jsonify(msg='Lot deleted', archived_reservations=archived), 200
 
     except Exception as e:
         traceback.print_exc()              # prints full stack to your console
@@ -221,6 +293,7 @@ def delete_parking_lot(lot_id):
 
 # ✅ 3. Patch your /login route to also include role in the JWT
 @app.route('/login', methods=['POST'])
+@query_budget(1)
 def login():
     data = request.get_json() or {}
 
@@ -244,6 +317,7 @@ def login():
 
 
 @app.route('/admin/lots', methods=['POST'])
+@query_budget(4)
 @jwt_required()
 @admin_required_route
 def create_parking_lot():
@@ -262,21 +336,18 @@ def create_parking_lot():
             price_per_hour = float(data['price']),
             created_by     = int(get_jwt_identity())
         )
+        max_spots = int(data['maxSpots'])
+        if not 0 <= max_spots <= MAX_SPOTS_PER_REQUEST:
+            return jsonify(msg=f"maxSpots must be between 0 and {MAX_SPOTS_PER_REQUEST}"), 400
+        lot.total_spots     = max_spots
+        lot.available_spots = max_spots
         db.session.add(lot)
-        db.session.commit()    # flush so lot.id is assigned
+        db.session.flush()     # assign lot.id
 
-        # 2) Create each spot under that lot
-        max_spots = int(data['maxSpots'])
-        spots = []
-        for i in range(1, max_spots + 1):
-            spot = ParkingSpot(
-                lot_id      = lot.id,
-                spot_number = i
-            )
-            spots.append(spot)
-            db.session.add(spot)
+        # 2) Bulk-insert its spots in the same transaction
+        insert_spot_range(lot.id, 1, max_spots)
 
-        db.session.commit()    # persist all spots
+        db.session.commit()    # lot and spots together
 
         return jsonify(msg="Lot created", lot_id=lot.id), 201
 
@@ -286,6 +357,7 @@ def create_parking_lot():
 
 
 @app.route('/admin/lots/<int:lot_id>/spots', methods=['POST'])
+@query_budget(5)
 @jwt_required()
 @admin_required_route
 def create_spot(lot_id):
@@ -295,22 +367,81 @@ def create_spot(lot_id):
 
     if not number:
         return jsonify({"msg": "Spot number required"}), 400
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        return jsonify({"msg": "Spot number must be an integer"}), 400
 
     lot = ParkingLot.query.get(lot_id)
     if not lot:
         return jsonify({"msg": "Parking lot not found"}), 404
 
-    for spot in lot.spots:
-        if spot.spot_number == number:
-            return jsonify({"msg": "Spot number already exists in this lot"}), 400
+    if spot_numbers_taken(lot.id, number, number):
+        return jsonify({"msg": "Spot number already exists in this lot"}), 400
 
-    spot = ParkingSpot(spot_number=number, lot=lot)
-    db.session.add(spot)
-    db.session.commit()
+    insert_spot_range(lot.id, number, number)
+    adjust_lot_counters(lot.id, total=1, available=1)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"msg": "Spot number already exists in this lot"}), 400
 
     return jsonify({"msg": "Parking spot created"}), 201
 
+
+@app.route('/admin/lots/<int:lot_id>/spots/range', methods=['POST'])
+@query_budget(6)
+@jwt_required()
+@admin_required_route
+def create_spot_range(lot_id):
+    """
+    Append a contiguous block of spots in one bulk INSERT.
+
+    Body: {"start": first, "end": last} (inclusive), or {"count": n} to
+    number n new spots on from the lot's current highest spot number.
+    """
+    data = request.get_json() or {}
+
+    lot = ParkingLot.query.get(lot_id)
+    if not lot:
+        return jsonify({"msg": "Parking lot not found"}), 404
+
+    try:
+        if 'count' in data:
+            count = int(data['count'])
+            highest = (
+                db.session.query(func.max(ParkingSpot.spot_number))
+                .filter(ParkingSpot.lot_id == lot.id)
+                .scalar()
+            ) or 0
+            start, end = highest + 1, highest + count
+        else:
+            start, end = int(data['start']), int(data['end'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"msg": "Provide integer 'start' and 'end', or 'count'"}), 400
+
+    count = end - start + 1
+    if start < 1 or count < 1:
+        return jsonify({"msg": "Spot numbers must be positive and start <= end"}), 400
+    if count > MAX_SPOTS_PER_REQUEST:
+        return jsonify({"msg": f"At most {MAX_SPOTS_PER_REQUEST} spots per request"}), 400
+
+    if spot_numbers_taken(lot.id, start, end):
+        return jsonify({"msg": "Some spot numbers in this range already exist"}), 400
+
+    insert_spot_range(lot.id, start, end)
+    adjust_lot_counters(lot.id, total=count, available=count)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"msg": "Some spot numbers in this range already exist"}), 400
+
+    return jsonify({"msg": "Parking spots created", "start": start, "end": end, "created": count}), 201
+
 @app.route('/admin/lots/<int:lot_id>/spot/<int:spot_id>', methods=['GET'])
+@query_budget(5)
 @jwt_required()
 @admin_required_route
 def get_spot_details(lot_id, spot_id):
@@ -336,11 +467,7 @@ def get_spot_details(lot_id, spot_id):
     # make the stored start_time timezone-aware (treat stored UTC as UTC)
     start_aware = resv.start_time.replace(tzinfo=timezone.utc)
     now         = datetime.now(timezone.utc)
-    raw_hours = (now - start_aware).total_seconds() / 3600
-
-    billed_hours = max(1, ceil(raw_hours))
-
-    est_cost = round(billed_hours * spot.lot.price_per_hour, 2)
+    est_cost = calculate_cost(resv.start_time, now.replace(tzinfo=None), spot.lot.price_per_hour)
 
     user = resv.user
     return jsonify({
@@ -354,6 +481,7 @@ def get_spot_details(lot_id, spot_id):
 
 
 @app.route('/admin/spot/<int:spot_id>', methods=['DELETE'])
+@query_budget(6)
 @jwt_required()
 @admin_required_route
 def delete_parking_spot(spot_id):
@@ -365,6 +493,7 @@ def delete_parking_spot(spot_id):
         if spot.is_reserved:
             return jsonify(msg='Cannot delete a reserved spot'), 400
 
+        adjust_lot_counters(spot.lot_id, total=-1, available=-1)
         db.session.delete(spot)
         db.session.commit()
         return jsonify(msg='Spot deleted'), 200
@@ -376,29 +505,8 @@ def delete_parking_spot(spot_id):
 
 
 
-@app.route('/admin/lots/<int:lot_id>', methods=['DELETE'])
-@jwt_required()
-@admin_required_route
-def delete_lot(lot_id):
-    admin_id = int(get_jwt_identity())
-    if request.method == 'OPTIONS':
-        return jsonify({"msg": "Preflight OK"}), 200
-
-    lot = ParkingLot.query.get(lot_id)
-    if not lot:
-        return jsonify({"msg": "Parking lot not found"}), 404
-
-    # Delete associated spots first
-    for spot in lot.spots:
-        db.session.delete(spot)
-
-    db.session.delete(lot)
-    db.session.commit()
-
-    return jsonify({"msg": f"Lot {lot.name} deleted"}), 200
-
-
 @app.route('/admin/lots/<int:lot_id>/spots/<int:spot_id>', methods=['PUT'])
+@query_budget(3)
 @jwt_required()
 @admin_required_route
 def edit_spot(lot_id, spot_id):
@@ -417,11 +525,15 @@ def edit_spot(lot_id, spot_id):
         db.session.commit()
     except ValueError:
         return jsonify(msg='Invalid number'), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(msg='Spot number already exists in this lot'), 400
 
     return jsonify(msg='Spot updated'), 200
 
 # DELETE a single spot
 @app.route('/admin/lots/<int:lot_id>/spots/<int:spot_id>', methods=['DELETE'])
+@query_budget(6)
 @jwt_required()
 @admin_required_route
 def delete_spot(lot_id, spot_id):
@@ -429,12 +541,14 @@ def delete_spot(lot_id, spot_id):
     if not spot:
         return jsonify(msg='Spot not found'), 404
 
+    adjust_lot_counters(lot_id, total=-1, available=0 if spot.is_reserved else -1)
     db.session.delete(spot)
     db.session.commit()
     return jsonify(msg='Spot deleted'), 200
 
 
 @app.route('/user/reserve', methods=['POST'], endpoint='user_confirm_reservation')
+@query_budget(4)
 @user_required
 def user_confirm_reservation():
     user_id = int(get_jwt_identity())
@@ -456,141 +570,161 @@ def user_confirm_reservation():
 
     reservation.vehicle_number = vehicle
     reservation.start_time = reservation.start_time or datetime.utcnow()
+    enqueue_task('tasks.send_reservation_email', resv_id, 'booked')
     db.session.commit()
 
-    # Prepare greeting name (fallback to email)
-    recipient_name = reservation.user.fullname
-
-    from backend.tasks.background import send_booking_email
-    send_booking_email.delay(
-    reservation.user.email,
-    f"""Dear {reservation.user.fullname},
-
-Your reservation has been successfully confirmed on ParkWise.
-
-• Spot Number: #{reservation.spot_id}  
-• Vehicle Number: {reservation.vehicle_number}  
-• Start Time: {reservation.start_time.strftime('%Y-%m-%d %H:%M:%S')}
-
-Please ensure your vehicle is parked within the reserved timeframe.  
-For any changes, visit your ParkWise dashboard.
-
-Thank you for choosing ParkWise!
+    return jsonify(msg='Booking confirmed'), 200
 
-Best regards,  
-The ParkWise Team"""
-)
 
-    return jsonify(msg='Booking confirmed'), 200
 
+def user_reservation_rows(user_id, status=None):
+    """
+    A user's reservations joined to spot and lot, plus their archived ones
+    from deleted lots, as one subquery. `status` narrows it to 'active'
+    (still parked) or 'history' (released; all archived ones are).
+    Unordered; callers add the ordering or pagination they need.
+    """
+    live = (
+        select(
+            Reservation.id,
+            Reservation.vehicle_number,
+            Reservation.start_time,
+            Reservation.end_time,
+            ParkingSpot.spot_number,
+            ParkingLot.name.label('lot_name'),
+            ParkingLot.location.label('lot_address'),
+            ParkingLot.price_per_hour,
+        )
+        .outerjoin(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .outerjoin(ParkingLot, ParkingLot.id == Reservation.lot_id)
+        .where(Reservation.user_id == user_id)
+    )
+    if status == 'active':
+        return live.where(Reservation.end_time.is_(None)).subquery()
+    if status == 'history':
+        live = live.where(Reservation.end_time.isnot(None))
+
+    # the lot is gone, so no address or rate to show
+    archived = select(
+        ReservationArchive.id,
+        ReservationArchive.vehicle_number,
+        ReservationArchive.start_time,
+        ReservationArchive.end_time,
+        ReservationArchive.spot_number,
+        ReservationArchive.lot_name,
+        literal(None, String).label('lot_address'),
+        literal(None, Float).label('price_per_hour'),
+    ).where(ReservationArchive.user_id == user_id)
+    return union_all(live, archived).subquery()
+
+
+def user_reservation_record(row):
+    """Shape one user_reservation_rows() row the way /user/dashboard returns it."""
+    return {
+        "reservation_id":  row.id,
+        "lot_name":        row.lot_name or "",
+        "lot_address":     row.lot_address or "",
+        "spot_number":     row.spot_number if row.spot_number is not None else "",
+        "vehicle_number":  row.vehicle_number,
+        "start_time":      row.start_time.isoformat(),
+        "end_time":        row.end_time.isoformat() if row.end_time else None,
+        "price_per_hour":  row.price_per_hour or 0
+    }
 
 
 @app.route('/user/dashboard', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def user_dashboard():
+    """
+    The user's profile header plus their reservations, newest first.
+
+    Query params: status (active|history), limit, cursor (from the
+    previous page's next_cursor). ?stream=1 streams every match instead.
+    """
+    user    = current_user
+    user_id = user.id
+
     try:
-        user_id = int(get_jwt_identity())
-    except (TypeError, ValueError):
-        return jsonify({"msg": "Invalid user identity"}), 400
+        limit  = parse_limit(request.args.get('limit'))
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except PaginationError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    status = request.args.get('status')
+    if status not in (None, '', 'active', 'history'):
+        return jsonify({"msg": "status must be 'active' or 'history'"}), 400
+
+    reservations = user_reservation_rows(user_id, status)
+    query = db.session.query(reservations)
+
+    if wants_stream():
+        rows = (
+            query
+            .order_by(reservations.c.start_time.desc(), reservations.c.id.desc())
+            .yield_per(YIELD_PER)
+        )
+        return stream_json(
+            'reservations',
+            (user_reservation_record(row) for row in rows),
+            envelope={'id': user.id, 'username': user.fullname, 'email': user.email}
+        )
 
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"msg": "User not found"}), 404
-
-    reservations = []
-    for res in Reservation.query.filter_by(user_id=user_id).all():
-        spot = ParkingSpot.query.get(res.spot_id)
-        lot  = ParkingLot.query.get(res.lot_id)
-
-        reservations.append({
-            "reservation_id":  res.id,
-            "lot_name":        lot.name if lot else "",
-            "lot_address": lot.location if lot else "",  # ✅ Correct
-            "spot_number":     spot.spot_number if spot else "",
-            "vehicle_number":  res.vehicle_number,                # ✅ fixed
-            "start_time":      res.start_time.isoformat(),
-            "end_time":        res.end_time.isoformat() if res.end_time else None,
-            "price_per_hour":  lot.price_per_hour if lot else 0
-        })
+    rows, next_cursor = paginate(
+        query, reservations.c.start_time, reservations.c.id, limit, cursor
+    )
 
     return jsonify({
         'id':          user.id,
         "username":    user.fullname,  # ✅ good call using fullname
-        "email":       user.email,  
-        "reservations": reservations
+        "email":       user.email,
+        "reservations": [user_reservation_record(row) for row in rows],
+        "next_cursor": next_cursor
     }), 200
 
 
 from flask import jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import func, cast, Integer
+from sqlalchemy import func
 from datetime import datetime
 
 @app.route('/user/summary', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def user_summary():
-    user_id = get_jwt_identity()
+    user_id = int(get_jwt_identity())
 
-    # Start of current month (UTC)
-    now = datetime.utcnow()
-    month_start = datetime(now.year, now.month, 1)
-
-    # Aggregate per lot: visits, total time, and cost
-    results = (
-        db.session.query(
-            ParkingLot.name.label('lot_name'),
-            func.count(Reservation.id).label('times_parked'),
-            func.sum(
-                cast(func.strftime('%s', Reservation.end_time), Integer)
-                - cast(func.strftime('%s', Reservation.start_time), Integer)
-            ).label('total_time_secs'),
-            func.sum(
-                (
-                    cast(func.strftime('%s', Reservation.end_time), Integer)
-                    - cast(func.strftime('%s', Reservation.start_time), Integer)
-                ) / 3600.0
-                * ParkingLot.price_per_hour
-            ).label('total_cost')
-        )
-        .join(Reservation, Reservation.lot_id == ParkingLot.id)
-        .filter(
-            Reservation.user_id == user_id,
-            Reservation.end_time.isnot(None),
-            Reservation.end_time >= month_start
-        )
-        .group_by(ParkingLot.id)
-        .all()
-    )
+    # Per lot for the current month (UTC): visits, total time, and cost
+    results = user_month_summary(user_id, rollup_month(datetime.utcnow()))
 
     # Shape the JSON response
     summary = []
     for row in results:
         summary.append({
             'lot_name':           row.lot_name,
-            'times_parked':       int(row.times_parked or 0),
-            'total_time_minutes': (row.total_time_secs or 0) / 60,
-            'total_cost':         round(row.total_cost or 0, 2),
+            'times_parked':       row.visits,
+            'total_time_minutes': row.total_seconds / 60,
+            'total_cost':         round(row.total_cost, 2),
         })
 
     return jsonify({ 'summary': summary }), 200
 
 
 @app.route('/user/lots', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_all_lots():
     lots = ParkingLot.query.all()
     result = []
 
     for lot in lots:
-        total_spots = len(lot.spots)
-        available_spots = len([s for s in lot.spots if not s.is_reserved])
         result.append({
             'id': lot.id,
             'name': lot.name,
             'location': lot.location,
             'pincode': lot.pincode,  # ✅ Add this line
-            'total_spots': total_spots,
-            'available_spots': available_spots,
+            'total_spots': lot.total_spots,
+            'available_spots': lot.available_spots,
             'price_per_hour': lot.price_per_hour
         })
 
@@ -598,6 +732,7 @@ def get_all_lots():
 
 
 @app.route('/user/release', methods=['POST'])
+@query_budget(13)   # 10, plus 3 where the rollup upsert is UPDATE + SAVEPOINT + INSERT
 @jwt_required()
 def release_reservation():
     try:
@@ -611,49 +746,24 @@ def release_reservation():
     reservation = Reservation.query.get(reservation_id)
     if not reservation or reservation.user_id != user_id:
         return jsonify({"msg": "Reservation not found or unauthorized"}), 404
-
-    spot = ParkingSpot.query.get(reservation.spot_id)
-    if spot:
-        spot.is_reserved = False
-
-    reservation.end_time = datetime.utcnow()
-
-    duration_hours = (reservation.end_time - reservation.start_time).total_seconds() / 3600
-    billed_hours = max(1, ceil(duration_hours))
+    if reservation.end_time is not None:
+        return jsonify({"msg": "Reservation already released"}), 409
 
     lot = ParkingLot.query.get(reservation.lot_id)
     if not lot:
         return jsonify({"msg": "Parking lot not found"}), 404
 
-    reservation.cost = round(billed_hours * lot.price_per_hour, 2)
+    if not close_reservation(reservation, datetime.utcnow(), lot.price_per_hour):
+        # a concurrent release closed it after we read it
+        db.session.rollback()
+        return jsonify({"msg": "Reservation already released"}), 409
+    enqueue_task('tasks.send_reservation_email', reservation.id, 'released')
     db.session.commit()
 
-    recipient_name = reservation.user.fullname
-
-    from backend.tasks.background import send_release_email
-    send_release_email.delay(
-    reservation.user.email,
-    f"""Dear {reservation.user.fullname},
-
-You've successfully released your reserved parking spot on ParkWise.
-
-• Spot Number: #{reservation.spot_id}  
-• Duration Parked: {round(duration_hours, 2)} hours  
-• Billed Hours: {billed_hours}  
-• Total Cost: ₹{reservation.cost:.2f}
-
-Please note: As part of ParkWise's standard billing system, sessions are billed with a minimum duration of 1 hour.
-
-We hope to serve you again soon.
-
-Warm regards,  
-The ParkWise Team"""
-)
-
     return jsonify({
         "msg": "Reservation released",
-        "duration": round(duration_hours, 2),
-        "billed_hours": billed_hours,
+        "duration": round(reservation.duration_seconds / 3600, 2),
+        "billed_hours": reservation.billed_hours,
         "price_per_hour": lot.price_per_hour,
         "cost": reservation.cost,
     }), 200
@@ -661,12 +771,35 @@ The ParkWise Team"""
 
 
 @app.route('/admin/lots/<int:lot_id>', methods=['PUT'])
+@query_budget(6)
 @jwt_required()
 @admin_required_route
 def update_parking_lot(lot_id):
+    """
+    Update lot details. A `maxSpots` target resizes the lot: growing
+    appends spots numbered after the current highest (at most
+    MAX_SPOTS_PER_REQUEST per request, 400 beyond that), shrinking removes
+    the highest-numbered free spots. Shrinking is refused (409) when there
+    are not enough free spots, so a reserved spot is never removed.
+    """
     data = request.get_json()
     lot = ParkingLot.query.get_or_404(lot_id)
 
+    if 'maxSpots' in data:
+        try:
+            target = int(data['maxSpots'])
+        except (TypeError, ValueError):
+            return jsonify(msg="maxSpots must be an integer"), 400
+        if not 0 <= target <= MAX_SPOTS_PER_LOT:
+            return jsonify(msg=f"maxSpots must be between 0 and {MAX_SPOTS_PER_LOT}"), 400
+        try:
+            error = resize_lot(lot.id, target)
+        except ValueError as exc:
+            return jsonify(msg=str(exc)), 400
+        if error:
+            db.session.rollback()
+            return jsonify(msg=error), 409
+
     # Update fields if present
     if 'name' in data:
         lot.name = data['name']
@@ -676,89 +809,105 @@ def update_parking_lot(lot_id):
         lot.pincode = data['pincode']
     if 'price_per_hour' in data:
         lot.price_per_hour = float(data['price_per_hour'])
-    # NOTE: we’re not handling maxSpots here—spots resizing is more complex
 
     db.session.commit()
     return jsonify(msg="Lot updated"), 200
 
 @app.route('/admin/dashboard', methods=['GET'])
+@query_budget(6)
 @jwt_required()
 @admin_required_route
 def admin_dashboard():
     # 1) Identify the admin
-    admin_id = int(get_jwt_identity())
-    admin    = User.query.get(admin_id)
+    admin    = current_user
+    admin_id = admin.id
 
     # 2) Fetch all lots created by this admin
-    lots = ParkingLot.query.filter_by(created_by=admin_id).all()
-
-     # 3) Build the parking_lots list with reservation details
-    lot_list = []
-    for lot in lots:
-        spots_list = []
-        for spot in lot.spots:
-            spot_data = {
-                'id': spot.id,
-                'number': spot.spot_number,
-                'is_available': not spot.is_reserved
-            }
-            
-            # Add reservation details if spot is occupied
-            if spot.is_reserved:
-                active_reservation = Reservation.query.filter_by(
-                    spot_id=spot.id,
-                    end_time=None
-                ).first()
-                
-                if active_reservation:
-                    user = active_reservation.user
-                    spot_data['reservation_details'] = {
-    'user_id': user.id,
-    'fullname': user.fullname,  # Exact full name
-    'email': user.email         # Exact email
-}
-            
-            spots_list.append(spot_data)
-        
-        lot_list.append({
-            'id': lot.id,
-            'name': lot.name,
-            'location': lot.location,
-            'pincode': lot.pincode,
-            'price_per_hour': lot.price_per_hour,
-            'spots': spots_list
-        })
+    lots = (
+        ParkingLot.query
+        .filter_by(created_by=admin_id)
+        .order_by(ParkingLot.id)
+        .all()
+    )
 
-    # 4) Build the lot_summary list (for your pie chart)
-    lot_summary = []
-    for lot in ParkingLot.query.all():
-        total_rev = 0
-        # Sum ongoing reservations’ cost = hours * price/hr
-        for resv in Reservation.query.filter_by(
-            lot_id=lot.id, 
-            end_time=None
-        ).all():
-            hours = (datetime.utcnow() - resv.start_time).total_seconds() / 3600
-            total_rev += round(hours * lot.price_per_hour, 2)
-
-        lot_summary.append({
-            'name':    lot.name,
-            'revenue': total_rev
-        })
+    # 3) All their spots in one pass, each outer-joined to its active
+    #    reservation (if any) and the user holding it
+    spot_rows = (
+        db.session.query(
+            ParkingSpot.id,
+            ParkingSpot.lot_id,
+            ParkingSpot.spot_number,
+            ParkingSpot.is_reserved,
+            User.id.label('user_id'),
+            User.fullname,
+            User.email,
+        )
+        .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+        .outerjoin(
+            Reservation,
+            (Reservation.spot_id == ParkingSpot.id) & Reservation.end_time.is_(None)
+        )
+        .outerjoin(User, User.id == Reservation.user_id)
+        .filter(ParkingLot.created_by == admin_id)
+        .order_by(ParkingSpot.lot_id, ParkingSpot.id, Reservation.id)
+        .all()
+    )
 
-    total_spots     = sum(len(l.spots) for l in lots)
+    spots_by_lot = {lot.id: {} for lot in lots}
+    for row in spot_rows:
+        lot_spots = spots_by_lot[row.lot_id]
+        if row.id in lot_spots:
+            # a second open reservation on the same spot; keep the first
+            continue
+
+        spot_data = {
+            'id': row.id,
+            'number': row.spot_number,
+            'is_available': not row.is_reserved
+        }
+        # Add reservation details if spot is occupied
+        if row.is_reserved and row.user_id is not None:
+            spot_data['reservation_details'] = {
+                'user_id': row.user_id,
+                'fullname': row.fullname,  # Exact full name
+                'email': row.email         # Exact email
+            }
+        lot_spots[row.id] = spot_data
+
+    lot_list = [{
+        'id': lot.id,
+        'name': lot.name,
+        'location': lot.location,
+        'pincode': lot.pincode,
+        'price_per_hour': lot.price_per_hour,
+        'spots': list(spots_by_lot[lot.id].values())
+    } for lot in lots]
+
+    # 4) Build the lot_summary list (for your pie chart): revenue accrued
+    #    so far by open reservations in this admin's lots
+    lot_summary = [
+        {'name': item['name'], 'revenue': item['revenue']}
+        for item in ongoing_revenue_by_lot(admin_id=admin_id)
+    ]
+
+    total_spots     = sum(len(l['spots']) for l in lot_list)
     available_spots = sum(spot['is_available'] for l in lot_list for spot in l['spots'])
     reserved_spots  = total_spots - available_spots
    # Count everyone except the admin themselves
     total_users = User.query.filter(User.id != admin_id).count()
 
+    total_revenue = round(sum(item['revenue'] for item in lot_summary), 2)
 
-    admin_lot_ids = {lot['id'] for lot in lot_list}
-    total_revenue = sum(
-       item['revenue']
-       for item in lot_summary
-       if item['name'] in {lot['name'] for lot in lot_list}
-   )
+    # 5) What finished bookings were charged: all time, this month and
+    #    each of the last six months (oldest first), for the stat cards
+    #    and the monthly chart
+    by_month = completed_revenue_by_month(admin_id)
+    today = datetime.utcnow()
+    recent_months = []
+    year, month = today.year, today.month
+    for _ in range(6):
+        recent_months.insert(0, f'{year:04d}-{month:02d}')
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
 
     return jsonify({
         'username'        : admin.fullname,
@@ -771,66 +920,138 @@ def admin_dashboard():
 
         # ← your new fields:
         'total_users'     : total_users,
-        'total_revenue'   : total_revenue
+        'total_revenue'   : total_revenue,
+
+        'completed_revenue': round(sum(by_month.values()), 2),
+        'monthly_revenue'  : by_month.get(recent_months[-1], 0),
+        'revenue_by_month' : [
+            {'month': key, 'revenue': by_month.get(key, 0)} for key in recent_months
+        ]
     }), 200
 
 from datetime import datetime
 
 def calculate_cost(start_time: datetime, end_time: datetime, rate_per_hour: float) -> float:
-    # 1. Compute total seconds between start and end
-    total_seconds = (end_time - start_time).total_seconds()
-
-    # 2. Convert to hours (float)
-    hours = total_seconds / 3600
-
-    # 3. Enforce a minimum of 1 billable hour
-    billable_hours = max(hours, 1)
-
-    # 4. Return cost rounded to two decimals
-    return round(billable_hours * rate_per_hour, 2)
+    """What release would charge for a stay from start_time to end_time."""
+    hours = billed_hours(duration_seconds(start_time, end_time))
+    return billed_cost(hours, rate_per_hour)
+
+
+def booking_record(row, now):
+    """Shape one joined /admin/bookings row for JSON."""
+    # released bookings report what was charged; ongoing ones what release would charge now
+    if row.end_time and row.cost is not None:
+        cost = row.cost
+    else:
+        cost = calculate_cost(row.start_time, row.end_time or now, row.price_per_hour)
+
+    return {
+        'id'         : row.id,
+        'user'       : {'id': row.user_id, 'email': row.email, 'fullname': row.fullname},
+        'lot'        : {'id': row.lot_id,  'name' : row.lot_name},
+        'spot_number': row.spot_number,
+        'start_time' : row.start_time.isoformat(),
+        'end_time'   : row.end_time.isoformat() if row.end_time else None,
+        'cost'       : cost
+    }
 
 
 @app.route('/admin/bookings', methods=['GET'])
+@query_budget(3)
 @jwt_required()
 @admin_required_route
 def admin_bookings():
+    """
+    Bookings in this admin's lots, newest first, one page at a time.
+
+    Query params: limit, cursor (from the previous page's next_cursor),
+    lot_id, user_id, status (active|completed), from / to (ISO dates,
+    matched against start_time). With ?stream=1 every matching booking is
+    streamed instead, ignoring limit/cursor.
+    """
     # Identify admin
     admin_id = int(get_jwt_identity())
+    args = request.args
 
-    # Query all reservations for lots this admin owns
-    records = []
-    reservations = (
-        Reservation
-        .query
+    try:
+        limit  = parse_limit(args.get('limit'))
+        cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+        since  = parse_datetime(args.get('from'), 'from')
+        until  = parse_datetime(args.get('to'), 'to')
+        lot_id  = parse_id(args.get('lot_id'), 'lot_id')
+        user_id = parse_id(args.get('user_id'), 'user_id')
+    except PaginationError as e:
+        return jsonify(msg=str(e)), 400
+
+    status = args.get('status')
+    if status not in (None, '', 'active', 'completed'):
+        return jsonify(msg="status must be 'active' or 'completed'"), 400
+
+    # Filters shared by the page and the count
+    filters = [ParkingLot.created_by == admin_id]
+    if lot_id is not None:
+        filters.append(Reservation.lot_id == lot_id)
+    if user_id is not None:
+        filters.append(Reservation.user_id == user_id)
+    if status == 'active':
+        filters.append(Reservation.end_time.is_(None))
+    elif status == 'completed':
+        filters.append(Reservation.end_time.isnot(None))
+    if since:
+        filters.append(Reservation.start_time >= since)
+    if until:
+        filters.append(Reservation.start_time < until)
+
+    # One query for the page, with lot, user and spot joined in
+    page_query = (
+        db.session.query(
+            Reservation.id,
+            Reservation.start_time,
+            Reservation.end_time,
+            Reservation.cost,
+            ParkingLot.id.label('lot_id'),
+            ParkingLot.name.label('lot_name'),
+            ParkingLot.price_per_hour,
+            User.id.label('user_id'),
+            User.email,
+            User.fullname,
+            ParkingSpot.spot_number,
+        )
         .join(ParkingLot, Reservation.lot_id == ParkingLot.id)
-        .filter(ParkingLot.created_by == admin_id)
-        .all()
+        .outerjoin(User, Reservation.user_id == User.id)
+        .outerjoin(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+        .filter(*filters)
     )
+    now = datetime.utcnow()
 
-    for resv in reservations:
-        lot  = resv.lot
-        user = resv.user
-
-       # compute cost for both released and ongoing reservations:
-        end = resv.end_time or datetime.utcnow()
-        end  = resv.end_time or datetime.utcnow()
-        cost = calculate_cost(resv.start_time, end, lot.price_per_hour)
-
+    if wants_stream():
+        rows = (
+            page_query
+            .order_by(Reservation.start_time.desc(), Reservation.id.desc())
+            .yield_per(YIELD_PER)
+        )
+        return stream_json('bookings', (booking_record(row, now) for row in rows))
 
-        records.append({
-            'id'         : resv.id,
-            'user'       : {'id': user.id, 'email': user.email, 'fullname': user.fullname},
-            'lot'        : {'id': lot.id,  'name' : lot.name},
-            'spot_number': resv.spot.spot_number,
-            'start_time' : resv.start_time.isoformat(),
-            'end_time'   : resv.end_time.isoformat() if resv.end_time else None,
-            'cost'       : cost
-        })
+    total = (
+        db.session.query(func.count(Reservation.id))
+        .join(ParkingLot, Reservation.lot_id == ParkingLot.id)
+        .filter(*filters)
+        .scalar()
+    )
+    rows, next_cursor = paginate(
+        page_query, Reservation.start_time, Reservation.id, limit, cursor
+    )
+    records = [booking_record(row, now) for row in rows]
 
-    return jsonify({'bookings': records}), 200
+    return jsonify({
+        'bookings'   : records,
+        'total'      : total,
+        'next_cursor': next_cursor
+    }), 200
 
 
 @app.route('/admin/profile', methods=['PUT'])
+@query_budget(3)
 @jwt_required()
 @admin_required_route
 def admin_update_profile():
@@ -850,13 +1071,30 @@ def admin_update_profile():
     # 3. Hash & save
     user.password = generate_password_hash(new_password)
     db.session.commit()
+    identity_cache.invalidate(user_id)
 
     return jsonify(msg="Password updated"), 200
 
 @app.route('/admin/users', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 @admin_required_route
 def admin_list_users():
+    if wants_stream():
+        rows = (
+            db.session.query(User.id, User.email, User.fullname, User.address, User.pincode)
+            .filter(User.role != 'admin')
+            .order_by(User.id)
+            .yield_per(YIELD_PER)
+        )
+        return stream_json('users', ({
+            'id':       u.id,
+            'email':    u.email,
+            'fullname': u.fullname,
+            'address':  u.address,
+            'pincode':  u.pincode
+        } for u in rows))
+
     # only non-admin
     users = User.query.filter(User.role != 'admin').all()
     # remove any accidental duplicates before jsonify:
@@ -871,13 +1109,551 @@ def admin_list_users():
     return jsonify(users=result), 200
 
 
+@app.route('/admin/slow-queries', methods=['GET'])
+@query_budget(1)
+@jwt_required()
+@admin_required_route
+def admin_slow_queries():
+    """
+    Slow statements seen by this process, worst first. Query params:
+    limit (default 20), sort = total_ms | max_ms | count. `table_scans`
+    lists every slow statement whose SQLite plan scans a whole table.
+    """
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'max_ms', 'count'):
+        return jsonify(msg="sort must be total_ms, max_ms or count"), 400
+    try:
+        limit = max(1, int(request.args.get('limit', 20)))
+    except ValueError:
+        return jsonify(msg="limit must be an integer"), 400
+
+    return jsonify(
+        enabled=bool(app.config.get('SLOW_QUERY_LOG')),
+        threshold_ms=app.config.get('SLOW_QUERY_THRESHOLD_MS'),
+        **slow_query_log.report(limit=limit, sort=sort),
+    ), 200
+
+
+@app.route('/admin/slow-queries', methods=['DELETE'])
+@query_budget(1)
+@jwt_required()
+@admin_required_route
+def admin_reset_slow_queries():
+    slow_query_log.reset()
+    return jsonify(msg="Slow query log cleared"), 200
+
+
+@app.route('/admin/profiles/token', methods=['POST'])
+@query_budget(1)
+@jwt_required()
+@admin_required_route
+def admin_profile_token():
+    """
+    Issue a short-lived token that profiles any request carrying it, in
+    the X-Profile-Token header or the _profile query parameter.
+    """
+    if not app.config.get('PROFILING_ENABLED'):
+        return jsonify(msg="Profiling is disabled (set PROFILING_ENABLED=1)"), 409
+    return jsonify(
+        token=make_profile_token(int(get_jwt_identity())),
+        header=PROFILE_HEADER,
+        param=PROFILE_PARAM,
+        expires_in=PROFILE_TOKEN_MAX_AGE,
+    ), 201
+
+
+@app.route('/admin/profiles', methods=['GET'])
+@query_budget(1)
+@jwt_required()
+@admin_required_route
+def admin_list_profiles():
+    """Recently recorded request profiles, newest first."""
+    return jsonify(profiles=list_profiles()), 200
+
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+@query_budget(1)
+@jwt_required()
+@admin_required_route
+def admin_download_profile(profile_id):
+    """The raw profile (pstats dump or pyinstrument HTML); ?format=text for a pstats listing."""
+    found = profile_file(profile_id)
+    if not found:
+        return jsonify(msg="Profile not found"), 404
+    path, mimetype, kind = found
+
+    if request.args.get('format') == 'text':
+        if kind != 'cprofile':
+            return jsonify(msg="Text format is only available for cProfile profiles"), 400
+        return Response(pstats_text(path), mimetype='text/plain')
+    return send_file(path, mimetype=mimetype, as_attachment=True,
+                     download_name=os.path.basename(path))
+
+
+
+# A spot is free unless is_reserved is true; NULL (older rows) counts as
+# free. Claiming, resizing and the counter reconcile all use this one test.
+SPOT_IS_FREE = ParkingSpot.is_reserved.isnot(True)
+
+# Largest number of spots created by one request (lot creation or range)
+MAX_SPOTS_PER_REQUEST = 10000
+
+
+def insert_spot_range(lot_id, start, end):
+    """
+    Insert free spots numbered start..end (inclusive) for a lot, in the
+    caller's transaction. One INSERT ... SELECT over a recursive
+    number series, so it is a single statement whatever the range, and
+    nothing goes through the ORM identity map. Counters are left to the
+    caller.
+    """
+    if end < start:
+        return
+    numbers = select(literal(start).label('n')).cte('numbers', recursive=True)
+    numbers = numbers.union_all(select(numbers.c.n + 1).where(numbers.c.n < end))
+    db.session.execute(
+        ParkingSpot.__table__.insert().from_select(
+            ['lot_id', 'spot_number', 'is_reserved'],
+            select(literal(lot_id), numbers.c.n, literal(False)),
+        )
+    )
+
+
+def spot_numbers_taken(lot_id, start, end):
+    """True if the lot already has a spot numbered within start..end."""
+    return db.session.query(
+        select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id,
+               ParkingSpot.spot_number.between(start, end))
+        .exists()
+    ).scalar()
+
+
+# Upper bound on a lot's size when resizing through update_parking_lot
+MAX_SPOTS_PER_LOT = 100000
+
+
+def resize_lot(lot_id, target):
+    """
+    Grow or shrink a lot to `target` spots in the caller's transaction,
+    with the same handful of statements whatever the size of the change.
+
+    Returns an error message if the lot cannot shrink that far without
+    removing reserved spots, or spots that reservations (past or present)
+    still point at; the caller must then roll back. Raises ValueError,
+    before writing anything, if growing would add more than
+    MAX_SPOTS_PER_REQUEST spots.
+    """
+    current, highest = (
+        db.session.query(func.count(ParkingSpot.id), func.max(ParkingSpot.spot_number))
+        .filter(ParkingSpot.lot_id == lot_id)
+        .one()
+    )
+    delta = target - current
+    if delta > MAX_SPOTS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_SPOTS_PER_REQUEST} spots can be added per request")
+
+    if delta > 0:
+        start = (highest or 0) + 1
+        insert_spot_range(lot_id, start, start + delta - 1)
+    elif delta < 0:
+        # A spot with booking history stays, so those bookings keep their spot
+        unused = ~select(Reservation.id).where(Reservation.spot_id == ParkingSpot.id).exists()
+        doomed = (
+            select(ParkingSpot.id)
+            .where(ParkingSpot.lot_id == lot_id, SPOT_IS_FREE, unused)
+            .order_by(ParkingSpot.spot_number.desc())
+            .limit(-delta)
+        )
+        # both are checked again on the row being deleted, so a spot
+        # claimed after the subquery picked it is left alone
+        removed = db.session.execute(
+            ParkingSpot.__table__.delete().where(
+                ParkingSpot.id.in_(doomed),
+                SPOT_IS_FREE,
+                unused,
+            )
+        ).rowcount
+        if removed != -delta:
+            return (f"Cannot shrink to {target} spots: only {removed} of the "
+                    f"{-delta} spots to remove are free and have no bookings")
+
+    if delta:
+        adjust_lot_counters(lot_id, total=delta, available=delta)
+    return None
+
+
+def lot_in_use(lot_id):
+    """True if any spot of the lot is reserved or any reservation is still open."""
+    reserved = (
+        select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.is_reserved == True)
+        .exists()
+    )
+    open_reservation = (
+        select(Reservation.id)
+        .where(Reservation.lot_id == lot_id, Reservation.end_time.is_(None))
+        .exists()
+    )
+    return db.session.query(reserved | open_reservation).scalar()
+
+
+def archive_and_delete_lot(lot_id):
+    """
+    Remove a lot with a fixed set of statements, in the caller's
+    transaction: its reservations are copied to reservation_archive (with
+    lot name and spot number) and deleted, then its rollup rows, spots and
+    the lot itself go. Users keep their history, summaries and reports:
+    those read the archive for lots that no longer exist. Nothing is
+    loaded into the session. Returns the number of reservations archived.
+    """
+    history = (
+        select(
+            Reservation.id,
+            Reservation.user_id,
+            Reservation.lot_id,
+            ParkingLot.name,
+            Reservation.spot_id,
+            ParkingSpot.spot_number,
+            Reservation.start_time,
+            Reservation.end_time,
+            Reservation.cost,
+            Reservation.duration_seconds,
+            Reservation.billed_hours,
+            Reservation.vehicle_number,
+            literal(datetime.utcnow()),
+        )
+        .join(ParkingLot, ParkingLot.id == Reservation.lot_id)
+        .outerjoin(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .where(Reservation.lot_id == lot_id)
+    )
+    archived = db.session.execute(
+        ReservationArchive.__table__.insert().from_select(
+            ['id', 'user_id', 'lot_id', 'lot_name', 'spot_id', 'spot_number',
+             'start_time', 'end_time', 'cost', 'duration_seconds', 'billed_hours',
+             'vehicle_number', 'archived_at'],
+            history,
+        )
+    ).rowcount
+
+    for table, column in (
+        (Reservation.__table__,              Reservation.lot_id),
+        (ReservationMonthlyRollup.__table__, ReservationMonthlyRollup.lot_id),
+        (ParkingSpot.__table__,              ParkingSpot.lot_id),
+        (ParkingLot.__table__,               ParkingLot.id),
+    ):
+        db.session.execute(table.delete().where(column == lot_id))
+    return archived
+
+
+def adjust_lot_counters(lot_id, total=0, available=0):
+    """
+    Shift a lot's denormalized spot counters by the given deltas, in the
+    caller's transaction. Done as `col = col + delta` in SQL so concurrent
+    workers never overwrite each other's updates.
+    """
+    values = {}
+    if total:
+        values['total_spots'] = ParkingLot.total_spots + total
+    if available:
+        values['available_spots'] = ParkingLot.available_spots + available
+    if not values:
+        return
+    db.session.execute(
+        update(ParkingLot)
+        .where(ParkingLot.id == lot_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@app.cli.command('reconcile-lot-counters')
+@click.option('--dry-run', is_flag=True, help='Report drift without fixing it.')
+def reconcile_lot_counters(dry_run):
+    """Recount spots per lot and repair drifted occupancy counters."""
+    counts = (
+        db.session.query(
+            ParkingLot.id,
+            ParkingLot.name,
+            ParkingLot.total_spots,
+            ParkingLot.available_spots,
+            func.count(ParkingSpot.id).label('actual_total'),
+            func.count(ParkingSpot.id).filter(SPOT_IS_FREE).label('actual_available'),
+        )
+        .outerjoin(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)
+        .group_by(ParkingLot.id)
+        .all()
+    )
+
+    drifted = [
+        row for row in counts
+        if (row.total_spots, row.available_spots) != (row.actual_total, row.actual_available)
+    ]
+    for row in drifted:
+        click.echo(
+            f"Lot {row.id} ({row.name}): total {row.total_spots} -> {row.actual_total}, "
+            f"available {row.available_spots} -> {row.actual_available}"
+        )
+        if not dry_run:
+            db.session.execute(
+                update(ParkingLot)
+                .where(ParkingLot.id == row.id)
+                .values(total_spots=row.actual_total,
+                        available_spots=row.actual_available)
+            )
+
+    if drifted and not dry_run:
+        db.session.commit()
+    click.echo(f"{len(drifted)} of {len(counts)} lots drifted"
+               + (" (not fixed, dry run)" if dry_run and drifted else ""))
+
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if a read-only hot route runs SQL that scans a whole table."""
+    from backend.query_plans import check_query_plans
+
+    try:
+        plans, failures = check_query_plans()
+    except LookupError as e:
+        raise click.ClickException(str(e))
+    for endpoint, (status, captured) in plans.items():
+        click.echo(f"[{'SCAN' if endpoint in failures else 'ok'}] {endpoint} ({status})")
+        for statement, lines in captured:
+            click.echo(f"    {' '.join(statement.split())[:100]}")
+            for line in lines:
+                click.echo(f"        {line}")
+    if failures:
+        raise SystemExit(f"{len(failures)} routes fall back to table scans")
+
+
+@app.cli.command('monthly-reports')
+@click.option('--month', help='YYYY-MM to report on (default: current month).')
+@click.option('--dry-run', 'dry_run_dir', type=click.Path(file_okay=False),
+              help='Write rendered reports to this directory instead of emailing.')
+def monthly_reports_command(month, dry_run_dir):
+    """Run the monthly report task in-process."""
+    from backend.extensions import celery as task_celery
+    from backend.tasks.background import generate_monthly_reports
+
+    year = month_num = None
+    if month:
+        try:
+            year, month_num = (int(part) for part in month.split('-'))
+        except ValueError:
+            raise click.BadParameter('expected YYYY-MM', param_hint='--month')
+
+    # run the fan-out sub-tasks inline too
+    task_celery.conf.task_always_eager = True
+    batches = generate_monthly_reports.apply(
+        kwargs={'year': year, 'month': month_num, 'dry_run_dir': dry_run_dir}
+    ).get()
+    click.echo(f"{batches} report batches processed")
+
+
+@app.cli.command('rebuild-monthly-rollup')
+def rebuild_monthly_rollup_command():
+    """Recompute reservation_monthly_rollup from the reservation table."""
+    rows = rebuild_monthly_rollup()
+    db.session.commit()
+    click.echo(f"{rows} rollup rows written")
+
+
+@app.cli.command('relay-outbox')
+@click.option('--batch-size', default=100, show_default=True)
+@click.option('--interval', default=1.0, show_default=True,
+              help='Seconds to sleep when the outbox is empty.')
+@click.option('--once', is_flag=True, help='Drain the outbox once and exit.')
+@click.option('--requeue-failed', 'requeue', is_flag=True,
+              help='Put rows that ran out of attempts back in line first.')
+def relay_outbox_command(batch_size, interval, once, requeue):
+    """Publish committed outbox rows to Celery."""
+    import backend.tasks.background  # noqa: F401  register the task names
+    from backend.outbox import requeue_failed, run_relay
+
+    if requeue:
+        click.echo(f"{requeue_failed()} failed outbox messages requeued")
+    published = run_relay(batch_size=batch_size, interval=interval, once=once)
+    click.echo(f"{published} outbox messages published")
+
+
+@app.cli.command('bench')
+@click.option('--admins', default=2, show_default=True)
+@click.option('--lots', default=20, show_default=True)
+@click.option('--spots-per-lot', default=100, show_default=True)
+@click.option('--users', default=500, show_default=True)
+@click.option('--history', default=20, show_default=True,
+              help='Finished reservations per user.')
+@click.option('--active', default=200, show_default=True,
+              help='Open reservations, at most one per user.')
+@click.option('--concurrency', default=4, show_default=True,
+              help='Worker threads driving requests.')
+@click.option('--iterations', default=5, show_default=True,
+              help='User and admin flows each worker runs.')
+@click.option('--server', is_flag=True,
+              help='Go over HTTP to a local threaded server instead of the test client.')
+@click.option('--output', type=click.File('w'), default='-',
+              help='Write the JSON report here (default: stdout).')
+@click.option('--yes', is_flag=True, help='Do not ask before writing to the database.')
+def bench_command(admins, lots, spots_per_lot, users, history, active,
+                  concurrency, iterations, server, output, yes):
+    """
+    Seed a synthetic dataset, drive every route under load and report
+    p50/p95/p99 latency, throughput and query counts per route as JSON.
+    Writes to the configured database: point DATABASE_URL at a scratch one.
+    """
+    import json
+    from backend.loadtest import run_load, seed_dataset
+
+    if not yes:
+        click.confirm(f"Seed benchmark data into {db.engine.url!r}?", abort=True, err=True)
+
+    db.create_all()
+    # test_email would otherwise really send
+    mail_ext = app.extensions['mail']
+    suppress, mail_ext.suppress = mail_ext.suppress, True
+
+    started = datetime.utcnow()
+    dataset = seed_dataset(admins, lots, spots_per_lot, users, history, active)
+    seed_seconds = (datetime.utcnow() - started).total_seconds()
+    db.session.remove()
+    try:
+        report = run_load(app, dataset, concurrency, iterations, server=server)
+    finally:
+        mail_ext.suppress = suppress
+
+    report = {'dataset': dict(dataset['rows'], seed_seconds=round(seed_seconds, 3)), **report}
+    json.dump(report, output, indent=2)
+    output.write('\n')
+    if report['not_exercised']:
+        click.echo(f"not exercised: {', '.join(report['not_exercised'])}", err=True)
+
+
+# How many times a claim is retried when another worker wins the race
+# for the spot we picked.
+CLAIM_MAX_ATTEMPTS = 5
+
+
+def claim_free_spot(lot_id, max_attempts=CLAIM_MAX_ATTEMPTS):
+    """
+    Atomically flip the lowest-numbered free spot of a lot to reserved.
+
+    The pick and the flip happen in one conditional UPDATE, so two workers
+    can never both claim the same spot. If a concurrent claim beats us to
+    the row, the UPDATE matches nothing and we try again with a fresh pick.
+    Returns (spot_id, spot_number), or None when the lot is full.
+    """
+    candidate = (
+        select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, SPOT_IS_FREE)
+        .order_by(ParkingSpot.spot_number)
+        .limit(1)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(ParkingSpot)
+        .where(ParkingSpot.id == candidate, SPOT_IS_FREE)
+        .values(is_reserved=True)
+        .execution_options(synchronize_session=False)
+    )
+
+    for _ in range(max_attempts):
+        if db.engine.dialect.update_returning:
+            row = db.session.execute(
+                stmt.returning(ParkingSpot.id, ParkingSpot.spot_number)
+            ).first()
+            if row:
+                return row.id, row.spot_number
+        else:
+            # No UPDATE ... RETURNING: pin the candidate first, then flip it
+            spot = db.session.execute(
+                select(ParkingSpot.id, ParkingSpot.spot_number)
+                .where(ParkingSpot.id == candidate)
+            ).first()
+            if not spot:
+                return None
+            result = db.session.execute(
+                update(ParkingSpot)
+                .where(ParkingSpot.id == spot.id, SPOT_IS_FREE)
+                .values(is_reserved=True)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                return spot.id, spot.spot_number
+
+        # Either the lot is full or someone else won the race; only the
+        # latter is worth another attempt.
+        still_free = db.session.execute(
+            select(ParkingSpot.id)
+            .where(ParkingSpot.lot_id == lot_id, SPOT_IS_FREE)
+            .limit(1)
+        ).first()
+        if not still_free:
+            return None
+
+    return None
+
+
+def close_reservation(reservation, end_time, price_per_hour):
+    """
+    Release `reservation` in the caller's transaction: close it, free its
+    spot and fold it into the monthly rollup.
+
+    Closing and freeing are conditional UPDATEs, like the claim in
+    claim_free_spot, so of two concurrent releases only one closes the
+    reservation (and counts it in the rollup) and only one frees the spot
+    (and moves the lot counter). Returns False, having changed nothing,
+    if the reservation was already closed.
+    """
+    closed = db.session.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation.id, Reservation.end_time.is_(None))
+        .values(**release_values(reservation.start_time, end_time, price_per_hour))
+    ).rowcount
+    if not closed:
+        return False
+
+    freed = db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id == reservation.spot_id, ParkingSpot.is_reserved == True)
+        .values(is_reserved=False)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if freed:
+        adjust_lot_counters(reservation.lot_id, available=1)
+    add_to_monthly_rollup(reservation)
+    return True
+
+
+def reserve_spot(user_id, lot_id):
+    """
+    Claim a free spot in the lot and open a reservation on it, in the
+    caller's transaction. Returns (reservation, spot_number) or None.
+    """
+    claimed = claim_free_spot(lot_id)
+    if not claimed:
+        return None
+    spot_id, spot_number = claimed
+    adjust_lot_counters(lot_id, available=-1)
+
+    new_resv = Reservation(
+        user_id        = user_id,
+        lot_id         = lot_id,
+        spot_id        = spot_id,
+        start_time     = datetime.now(timezone.utc),
+        end_time       = None,
+        vehicle_number = ''
+    )
+    db.session.add(new_resv)
+    return new_resv, spot_number
+
 
 @app.route('/user/assign', methods=['POST'])
+@query_budget(7)
 @user_required
 def assign_spot():
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-    if not user or user.role != 'user':
+    user_id = current_user.id
+    if current_user.role != 'user':
         return jsonify(msg='Unauthorized'), 403
 
     # 3) Now proceed exactly as before
@@ -890,26 +1666,16 @@ def assign_spot():
     if not lot:
         return jsonify(msg='Lot not found'), 404
 
-    spot = next((s for s in lot.spots if not s.is_reserved), None)
-    if not spot:
+    reserved = reserve_spot(user_id, lot.id)
+    if not reserved:
+        db.session.rollback()
         return jsonify(msg='No spots available'), 400
-
-    spot.is_reserved = True
-
-    new_resv = Reservation(
-        user_id        = user_id,
-        lot_id         = lot.id,
-        spot_id        = spot.id,
-        start_time     = datetime.now(timezone.utc),
-        end_time       = None,
-        vehicle_number = ''
-    )
-    db.session.add(new_resv)
+    new_resv, spot_number = reserved
     db.session.commit()
 
     return jsonify({
        'reservation_id': new_resv.id,
-       'spot_number':   spot.spot_number,
+       'spot_number':   spot_number,
        'cost':          lot.price_per_hour,
        'start_time':    new_resv.start_time.isoformat(),
        'user_id':       new_resv.user_id          # ← add this line
@@ -917,10 +1683,11 @@ def assign_spot():
 
 
 @app.route('/api/reservations/confirm', methods=['POST'], endpoint='api_confirm_reservation')
+@query_budget(5)
 @user_required     
 def api_confirm_reservation():
 
-    user_id = get_jwt_identity()
+    user_id = int(get_jwt_identity())
     data = request.get_json() or {}
 
     resv_id = data.get('reservation_id')
@@ -940,9 +1707,15 @@ def api_confirm_reservation():
     reservation.vehicle_number = vehicle
     reservation.start_time = datetime.utcnow()
 
-    # Mark spot as reserved
-    spot = ParkingSpot.query.get(reservation.spot_id)
-    spot.is_reserved = True
+    # Mark spot as reserved; conditional, so two confirms move the counter once
+    taken = db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id == reservation.spot_id, SPOT_IS_FREE)
+        .values(is_reserved=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if taken:
+        adjust_lot_counters(reservation.lot_id, available=-1)
 
     db.session.commit()
     return jsonify({
@@ -956,6 +1729,7 @@ def api_confirm_reservation():
 
 
 @app.route('/user/profile', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def user_get_profile():
     user_id = int(get_jwt_identity())
@@ -972,6 +1746,7 @@ def user_get_profile():
     }), 200
 
 @app.route('/user/profile', methods=['PUT'])
+@query_budget(3)
 @jwt_required()
 def user_update_profile():
     user_id = int(get_jwt_identity())
@@ -1001,18 +1776,53 @@ def user_update_profile():
     user.address  = address
     user.pincode  = pincode
     db.session.commit()
+    identity_cache.invalidate(user_id)
 
     return jsonify(msg="Profile updated successfully"), 200
 
-from backend.tasks.background import export_reservations_to_csv
-
 @app.route('/user/export-history', methods=['POST'])
+@query_budget(2)
 @jwt_required()
 def export_history():
-    """Trigger CSV export; user gets an email when ready."""
+    """
+    Trigger CSV export; user gets an email with a download link. The same
+    signed link is returned here so the client can download right away.
+    Pass `gzip=1` (query or JSON body) for a gzipped CSV.
+    """
     user_id = int(get_jwt_identity())
-    export_reservations_to_csv.delay(user_id)
-    return jsonify({"msg": "Export started. You’ll receive an email shortly."}), 202
+    data = request.get_json(silent=True) or {}
+    compress = str(request.args.get('gzip', data.get('gzip', ''))).lower() in ('1', 'true', 'yes')
+
+    token = make_export_token(user_id, compress)
+    download_url = url_for('download_export', token=token, _external=True)
+
+    enqueue_task('tasks.export_reservations_to_csv', user_id, download_url)
+    db.session.commit()
+    return jsonify({
+        "msg": "Export started. You’ll receive an email shortly.",
+        "download_url": download_url,
+        "expires_in": LINK_MAX_AGE,
+    }), 202
+
+
+@app.route('/user/export-history/download', methods=['GET'])
+@query_budget(1)
+def download_export():
+    """Stream a reservation export. Authorised by the signed token alone."""
+    token = request.args.get('token', '')
+    try:
+        user_id, compress = load_export_token(token)
+    except SignatureExpired:
+        return jsonify(msg='Download link has expired'), 410
+    except BadSignature:
+        return jsonify(msg='Invalid download link'), 403
+
+    response = Response(
+        stream_with_context(export_chunks(user_id, compress)),
+        mimetype=export_mimetype(compress),
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(compress)}"'
+    return response
 
 
 if __name__ == '__main__':
@@ -0,0 +1,5 @@
+# backend/bench/__init__.py
+"""
+Standalone benchmarks for ParkWise hot paths. Each module can be run with
+``python -m backend.bench.<name>`` and prints its results as JSON.
+"""
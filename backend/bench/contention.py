@@ -0,0 +1,121 @@
+# backend/bench/contention.py
+"""
+Spot-claim contention benchmark.
+
+Fires N threads at a single lot on a throwaway file-backed SQLite database,
+each one booking through the same path as POST /user/assign, and reports
+claims/sec plus the number of double-booked spots (which must be zero).
+
+    python -m backend.bench.contention --threads 16 --spots 500
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def run(threads, spots, attempts_per_thread):
+    from backend.app import app, reserve_spot
+    from backend.models import db, User, ParkingLot, ParkingSpot, Reservation
+
+    with app.app_context():
+        db.create_all()
+        admin = User(fullname='Bench Admin', email='bench-admin@example.com',
+                     password='x', address='-', pincode='000000', role='admin')
+        db.session.add(admin)
+        db.session.flush()
+        lot = ParkingLot(name='Bench Lot', location='-', pincode='000000',
+                         price_per_hour=10.0, created_by=admin.id,
+                         total_spots=spots, available_spots=spots)
+        db.session.add(lot)
+        db.session.flush()
+        db.session.add_all(
+            ParkingSpot(lot_id=lot.id, spot_number=i, is_reserved=False)
+            for i in range(1, spots + 1)
+        )
+        users = [
+            User(fullname=f'Bench User {i}', email=f'bench-{i}@example.com',
+                 password='x', address='-', pincode='000000', role='user')
+            for i in range(threads)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+        lot_id = lot.id
+        user_ids = [u.id for u in users]
+
+    claims = [0] * threads
+    errors = [0] * threads
+    barrier = threading.Barrier(threads)
+
+    def worker(idx):
+        barrier.wait()
+        for _ in range(attempts_per_thread):
+            with app.app_context():
+                try:
+                    if reserve_spot(user_ids[idx], lot_id):
+                        db.session.commit()
+                        claims[idx] += 1
+                    else:
+                        db.session.rollback()
+                        return
+                except Exception:
+                    db.session.rollback()
+                    errors[idx] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        double_booked = db.session.execute(
+            db.select(Reservation.spot_id)
+            .where(Reservation.end_time.is_(None))
+            .group_by(Reservation.spot_id)
+            .having(db.func.count(Reservation.id) > 1)
+        ).all()
+        reserved = ParkingSpot.query.filter_by(lot_id=lot_id, is_reserved=True).count()
+        active = Reservation.query.filter_by(lot_id=lot_id, end_time=None).count()
+        available_counter = db.session.get(ParkingLot, lot_id).available_spots
+
+    return {
+        'threads':        threads,
+        'spots':          spots,
+        'claims':         sum(claims),
+        'errors':         sum(errors),
+        'elapsed_secs':   round(elapsed, 4),
+        'claims_per_sec': round(sum(claims) / elapsed, 1) if elapsed else None,
+        'double_booked':  len(double_booked),
+        'reserved_spots': reserved,
+        'active_reservations': active,
+        'available_counter': available_counter,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--spots', type=int, default=500)
+    parser.add_argument('--attempts', type=int, default=None,
+                        help='claims attempted per thread (default: enough to fill the lot)')
+    args = parser.parse_args()
+    attempts = args.attempts or -(-args.spots // args.threads) + 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before backend.app is imported so the app binds to it
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        result = run(args.threads, args.spots, attempts)
+
+    print(json.dumps(result, indent=2))
+    if result['double_booked']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# backend/bench/lot_delete.py
+"""
+Lot deletion benchmark.
+
+Seeds a throwaway SQLite database with lots of --spots spots and times
+deleting them three ways:
+
+  orm_per_spot   the old route: load lot.spots, check is_reserved in
+                 Python, session.delete each spot (lot without history,
+                 since that path cannot delete a lot that has any)
+  set_based      DELETE /admin/lots/<id> on the same empty lot
+  with_history   DELETE /admin/lots/<id> on a lot with --history finished
+                 reservations, which get archived first
+
+    python -m backend.bench.lot_delete --spots 10000 --history 50000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def seed_lot(admin_id, name, spots, history=0):
+    from backend.app import insert_spot_range
+    from backend.models import db, ParkingLot, ParkingSpot, Reservation
+
+    lot = ParkingLot(name=name, location='-', pincode='000000', price_per_hour=10.0,
+                     created_by=admin_id, total_spots=spots, available_spots=spots)
+    db.session.add(lot)
+    db.session.flush()
+    insert_spot_range(lot.id, 1, spots)
+    if history:
+        spot_ids = [row.id for row in
+                    db.session.query(ParkingSpot.id).filter_by(lot_id=lot.id)]
+        start = datetime(2024, 1, 1)
+        db.session.execute(db.insert(Reservation), [{
+            'user_id': admin_id, 'lot_id': lot.id,
+            'spot_id': spot_ids[i % len(spot_ids)],
+            'start_time': start + timedelta(hours=i),
+            'end_time': start + timedelta(hours=i, minutes=45),
+            'duration_seconds': 2700, 'billed_hours': 1,
+            'cost': 10.0, 'vehicle_number': 'BENCH',
+        } for i in range(history)])
+    db.session.commit()
+    return lot.id
+
+
+def orm_per_spot(lot_id):
+    from backend.models import db, ParkingLot
+
+    lot = db.session.get(ParkingLot, lot_id)
+    if any(spot.is_reserved for spot in lot.spots):
+        raise RuntimeError('lot has reserved spots')
+    for spot in lot.spots:
+        db.session.delete(spot)
+    db.session.delete(lot)
+    db.session.commit()
+
+
+def run(spots, history):
+    from flask_jwt_extended import create_access_token
+    from backend.app import app
+    from backend.models import db, User, ReservationArchive
+
+    with app.app_context():
+        db.create_all()
+        admin = User(fullname='Bench Admin', email='bench-admin@example.com',
+                     password='x', address='-', pincode='000000', role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+        token = create_access_token(identity=str(admin_id), additional_claims={'role': 'admin'})
+        lots = {
+            'orm_per_spot': seed_lot(admin_id, 'ORM', spots),
+            'set_based':    seed_lot(admin_id, 'Set', spots),
+            'with_history': seed_lot(admin_id, 'History', spots, history),
+        }
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/', headers=headers)   # let the once-per-process hooks run first
+
+    results = {'spots': spots, 'history': history}
+    for name, lot_id in lots.items():
+        started = time.perf_counter()
+        if name == 'orm_per_spot':
+            with app.app_context():
+                orm_per_spot(lot_id)
+            status = None
+        else:
+            status = client.delete(f'/admin/lots/{lot_id}', headers=headers).status_code
+        results[name] = {'status': status, 'secs': round(time.perf_counter() - started, 3)}
+
+    with app.app_context():
+        results['with_history']['archived'] = ReservationArchive.query.count()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--spots', type=int, default=10000)
+    parser.add_argument('--history', type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before backend.app is imported so the app binds to it
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        result = run(args.spots, args.history)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
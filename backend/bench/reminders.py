@@ -0,0 +1,117 @@
+# backend/bench/reminders.py
+"""
+Daily-reminder throughput benchmark.
+
+Seeds --users users (a tenth of them with a recent booking, so they are
+skipped), then runs tasks.send_daily_reminders eagerly against a local
+aiosmtpd sink. For comparison it also sends --legacy-sample reminders the
+old way, one mail.send (and so one SMTP connection) per message.
+
+    python -m backend.bench.reminders --users 100000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from backend.bench.smtp_sink import point_mail_at, start_sink
+
+
+def seed(users):
+    from backend.models import db, User, ParkingLot, ParkingSpot, Reservation
+
+    db.create_all()
+    admin = User(fullname='Bench Admin', email='bench-admin@example.com',
+                 password='x', address='-', pincode='000000', role='admin')
+    db.session.add(admin)
+    db.session.flush()
+    lot = ParkingLot(name='Bench Lot', location='-', pincode='000000',
+                     price_per_hour=10.0, created_by=admin.id)
+    db.session.add(lot)
+    db.session.flush()
+    spot = ParkingSpot(lot_id=lot.id, spot_number=1, is_reserved=False)
+    db.session.add(spot)
+    db.session.flush()
+
+    recent = datetime.utcnow() - timedelta(hours=1)
+    stale = datetime.utcnow() - timedelta(days=30)
+    batch = 10000
+    for offset in range(0, users, batch):
+        n = min(batch, users - offset)
+        db.session.execute(db.insert(User), [{
+            'fullname': f'User {i}', 'email': f'user-{i}@example.com',
+            'password': 'x', 'address': '-', 'pincode': '000000', 'role': 'user',
+        } for i in range(offset, offset + n)])
+    user_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == 'user')]
+    db.session.execute(db.insert(Reservation), [{
+        'user_id': uid, 'lot_id': lot.id, 'spot_id': spot.id,
+        'start_time': recent if i % 10 == 0 else stale,
+        'end_time': None, 'vehicle_number': 'BENCH',
+    } for i, uid in enumerate(user_ids) if i % 2 == 0])
+    db.session.commit()
+
+
+def run(users, legacy_sample):
+    from flask_mail import Message
+    from backend.app import app
+    from backend.extensions import celery, mail
+    from backend.tasks.background import REMINDER_BATCH_SIZE, send_daily_reminders
+
+    celery.conf.task_always_eager = True
+    controller, handler = start_sink()
+    try:
+        point_mail_at(app, controller)
+        with app.app_context():
+            seed(users)
+
+        started = time.perf_counter()
+        batches = send_daily_reminders.delay().get()
+        elapsed = time.perf_counter() - started
+        chunked = {
+            'messages': handler.messages,
+            'smtp_connections': handler.connections,
+            'batches': batches,
+            'batch_size': REMINDER_BATCH_SIZE,
+            'secs': round(elapsed, 3),
+            'msgs_per_sec': round(handler.messages / elapsed, 1),
+        }
+
+        before_msgs, before_conns = handler.messages, handler.connections
+        with app.app_context():
+            started = time.perf_counter()
+            for i in range(legacy_sample):
+                mail.send(Message(subject='We miss you at ParkWise',
+                                  recipients=[f'user-{i}@example.com'],
+                                  body='legacy'))
+            elapsed = time.perf_counter() - started
+        legacy = {
+            'messages': handler.messages - before_msgs,
+            'smtp_connections': handler.connections - before_conns,
+            'secs': round(elapsed, 3),
+            'msgs_per_sec': round(legacy_sample / elapsed, 1) if elapsed else None,
+        }
+    finally:
+        controller.stop()
+
+    return {'users': users, 'chunked': chunked, 'legacy_per_message': legacy}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--legacy-sample', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before backend.app is imported so the app binds to it
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        result = run(args.users, args.legacy_sample)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
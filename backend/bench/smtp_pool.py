@@ -0,0 +1,95 @@
+# backend/bench/smtp_pool.py
+"""
+Transactional-mail throughput against a local SMTP sink (aiosmtpd).
+
+Sends --messages booking emails three ways and reports msgs/sec and how
+many SMTP connections each needed:
+
+  per_message  plain mail.send, one connection per message (the old path)
+  pooled       tasks.send_booking_email over the per-worker pooled connection
+  micro_batch  MAIL_MICRO_BATCH on: tasks queue, one drain sends them all
+
+    python -m backend.bench.smtp_pool --messages 5000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from backend.bench.smtp_sink import point_mail_at, start_sink
+
+
+def run(messages):
+    from flask_mail import Message
+    from backend.app import app
+    from backend.extensions import celery, mail
+    from backend.mailer import smtp_pool
+    from backend.tasks.background import drain_mail_queue, send_booking_email
+
+    celery.conf.task_always_eager = True
+    controller, handler = start_sink()
+    results = {'messages': messages}
+
+    def timed(name, fn):
+        smtp_pool.close()
+        msgs, conns = handler.messages, handler.connections
+        started = time.perf_counter()
+        fn()
+        smtp_pool.close()
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            'delivered': handler.messages - msgs,
+            'smtp_connections': handler.connections - conns,
+            'secs': round(elapsed, 3),
+            'msgs_per_sec': round(messages / elapsed, 1),
+        }
+
+    def per_message():
+        with app.app_context():
+            for i in range(messages):
+                mail.send(Message(subject='Booking Confirmed',
+                                  recipients=[f'user-{i}@example.com'],
+                                  body='bench'))
+
+    def pooled():
+        for i in range(messages):
+            send_booking_email.delay(f'user-{i}@example.com', 'bench')
+
+    def micro_batch():
+        for i in range(messages):
+            send_booking_email.delay(f'user-{i}@example.com', 'bench')
+        # Eager mode runs the first scheduled drain immediately; in a real
+        # worker it fires MAIL_BATCH_WINDOW seconds later. Drain the rest.
+        drain_mail_queue.delay()
+
+    try:
+        point_mail_at(app, controller)
+        timed('per_message', per_message)
+        timed('pooled', pooled)
+        app.config.update(MAIL_MICRO_BATCH=True, MAIL_QUEUE_URL='memory://',
+                          MAIL_BATCH_WINDOW=60)
+        timed('micro_batch', micro_batch)
+    finally:
+        controller.stop()
+
+    results['pool_max_messages'] = app.config['MAIL_POOL_MAX_MESSAGES']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before backend.app is imported so the app binds to it
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        result = run(args.messages)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
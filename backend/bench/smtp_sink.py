@@ -0,0 +1,59 @@
+# backend/bench/smtp_sink.py
+"""
+Local SMTP stand-in for the mail benchmarks. Needs aiosmtpd
+(`pip install aiosmtpd`); nothing here is used by the app itself.
+"""
+
+import socket
+
+
+class CountingHandler:
+    """aiosmtpd handler that accepts and counts every message."""
+
+    def __init__(self):
+        self.messages = 0
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        return '250 OK'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_sink():
+    """Start a sink on a free localhost port. Returns (controller, handler)."""
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        raise SystemExit('This benchmark needs aiosmtpd: pip install aiosmtpd')
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    return controller, handler
+
+
+def point_mail_at(app, controller):
+    """Re-initialise Flask-Mail on `app` to deliver to the sink."""
+    from flask_mail import Mail
+
+    app.config.update(
+        MAIL_SERVER=controller.hostname,
+        MAIL_PORT=controller.port,
+        MAIL_USE_SSL=False,
+        MAIL_USE_TLS=False,
+        MAIL_USERNAME=None,
+        MAIL_PASSWORD=None,
+        MAIL_DEFAULT_SENDER='bench@parkwise.local',
+    )
+    Mail(app)
@@ -0,0 +1,133 @@
+# backend/bench/stream_memory.py
+"""
+Peak-memory benchmark for buffered vs streamed list responses.
+
+Seeds a throwaway SQLite database with one user holding --rows
+reservations (and --rows other users), then measures the tracemalloc
+peak of serving /admin/users, /user/dashboard and /admin/bookings with
+and without ?stream=1, and of downloading the heavy user's CSV export
+plain and gzipped. Chunks are discarded as they arrive, the way a WSGI
+server would hand them to the socket.
+
+    python -m backend.bench.stream_memory --rows 200000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+def seed(rows):
+    from werkzeug.security import generate_password_hash
+    from backend.models import db, User, ParkingLot, ParkingSpot, Reservation
+
+    db.create_all()
+    admin = User(fullname='Bench Admin', email='bench-admin@example.com',
+                 password=generate_password_hash('x'), address='-',
+                 pincode='000000', role='admin')
+    heavy = User(fullname='Heavy User', email='heavy@example.com',
+                 password='x', address='-', pincode='000000', role='user')
+    db.session.add_all([admin, heavy])
+    db.session.flush()
+    lot = ParkingLot(name='Bench Lot', location='-', pincode='000000',
+                     price_per_hour=10.0, created_by=admin.id,
+                     total_spots=1, available_spots=1)
+    db.session.add(lot)
+    db.session.flush()
+    spot = ParkingSpot(lot_id=lot.id, spot_number=1, is_reserved=False)
+    db.session.add(spot)
+    db.session.flush()
+
+    start = datetime(2024, 1, 1)
+    batch = 10000
+    for offset in range(0, rows, batch):
+        n = min(batch, rows - offset)
+        db.session.execute(db.insert(User), [{
+            'fullname': f'User {i}', 'email': f'user-{i}@example.com',
+            'password': 'x', 'address': '-', 'pincode': '000000', 'role': 'user',
+        } for i in range(offset, offset + n)])
+        db.session.execute(db.insert(Reservation), [{
+            'user_id': heavy.id, 'lot_id': lot.id, 'spot_id': spot.id,
+            'start_time': start + timedelta(hours=i),
+            'end_time': start + timedelta(hours=i, minutes=45),
+            'cost': 10.0, 'vehicle_number': 'BENCH',
+        } for i in range(offset, offset + n)])
+    db.session.commit()
+    return admin.id, heavy.id
+
+
+def measure(client, url, headers):
+    tracemalloc.start()
+    started = time.perf_counter()
+    resp = client.get(url, headers=headers)
+    size = 0
+    for chunk in resp.response:
+        size += len(chunk)
+    resp.close()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'status': resp.status_code,
+        'bytes': size,
+        'secs': round(elapsed, 3),
+        'peak_mib': round(peak / 2**20, 2),
+    }
+
+
+def run(rows):
+    from flask_jwt_extended import create_access_token
+    from backend.app import app
+    from backend.export import make_export_token
+
+    with app.app_context():
+        admin_id, user_id = seed(rows)
+        admin_token = create_access_token(identity=str(admin_id), additional_claims={'role': 'admin'})
+        user_token = create_access_token(identity=str(user_id), additional_claims={'role': 'user'})
+        export_tokens = {compress: make_export_token(user_id, compress) for compress in (False, True)}
+
+    admin = {'Authorization': f'Bearer {admin_token}'}
+    user = {'Authorization': f'Bearer {user_token}'}
+    client = app.test_client()
+    client.get('/', headers=admin)   # let the once-per-process hooks run first
+
+    results = {'rows': rows}
+    for name, url, headers in [
+        ('admin_users', '/admin/users', admin),
+        ('user_dashboard', '/user/dashboard', user),
+        ('admin_bookings', '/admin/bookings?limit=500', admin),
+    ]:
+        results[name] = {
+            'buffered': measure(client, url, headers),
+            'streamed': measure(client, url + ('&' if '?' in url else '?') + 'stream=1', headers),
+        }
+    results['admin_bookings']['note'] = (
+        'buffered is a single page (max 500 rows); streamed is the full history'
+    )
+    results['export_download'] = {
+        ('gzip' if compress else 'csv'): measure(
+            client, f'/user/export-history/download?token={token}', {})
+        for compress, token in export_tokens.items()
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before backend.app is imported so the app binds to it
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        result = run(args.rows)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+# backend/billing.py
+"""
+The one set of billing rules: durations are whole seconds, and a stay is
+billed per started hour with a one-hour minimum. Release stores the
+results on the reservation (duration_seconds, billed_hours, cost), so
+everything downstream sums stored numbers instead of re-deriving them.
+"""
+
+SECONDS_PER_HOUR = 3600
+
+
+def duration_seconds(start_time, end_time):
+    return int(round((end_time - start_time).total_seconds()))
+
+
+def billed_hours(seconds):
+    """Started hours, never less than one."""
+    return max(1, -(-seconds // SECONDS_PER_HOUR))
+
+
+def billed_cost(hours, price_per_hour):
+    return round(hours * price_per_hour, 2)
+
+
+def release_values(start_time, end_time, price_per_hour):
+    """The columns release stores: end_time plus the duration and charge up to it."""
+    seconds = duration_seconds(start_time, end_time)
+    hours = billed_hours(seconds)
+    return {
+        'end_time':         end_time,
+        'duration_seconds': seconds,
+        'billed_hours':     hours,
+        'cost':             billed_cost(hours, price_per_hour),
+    }
@@ -0,0 +1,124 @@
+# backend/export.py
+"""
+Reservation history export as CSV, optionally gzipped.
+
+Rows come from one joined query read with yield_per and are encoded a
+chunk at a time, so an export of any size runs in constant memory. The
+same generator feeds both the emailed export (tasks.export_reservations_to_csv)
+and the signed download link (/user/export-history/download).
+"""
+
+import csv
+import zlib
+from io import StringIO
+
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer
+from sqlalchemy import select, union_all
+
+from backend.models import db, Reservation, ReservationArchive, ParkingLot, ParkingSpot
+from backend.streaming import CHUNK_ROWS, YIELD_PER
+
+EXPORT_HEADER = ['Reservation ID', 'Lot', 'Spot', 'Start', 'End', 'Cost']
+
+# How long a download link stays valid (seconds)
+LINK_MAX_AGE = 24 * 3600
+
+_SALT = 'reservation-export'
+
+
+def reservation_export_rows(user_id):
+    """One tuple per reservation of `user_id`, archived ones included, newest first."""
+    live = (
+        select(
+            Reservation.id,
+            ParkingLot.name.label('lot_name'),
+            ParkingSpot.spot_number,
+            Reservation.start_time,
+            Reservation.end_time,
+            Reservation.cost,
+        )
+        # outer joins, as on the dashboard: a reservation whose spot was
+        # since removed is still part of the user's history
+        .outerjoin(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .outerjoin(ParkingLot, ParkingLot.id == Reservation.lot_id)
+        .where(Reservation.user_id == user_id)
+    )
+    archived = select(
+        ReservationArchive.id,
+        ReservationArchive.lot_name,
+        ReservationArchive.spot_number,
+        ReservationArchive.start_time,
+        ReservationArchive.end_time,
+        ReservationArchive.cost,
+    ).where(ReservationArchive.user_id == user_id)
+    rows = union_all(live, archived).subquery()
+    return (
+        db.session.query(rows)
+        .order_by(rows.c.start_time.desc(), rows.c.id.desc())
+        .yield_per(YIELD_PER)
+    )
+
+
+def iter_csv(rows):
+    """Encode rows as CSV, yielding UTF-8 bytes every CHUNK_ROWS rows."""
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_HEADER)
+    for n, (resv_id, lot_name, spot_number, start, end, cost) in enumerate(rows, 1):
+        writer.writerow([
+            resv_id,
+            lot_name,
+            spot_number,
+            start.isoformat() if start else '',
+            end.isoformat() if end else '',
+            '' if cost is None else cost,
+        ])
+        if n % CHUNK_ROWS == 0:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def iter_gzip(chunks):
+    """Gzip a stream of byte chunks without buffering the whole thing."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(user_id, compress=False):
+    """The complete export for `user_id` as an iterator of byte chunks."""
+    chunks = iter_csv(reservation_export_rows(user_id))
+    return iter_gzip(chunks) if compress else chunks
+
+
+def export_filename(compress=False):
+    return 'reservations.csv.gz' if compress else 'reservations.csv'
+
+
+def export_mimetype(compress=False):
+    return 'application/gzip' if compress else 'text/csv'
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt=_SALT)
+
+
+def make_export_token(user_id, compress=False):
+    return _serializer().dumps({'user_id': user_id, 'gzip': bool(compress)})
+
+
+def load_export_token(token, max_age=LINK_MAX_AGE):
+    """
+    Return (user_id, compress) for a download token. Raises
+    itsdangerous.SignatureExpired for an old link and BadSignature for a
+    forged or mangled one.
+    """
+    data = _serializer().loads(token, max_age=max_age)
+    return int(data['user_id']), bool(data.get('gzip'))
@@ -0,0 +1,85 @@
+# backend/identity.py
+"""
+Current-user resolution for JWT-protected routes.
+
+flask-jwt-extended's user_lookup_loader (registered in app.py) calls
+`load_identity` once per request; views read the result through
+`flask_jwt_extended.current_user` instead of querying User again. The
+lookup is served from a small per-process TTL/LRU cache of the fields
+routes actually need, so most requests make no users-table round trip
+at all.
+
+The cache is per process: routes that change a user call
+`identity_cache.invalidate(user_id)` after committing, and the TTL bounds
+how long another worker can keep serving the old values.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from backend.models import db, User
+
+CachedUser = namedtuple('CachedUser', 'id role email fullname')
+
+IDENTITY_CACHE_SIZE = 4096
+IDENTITY_CACHE_TTL = 60     # seconds
+
+
+class IdentityCache:
+    """Thread-safe LRU of user_id -> CachedUser whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
+
+
+def load_identity(user_id):
+    """The CachedUser for `user_id`, or None if there is no such user."""
+    user = identity_cache.get(user_id)
+    if user is not None:
+        return user
+
+    row = (
+        db.session.query(User.id, User.role, User.email, User.fullname)
+        .filter(User.id == user_id)
+        .first()
+    )
+    if row is None:
+        return None
+    user = CachedUser(*row)
+    identity_cache.set(user_id, user)
+    return user
@@ -0,0 +1,425 @@
+# backend/loadtest.py
+"""
+Synthetic dataset and HTTP load test behind `flask bench`.
+
+`seed_dataset` bulk-inserts admins, lots with their spots, users, and
+finished and open reservations, all tagged with a run stamp so seeding
+twice into one database never collides. `run_load` then has
+`concurrency` threads each run `iterations` user and admin flows that
+between them hit every route in app.py, either through the Flask test
+client or over HTTP against a local threaded WSGI server.
+
+Latency is timed on the client side of each request, streamed bodies
+included. Query counts come from the per-endpoint counters in
+backend.metrics, which are reset at the start of the run. The report
+lists any route the flows did not reach, so new routes cannot drop out
+of the baseline unnoticed.
+
+SQLite serialises writers, so with concurrency > 1 some writes may fail
+with "database is locked"; those show up as 500s in the status counts.
+"""
+
+import http.client
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from flask_jwt_extended import create_access_token
+from werkzeug.security import generate_password_hash
+
+from backend.billing import billed_cost, billed_hours
+from backend.metrics import route_metrics
+from backend.models import db, User, ParkingLot, ParkingSpot, Reservation
+
+BENCH_PASSWORD = 'bench-password'
+
+INSERT_BATCH = 10000     # rows per bulk INSERT while seeding
+PERCENTILES = (50, 95, 99)
+
+
+def _insert(model, rows):
+    for i in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(db.insert(model), rows[i:i + INSERT_BATCH])
+
+
+def seed_dataset(admins, lots, spots_per_lot, users, history, active):
+    """
+    Bulk-insert a synthetic dataset and commit it. `history` is finished
+    reservations per user; `active` is open ones, at most one per user.
+    Returns the ids the load flows need.
+    """
+    from backend.app import insert_spot_range
+    from backend.reports import rebuild_monthly_rollup
+
+    stamp = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+    password = generate_password_hash(BENCH_PASSWORD)   # hashed once, shared
+
+    def people(role, count):
+        _insert(User, [{
+            'fullname': f'Bench {role.title()} {i}',
+            'email': f'bench-{stamp}-{role}-{i}@example.com',
+            'password': password, 'address': '-', 'pincode': '000000', 'role': role,
+        } for i in range(count)])
+        return [
+            row.id for row in db.session.query(User.id)
+            .filter(User.email.like(f'bench-{stamp}-{role}-%'))
+            .order_by(User.id)
+        ]
+
+    admin_ids = people('admin', max(admins, 1))
+    user_ids = people('user', users)
+
+    lot_ids = []
+    for i in range(lots):
+        lot = ParkingLot(name=f'Bench {stamp} {i}', location='-', pincode='000000',
+                         price_per_hour=10.0 + i % 5, created_by=admin_ids[i % len(admin_ids)],
+                         total_spots=spots_per_lot, available_spots=spots_per_lot)
+        db.session.add(lot)
+        db.session.flush()
+        insert_spot_range(lot.id, 1, spots_per_lot)
+        lot_ids.append(lot.id)
+
+    spots = []
+    if lot_ids:
+        # ordered by number first, so consecutive picks spread over the lots
+        spots = (db.session.query(ParkingSpot.id, ParkingSpot.lot_id)
+                 .filter(ParkingSpot.lot_id.in_(lot_ids))
+                 .order_by(ParkingSpot.spot_number, ParkingSpot.lot_id)
+                 .all())
+        prices = dict(db.session.query(ParkingLot.id, ParkingLot.price_per_hour)
+                      .filter(ParkingLot.id.in_(lot_ids)))
+
+    finished = 0
+    if spots and history:
+        start = datetime.utcnow() - timedelta(days=90)
+        rows = []
+        for n, user_id in enumerate(user_ids):
+            for k in range(history):
+                spot = spots[(n * history + k) % len(spots)]
+                seconds = 600 + (n * 7 + k * 13) % 4 * 3600
+                began = start + timedelta(hours=(n + k * 37) % (90 * 24))
+                hours = billed_hours(seconds)
+                rows.append({
+                    'user_id': user_id, 'lot_id': spot.lot_id, 'spot_id': spot.id,
+                    'start_time': began, 'end_time': began + timedelta(seconds=seconds),
+                    'duration_seconds': seconds, 'billed_hours': hours,
+                    'cost': billed_cost(hours, prices[spot.lot_id]),
+                    'vehicle_number': 'BENCH',
+                })
+            if len(rows) >= INSERT_BATCH:
+                _insert(Reservation, rows)
+                finished += len(rows)
+                rows = []
+        _insert(Reservation, rows)
+        finished += len(rows)
+        rebuild_monthly_rollup()
+
+    held = spots[:min(active, len(user_ids), len(spots))]
+    if held:
+        now = datetime.utcnow()
+        _insert(Reservation, [{
+            'user_id': user_ids[i], 'lot_id': spot.lot_id, 'spot_id': spot.id,
+            'start_time': now - timedelta(minutes=5 + i % 240), 'end_time': None,
+            'vehicle_number': 'BENCH',
+        } for i, spot in enumerate(held)])
+        (db.session.query(ParkingSpot)
+         .filter(ParkingSpot.id.in_([spot.id for spot in held]))
+         .update({ParkingSpot.is_reserved: True}, synchronize_session=False))
+        for lot_id, taken in Counter(spot.lot_id for spot in held).items():
+            (db.session.query(ParkingLot).filter(ParkingLot.id == lot_id)
+             .update({ParkingLot.available_spots: ParkingLot.available_spots - taken},
+                     synchronize_session=False))
+
+    db.session.commit()
+    return {
+        'stamp': stamp,
+        'admin_ids': admin_ids,
+        'user_ids': user_ids,
+        'lot_ids': lot_ids,
+        'held_spots': [(spot.lot_id, spot.id) for spot in held],
+        'rows': {
+            'admins': len(admin_ids), 'users': len(user_ids), 'lots': len(lot_ids),
+            'spots': len(spots), 'finished_reservations': finished,
+            'active_reservations': len(held),
+        },
+    }
+
+
+class TestClientTransport:
+    """Requests through app.test_client(); one per worker thread."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body, headers):
+        resp = self.client.open(path, method=method, json=body, headers=headers)
+        try:
+            data = resp.get_data()
+            return resp.status_code, data, resp.mimetype
+        finally:
+            resp.close()
+
+
+class HttpTransport:
+    """Requests over HTTP/1.1 to a running server; one per worker thread."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+
+    def request(self, method, path, body, headers):
+        headers = dict(headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        # the werkzeug server closes after each response, so no keep-alive
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            mimetype = (resp.getheader('Content-Type') or '').split(';')[0]
+            return resp.status, data, mimetype
+        finally:
+            conn.close()
+
+
+class LoadRecorder:
+    """Latencies and statuses per endpoint, shared by the worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def add(self, endpoint, seconds, status):
+        with self._lock:
+            self.latency[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+
+class Caller:
+    """What a flow uses to make one timed request as a given identity."""
+
+    def __init__(self, transport, recorder, tokens):
+        self.transport = transport
+        self.recorder = recorder
+        self.tokens = tokens
+
+    def __call__(self, endpoint, method, path, body=None, who=None):
+        headers = {}
+        if who:
+            headers['Authorization'] = 'Bearer ' + self.tokens[who]
+        started = time.perf_counter()
+        try:
+            status, data, mimetype = self.transport.request(method, path, body, headers)
+        except Exception:
+            self.recorder.add(endpoint, time.perf_counter() - started, 'error')
+            return None, None
+        self.recorder.add(endpoint, time.perf_counter() - started, status)
+        if mimetype == 'application/json':
+            return status, json.loads(data)
+        return status, None
+
+
+def user_flow(call, user, lot_id, email):
+    """Browse, book, confirm and release a spot, then read history and profile."""
+    call('home', 'GET', '/')
+    call('login', 'POST', '/login', {'email': email, 'password': BENCH_PASSWORD})
+    call('get_all_lots', 'GET', '/user/lots', who=user)
+
+    booked = []
+    for confirm in ('user_confirm_reservation', 'api_confirm_reservation'):
+        status, data = call('assign_spot', 'POST', '/user/assign', {'lot_id': lot_id}, who=user)
+        if status != 200:
+            continue
+        booked.append(data['reservation_id'])
+        path = '/user/reserve' if confirm == 'user_confirm_reservation' else '/api/reservations/confirm'
+        call(confirm, 'POST', path,
+             {'reservation_id': data['reservation_id'], 'vehicle_number': 'BENCH'}, who=user)
+    for reservation_id in booked:
+        call('release_reservation', 'POST', '/user/release', {'reservation_id': reservation_id}, who=user)
+
+    call('user_dashboard', 'GET', '/user/dashboard', who=user)
+    call('user_summary', 'GET', '/user/summary', who=user)
+    status, profile = call('user_get_profile', 'GET', '/user/profile', who=user)
+    if status == 200:
+        call('user_update_profile', 'PUT', '/user/profile', {
+            key: profile.get(key) or '-' for key in ('fullname', 'email', 'address', 'pincode')
+        }, who=user)
+
+    status, data = call('export_history', 'POST', '/user/export-history', who=user)
+    if status == 202:
+        url = urlsplit(data['download_url'])
+        call('download_export', 'GET', f'{url.path}?{url.query}')
+
+
+def admin_flow(call, admin, name, spots, held_spot=None):
+    """
+    Read the admin views and who holds `held_spot` (lot_id, spot_id), then
+    build up, edit and tear down a lot of `spots` spots.
+    """
+    call('metrics', 'GET', '/metrics')
+    call('test_email', 'GET', '/test-email')
+    call('register', 'POST', '/register', {
+        'fullname': 'Bench Signup', 'email': f'{name}@example.com', 'password': BENCH_PASSWORD,
+        'address': '-', 'pincode': '000000'})
+    call('admin_dashboard', 'GET', '/admin/dashboard', who=admin)
+    call('admin_bookings', 'GET', '/admin/bookings', who=admin)
+    call('admin_list_users', 'GET', '/admin/users', who=admin)
+    call('admin_slow_queries', 'GET', '/admin/slow-queries', who=admin)
+    call('admin_reset_slow_queries', 'DELETE', '/admin/slow-queries', who=admin)
+    call('admin_profile_token', 'POST', '/admin/profiles/token', who=admin)
+    status, data = call('admin_list_profiles', 'GET', '/admin/profiles', who=admin)
+    # an unknown id still exercises the route when profiling is off
+    profile_id = data['profiles'][0]['id'] if status == 200 and data['profiles'] else '20260101T000000000000-00000000'
+    call('admin_download_profile', 'GET', f'/admin/profiles/{profile_id}', who=admin)
+    call('admin_update_profile', 'PUT', '/admin/profile', {'password': BENCH_PASSWORD}, who=admin)
+    if held_spot:
+        call('get_spot_details', 'GET', '/admin/lots/{}/spot/{}'.format(*held_spot), who=admin)
+
+    status, data = call('create_parking_lot', 'POST', '/admin/lots', {
+        'name': name, 'address': '-', 'pincode': '000000', 'price': 10, 'maxSpots': spots,
+    }, who=admin)
+    if status != 201:
+        return
+    lot = data['lot_id']
+    base = f'/admin/lots/{lot}'
+    call('create_spot', 'POST', f'{base}/spots', {'number': spots + 1}, who=admin)
+    call('create_spot_range', 'POST', f'{base}/spots/range', {'count': spots}, who=admin)
+
+    spot_ids = [_spot_id(lot, number) for number in (1, 2, 3)]
+    if None not in spot_ids:
+        call('edit_spot', 'PUT', f'{base}/spots/{spot_ids[0]}', {'number': 3 * spots + 1}, who=admin)
+        call('delete_spot', 'DELETE', f'{base}/spots/{spot_ids[1]}', who=admin)
+        call('delete_parking_spot', 'DELETE', f'/admin/spot/{spot_ids[2]}', who=admin)
+    call('update_parking_lot', 'PUT', base, {'price_per_hour': 12, 'maxSpots': spots}, who=admin)
+    call('delete_parking_lot', 'DELETE', base, who=admin)
+
+
+def _spot_id(lot_id, number):
+    # Looked up directly (the server, if any, runs in this process): the
+    # only route exposing spot ids is the whole admin dashboard
+    from backend.app import app
+
+    with app.app_context():
+        row = (db.session.query(ParkingSpot.id)
+               .filter_by(lot_id=lot_id, spot_number=number).first())
+        db.session.remove()
+    return row.id if row else None
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_load(app, dataset, concurrency, iterations, server=False, lot_spots=50):
+    """
+    Drive every route with `concurrency` threads, each running
+    `iterations` user and admin flows. Returns the report dict.
+    """
+    user_ids = dataset['user_ids']
+    admin_ids = dataset['admin_ids']
+    if not user_ids or not dataset['lot_ids']:
+        raise ValueError('the dataset needs at least one user and one lot')
+
+    with app.app_context():
+        tokens = {}
+        for i, user_id in enumerate(user_ids[:concurrency]):
+            tokens[f'user:{i}'] = create_access_token(
+                identity=str(user_id), additional_claims={'role': 'user'})
+        for i, admin_id in enumerate(admin_ids[:concurrency]):
+            tokens[f'admin:{i}'] = create_access_token(
+                identity=str(admin_id), additional_claims={'role': 'admin'})
+        emails = dict(db.session.query(User.id, User.email)
+                      .filter(User.id.in_(user_ids[:concurrency])))
+
+    httpd = None
+    if server:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        httpd = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    def transport():
+        if httpd:
+            return HttpTransport('127.0.0.1', httpd.server_port)
+        return TestClientTransport(app)
+
+    recorder = LoadRecorder()
+    stamp = dataset['stamp']
+
+    def worker(w):
+        call = Caller(transport(), recorder, tokens)
+        user = f'user:{w % len(user_ids)}'
+        admin = f'admin:{w % len(admin_ids)}'
+        lot_id = dataset['lot_ids'][w % len(dataset['lot_ids'])]
+        held = dataset['held_spots']
+        held_spot = held[w % len(held)] if held else None
+        for i in range(iterations):
+            user_flow(call, user, lot_id, emails[user_ids[w % len(user_ids)]])
+            admin_flow(call, admin, f'bench-{stamp}-w{w}-i{i}', lot_spots, held_spot)
+
+    route_metrics.reset()
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    if httpd:
+        httpd.shutdown()
+
+    return load_report(app, recorder, wall, concurrency, iterations, server)
+
+
+def load_report(app, recorder, wall, concurrency, iterations, server):
+    served = defaultdict(int)
+    for (endpoint, _method, _status), n in route_metrics.requests.items():
+        served[endpoint] += n
+
+    routes = {}
+    for endpoint in sorted(recorder.latency):
+        latencies = sorted(recorder.latency[endpoint])
+        entry = {'requests': len(latencies)}
+        for pct in PERCENTILES:
+            entry[f'p{pct}_ms'] = round(percentile(latencies, pct) * 1000, 2)
+        entry['max_ms'] = round(latencies[-1] * 1000, 2)
+        entry['rps'] = round(len(latencies) / wall, 2)
+        if served.get(endpoint):
+            entry['queries_per_request'] = round(route_metrics.queries[endpoint] / served[endpoint], 2)
+        entry['statuses'] = {str(code): n for code, n in sorted(
+            recorder.statuses[endpoint].items(), key=lambda item: str(item[0]))}
+        routes[endpoint] = entry
+
+    total = sum(entry['requests'] for entry in routes.values())
+    everything = sorted(t for e in recorder.latency.values() for t in e)
+    return {
+        'transport': 'http' if server else 'test-client',
+        'concurrency': concurrency,
+        'iterations': iterations,
+        'wall_seconds': round(wall, 3),
+        'requests': total,
+        'throughput_rps': round(total / wall, 2) if wall else None,
+        'overall': {f'p{pct}_ms': round(percentile(everything, pct) * 1000, 2)
+                    for pct in PERCENTILES} if everything else {},
+        'routes': routes,
+        'not_exercised': sorted(
+            endpoint for endpoint in app.view_functions
+            if endpoint != 'static' and endpoint not in routes
+        ),
+    }
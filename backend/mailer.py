@@ -0,0 +1,190 @@
+# backend/mailer.py
+"""
+SMTP delivery shared by every Celery mail task.
+
+`smtp_pool` keeps one SMTP connection open per worker process instead of
+paying a TLS handshake and login per message. The connection is checked
+with NOOP after it has sat idle, replaced after MAIL_POOL_MAX_MESSAGES
+sends or MAIL_POOL_MAX_IDLE seconds, and re-opened once when the server
+drops it mid-send.
+
+For micro-batching, transactional mail can instead be pushed onto a
+`MailQueue` and drained in bulk over the pooled connection (see
+tasks.drain_mail_queue).
+"""
+
+import json
+import smtplib
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+
+from backend.extensions import mail
+
+# Errors after which the connection is dead and a fresh one may succeed
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def _is_reconnectable(exc):
+    if isinstance(exc, RECONNECT_ERRORS):
+        return True
+    # 421: server is closing the channel (idle timeout, too many messages)
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code == 421
+
+
+class SMTPPool:
+    """A single long-lived Flask-Mail connection, safe to share across threads."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._conn = None
+        self._sent = 0
+        self._last_used = 0.0
+        self.connections_opened = 0
+
+    def _settings(self):
+        cfg = current_app.config
+        return (
+            cfg.get('MAIL_POOL_MAX_MESSAGES', 100),
+            cfg.get('MAIL_POOL_KEEPALIVE', 30),
+            cfg.get('MAIL_POOL_MAX_IDLE', 240),
+        )
+
+    def _open(self):
+        conn = mail.connect()
+        conn.__enter__()
+        self._conn = conn
+        self._sent = 0
+        self._last_used = time.monotonic()
+        self.connections_opened += 1
+
+    def _alive(self):
+        if self._conn.host is None:     # MAIL_SUPPRESS_SEND / TESTING
+            return True
+        try:
+            return self._conn.host.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _connection(self):
+        max_messages, keepalive, max_idle = self._settings()
+        if self._conn is not None:
+            idle = time.monotonic() - self._last_used
+            if self._sent >= max_messages or idle > max_idle:
+                self.close()
+            elif idle > keepalive and not self._alive():
+                self.close()
+        if self._conn is None:
+            self._open()
+        return self._conn
+
+    def send(self, message):
+        """Send a flask_mail.Message. Needs an app context."""
+        with self._lock:
+            try:
+                self._connection().send(message)
+            except Exception as exc:
+                if not _is_reconnectable(exc):
+                    raise
+                self.close()
+                self._connection().send(message)
+            self._sent += 1
+            self._last_used = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            conn, self._conn = self._conn, None
+            if conn is not None and conn.host is not None:
+                try:
+                    conn.host.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+
+
+smtp_pool = SMTPPool()
+
+
+class MailQueue:
+    """
+    Pending transactional emails waiting for the next drain, as JSON dicts.
+
+    Backed by a Redis list so every worker feeds the same queue. A
+    MAIL_QUEUE_URL of memory:// keeps it in-process instead, which is
+    what eager/dev setups and the benchmarks use.
+    """
+
+    KEY = 'parkwise:mail:pending'
+    DRAIN_KEY = 'parkwise:mail:drain-scheduled'
+
+    def __init__(self, url):
+        self.url = url
+        if url.startswith('memory://'):
+            self._items = deque()
+            self._drain_until = 0.0
+            self._redis = None
+        else:
+            import redis
+            self._redis = redis.Redis.from_url(url)
+
+    def push(self, payload):
+        data = json.dumps(payload)
+        if self._redis is None:
+            self._items.append(data)
+        else:
+            self._redis.rpush(self.KEY, data)
+
+    def push_front(self, payloads):
+        """Put undelivered payloads back at the head, keeping their order."""
+        data = [json.dumps(p) for p in payloads]
+        if not data:
+            return
+        if self._redis is None:
+            self._items.extendleft(reversed(data))
+        else:
+            self._redis.lpush(self.KEY, *reversed(data))
+
+    def pop_many(self, count):
+        if self._redis is None:
+            items = []
+            while self._items and len(items) < count:
+                items.append(self._items.popleft())
+        else:
+            items = self._redis.lpop(self.KEY, count) or []
+        return [json.loads(item) for item in items]
+
+    def claim_drain(self, window):
+        """
+        True for the first caller in each `window` seconds, so only one
+        drain gets scheduled per window no matter how many emails arrive.
+        """
+        if self._redis is None:
+            now = time.monotonic()
+            if now < self._drain_until:
+                return False
+            self._drain_until = now + window
+            return True
+        return bool(self._redis.set(self.DRAIN_KEY, 1, nx=True, ex=max(1, int(window))))
+
+    def release_drain(self):
+        if self._redis is None:
+            self._drain_until = 0.0
+        else:
+            self._redis.delete(self.DRAIN_KEY)
+
+    def __len__(self):
+        if self._redis is None:
+            return len(self._items)
+        return self._redis.llen(self.KEY)
+
+
+_queues = {}
+
+
+def get_mail_queue():
+    """The MailQueue for the current app's MAIL_QUEUE_URL (one per process)."""
+    url = current_app.config.get('MAIL_QUEUE_URL', 'redis://localhost:6379/0')
+    if url not in _queues:
+        _queues[url] = MailQueue(url)
+    return _queues[url]
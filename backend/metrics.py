@@ -0,0 +1,204 @@
+# backend/metrics.py
+"""
+Per-route request metrics in Prometheus text format, served at /metrics.
+
+Flask request hooks time every request and SQLAlchemy cursor events
+count the queries it runs and the time spent in them, all keyed by the
+Flask endpoint name. Recording is a few perf_counter calls and dict
+updates under one lock, cheap enough to leave on in production.
+
+Counters live in process memory, so each worker process reports its own
+numbers; Prometheus sums them across scrape targets as usual. Latency is
+measured from before_request to teardown, which for a streamed response
+runs once the body has been sent, so it includes the streaming time (and
+the queries run while streaming count towards the route).
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+from backend.query_budget import query_budget
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+UNMATCHED = '<unmatched>'   # endpoint label for requests no route matched
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects it."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+        for k, v in labels.items()
+    )
+
+
+class RouteMetrics:
+    """Per-endpoint request, latency and SQL statistics for one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)                     # (endpoint, method, status)
+            self.latency = {}                                    # (endpoint, method) -> Histogram
+            self.queries = defaultdict(int)                      # endpoint
+            self.db_seconds = defaultdict(float)                 # endpoint
+            self.queries_per_request = {}                        # endpoint -> Histogram
+
+    def record(self, endpoint, method, status, seconds, queries, db_seconds):
+        with self._lock:
+            self.requests[endpoint, method, status] += 1
+            hist = self.latency.get((endpoint, method))
+            if hist is None:
+                hist = self.latency[endpoint, method] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+            self.queries[endpoint] += queries
+            self.db_seconds[endpoint] += db_seconds
+            hist = self.queries_per_request.get(endpoint)
+            if hist is None:
+                hist = self.queries_per_request[endpoint] = Histogram(QUERY_COUNT_BUCKETS)
+            hist.observe(queries)
+
+    def render(self):
+        """The current values in Prometheus text exposition format."""
+        lines = []
+
+        def histogram(name, help_text, series):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, hist in series:
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{{{_labels(**labels, le=bound)}}} {count}')
+                lines.append(f'{name}_bucket{{{_labels(**labels, le="+Inf")}}} {hist.count}')
+                lines.append(f'{name}_sum{{{_labels(**labels)}}} {hist.sum}')
+                lines.append(f'{name}_count{{{_labels(**labels)}}} {hist.count}')
+
+        with self._lock:
+            lines.append('# HELP parkwise_http_requests_total Requests handled, by endpoint, method and status.')
+            lines.append('# TYPE parkwise_http_requests_total counter')
+            for (endpoint, method, status), n in sorted(self.requests.items()):
+                lines.append(
+                    f'parkwise_http_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} {n}'
+                )
+
+            histogram(
+                'parkwise_http_request_duration_seconds',
+                'Time from request start until the response was sent.',
+                ((dict(endpoint=e, method=m), h) for (e, m), h in sorted(self.latency.items())),
+            )
+
+            lines.append('# HELP parkwise_db_queries_total SQL statements executed while handling requests.')
+            lines.append('# TYPE parkwise_db_queries_total counter')
+            for endpoint, n in sorted(self.queries.items()):
+                lines.append(f'parkwise_db_queries_total{{{_labels(endpoint=endpoint)}}} {n}')
+
+            lines.append('# HELP parkwise_db_seconds_total Time spent executing SQL while handling requests.')
+            lines.append('# TYPE parkwise_db_seconds_total counter')
+            for endpoint, secs in sorted(self.db_seconds.items()):
+                lines.append(f'parkwise_db_seconds_total{{{_labels(endpoint=endpoint)}}} {secs}')
+
+            histogram(
+                'parkwise_db_queries_per_request',
+                'SQL statements per request; a high tail usually means an N+1 loop.',
+                ((dict(endpoint=e), h) for e, h in sorted(self.queries_per_request.items())),
+            )
+
+        return '\n'.join(lines) + '\n'
+
+
+route_metrics = RouteMetrics()
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_db_seconds = 0.0
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    route_metrics.record(
+        request.endpoint or UNMATCHED,
+        request.method,
+        g.pop('metrics_status', 500),
+        time.perf_counter() - started,
+        g.pop('metrics_queries', 0),
+        g.pop('metrics_db_seconds', 0.0),
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get('metrics_query_start')
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_queries += 1
+        g.metrics_db_seconds += elapsed
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute; drop its start
+    conn = exception_context.connection
+    stack = conn.info.get('metrics_query_start') if conn is not None else None
+    if stack and exception_context.execution_context is not None:
+        stack.pop()
+
+
+def metrics_view():
+    return Response(route_metrics.render(), content_type=CONTENT_TYPE)
+
+
+def init_metrics(app, db):
+    """
+    Install the request and cursor hooks and the /metrics route. Call it
+    before any other before_request hook so requests those short-circuit
+    (CORS preflight) are still timed.
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+    app.add_url_rule('/metrics', 'metrics', query_budget(0)(metrics_view), methods=['GET'])
@@ -0,0 +1,60 @@
+"""hot path indexes
+
+Revision ID: 09187cab896e
+Revises: fcacbf37bf9c
+Create Date: 2026-10-18 10:03:11.590427
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '09187cab896e'
+down_revision = 'fcacbf37bf9c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The unique index below fails on duplicates; name them instead of
+    # leaving the caller with a bare IntegrityError.
+    dupes = op.get_bind().execute(sa.text("""
+        SELECT lot_id, spot_number FROM parking_spot
+        GROUP BY lot_id, spot_number HAVING COUNT(*) > 1
+    """)).fetchall()
+    if dupes:
+        listed = ', '.join(f"lot {lot_id} spot {number}" for lot_id, number in dupes)
+        raise RuntimeError(f"Duplicate spot numbers must be fixed before upgrading: {listed}")
+
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.create_index('ix_parking_lot_created_by', ['created_by'], unique=False)
+
+    with op.batch_alter_table('parking_spot', schema=None) as batch_op:
+        batch_op.create_index('uq_parking_spot_lot_number', ['lot_id', 'spot_number'], unique=True)
+        batch_op.create_index('ix_parking_spot_lot_free', ['lot_id', 'is_reserved', 'spot_number'], unique=False)
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_user_start', ['user_id', sa.text('start_time DESC')], unique=False)
+        batch_op.create_index('ix_reservation_user_end', ['user_id', 'end_time'], unique=False)
+        batch_op.create_index('ix_reservation_lot_end', ['lot_id', 'end_time'], unique=False)
+        batch_op.create_index(
+            'ix_reservation_active_spot', ['spot_id'], unique=False,
+            sqlite_where=sa.text('end_time IS NULL'),
+            postgresql_where=sa.text('end_time IS NULL'),
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_active_spot')
+        batch_op.drop_index('ix_reservation_lot_end')
+        batch_op.drop_index('ix_reservation_user_end')
+        batch_op.drop_index('ix_reservation_user_start')
+
+    with op.batch_alter_table('parking_spot', schema=None) as batch_op:
+        batch_op.drop_index('ix_parking_spot_lot_free')
+        batch_op.drop_index('uq_parking_spot_lot_number')
+
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.drop_index('ix_parking_lot_created_by')
@@ -0,0 +1,34 @@
+"""outbox failed_at
+
+Revision ID: 3b8e2d41c7a9
+Revises: f4219f6b6459
+Create Date: 2026-10-18 21:40:12.318045
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8e2d41c7a9'
+down_revision = 'f4219f6b6459'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('outbox_message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('failed_at', sa.DateTime(), nullable=True))
+        batch_op.drop_index('ix_outbox_message_pending')
+        batch_op.create_index('ix_outbox_message_pending', ['id'], unique=False,
+                              sqlite_where=sa.text('sent_at IS NULL AND failed_at IS NULL'),
+                              postgresql_where=sa.text('sent_at IS NULL AND failed_at IS NULL'))
+
+
+def downgrade():
+    with op.batch_alter_table('outbox_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_outbox_message_pending')
+        batch_op.create_index('ix_outbox_message_pending', ['id'], unique=False,
+                              sqlite_where=sa.text('sent_at IS NULL'),
+                              postgresql_where=sa.text('sent_at IS NULL'))
+        batch_op.drop_column('failed_at')
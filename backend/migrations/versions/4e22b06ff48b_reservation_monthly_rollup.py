@@ -0,0 +1,57 @@
+"""reservation monthly rollup
+
+Revision ID: 4e22b06ff48b
+Revises: 63dd7e67cf80
+Create Date: 2026-10-18 15:31:08.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e22b06ff48b'
+down_revision = '63dd7e67cf80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reservation_monthly_rollup',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('lot_id', sa.Integer(), nullable=False),
+    sa.Column('visits', sa.Integer(), nullable=False),
+    sa.Column('total_seconds', sa.Integer(), nullable=False),
+    sa.Column('total_cost', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['lot_id'], ['parking_lot.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'month', 'lot_id')
+    )
+    with op.batch_alter_table('reservation_monthly_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_monthly_rollup_month', ['month', 'user_id'], unique=False)
+
+    # Backfill from finished reservations (same as `flask rebuild-monthly-rollup`)
+    if op.get_bind().dialect.name == 'sqlite':
+        month = "date(end_time, 'start of month')"
+        seconds = "(julianday(end_time) - julianday(start_time)) * 86400.0"
+    else:
+        month = "CAST(date_trunc('month', end_time) AS DATE)"
+        seconds = "extract(epoch from end_time - start_time)"
+    op.execute(f"""
+        INSERT INTO reservation_monthly_rollup
+            (user_id, month, lot_id, visits, total_seconds, total_cost)
+        SELECT user_id, {month}, lot_id, COUNT(id),
+               COALESCE(SUM(CAST(round({seconds}) AS INTEGER)), 0),
+               COALESCE(SUM(cost), 0)
+        FROM reservation
+        WHERE end_time IS NOT NULL
+        GROUP BY user_id, {month}, lot_id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation_monthly_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_monthly_rollup_month')
+
+    op.drop_table('reservation_monthly_rollup')
@@ -0,0 +1,26 @@
+"""reservation spot index
+
+Revision ID: 8d1f5c2a9e37
+Revises: 3b8e2d41c7a9
+Create Date: 2026-10-18 22:15:47.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d1f5c2a9e37'
+down_revision = '3b8e2d41c7a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_spot', ['spot_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_spot')
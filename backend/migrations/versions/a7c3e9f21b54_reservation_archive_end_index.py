@@ -0,0 +1,26 @@
+"""reservation archive end index
+
+Revision ID: a7c3e9f21b54
+Revises: 8d1f5c2a9e37
+Create Date: 2026-10-18 22:48:09.554310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f21b54'
+down_revision = '8d1f5c2a9e37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_archive_end', ['end_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_archive_end')
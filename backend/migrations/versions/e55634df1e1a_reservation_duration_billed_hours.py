@@ -0,0 +1,47 @@
+"""reservation duration and billed hours
+
+Revision ID: e55634df1e1a
+Revises: 4e22b06ff48b
+Create Date: 2026-10-18 16:47:52.120655
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e55634df1e1a'
+down_revision = '4e22b06ff48b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('duration_seconds', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('billed_hours', sa.Integer(), nullable=True))
+
+    # Backfill finished reservations with the rules in backend/billing.py:
+    # whole seconds, billed per started hour with a one-hour minimum
+    if op.get_bind().dialect.name == 'sqlite':
+        seconds = "(julianday(end_time) - julianday(start_time)) * 86400.0"
+        greatest = "max"
+    else:
+        seconds = "extract(epoch from end_time - start_time)"
+        greatest = "GREATEST"
+    op.execute(f"""
+        UPDATE reservation
+        SET duration_seconds = CAST(round({seconds}) AS INTEGER)
+        WHERE end_time IS NOT NULL
+    """)
+    op.execute(f"""
+        UPDATE reservation
+        SET billed_hours = {greatest}(1, (duration_seconds + 3599) / 3600)
+        WHERE duration_seconds IS NOT NULL
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_column('billed_hours')
+        batch_op.drop_column('duration_seconds')
@@ -0,0 +1,45 @@
+"""reservation archive
+
+Revision ID: f4219f6b6459
+Revises: e55634df1e1a
+Create Date: 2026-10-18 18:02:36.581930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4219f6b6459'
+down_revision = 'e55634df1e1a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reservation_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('lot_id', sa.Integer(), nullable=False),
+    sa.Column('lot_name', sa.String(length=120), nullable=False),
+    sa.Column('spot_id', sa.Integer(), nullable=False),
+    sa.Column('spot_number', sa.Integer(), nullable=True),
+    sa.Column('start_time', sa.DateTime(), nullable=True),
+    sa.Column('end_time', sa.DateTime(), nullable=True),
+    sa.Column('cost', sa.Float(), nullable=True),
+    sa.Column('duration_seconds', sa.Integer(), nullable=True),
+    sa.Column('billed_hours', sa.Integer(), nullable=True),
+    sa.Column('vehicle_number', sa.String(length=50), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_archive_user', ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_archive_user')
+
+    op.drop_table('reservation_archive')
@@ -0,0 +1,42 @@
+"""lot spot counters
+
+Revision ID: fcacbf37bf9c
+Revises: 6150de3a8052
+Create Date: 2026-10-18 09:12:40.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fcacbf37bf9c'
+down_revision = '6150de3a8052'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_spots', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('available_spots', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the spots that already exist
+    op.execute("""
+        UPDATE parking_lot SET
+            total_spots = (
+                SELECT COUNT(*) FROM parking_spot
+                WHERE parking_spot.lot_id = parking_lot.id
+            ),
+            available_spots = (
+                SELECT COUNT(*) FROM parking_spot
+                WHERE parking_spot.lot_id = parking_lot.id
+                  AND (parking_spot.is_reserved IS NULL OR NOT parking_spot.is_reserved)
+            )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.drop_column('available_spots')
+        batch_op.drop_column('total_spots')
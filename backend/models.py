@@ -19,6 +19,9 @@ class User(db.Model):
     reservations  = db.relationship('Reservation',   backref='user',    lazy=True)
 class ParkingLot(db.Model):
     __tablename__ = 'parking_lot'
+    __table_args__ = (
+        db.Index('ix_parking_lot_created_by', 'created_by'),
+    )
 
     id             = db.Column(db.Integer, primary_key=True)
     name           = db.Column(db.String(120), unique=True, nullable=False)
@@ -26,6 +29,12 @@ class ParkingLot(db.Model):
     pincode        = db.Column(db.String(20),               nullable=False)
     price_per_hour = db.Column(db.Float,                    nullable=False)
     created_by     = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    # Denormalized occupancy, kept in step with parking_spot by the routes
+    # that reserve, release, add or remove spots (see `flask reconcile-lot-counters`)
+    total_spots     = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    available_spots = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     spots         = db.relationship(
         'ParkingSpot',
         backref='lot',
@@ -35,6 +44,10 @@ class ParkingLot(db.Model):
     reservations  = db.relationship('Reservation', backref='lot', lazy=True)
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spot'
+    __table_args__ = (
+        db.Index('uq_parking_spot_lot_number', 'lot_id', 'spot_number', unique=True),
+        db.Index('ix_parking_spot_lot_free', 'lot_id', 'is_reserved', 'spot_number'),
+    )
 
     id           = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id', ondelete='CASCADE'), nullable=False)
@@ -44,7 +57,20 @@ class ParkingSpot(db.Model):
     reservations = db.relationship('Reservation', backref='spot', lazy=True)
 class Reservation(db.Model):
     __tablename__ = 'reservation'
-    
+    __table_args__ = (
+        db.Index('ix_reservation_user_start', 'user_id', db.text('start_time DESC')),
+        db.Index('ix_reservation_user_end', 'user_id', 'end_time'),
+        db.Index('ix_reservation_lot_end', 'lot_id', 'end_time'),
+        # "Has this spot ever been booked?", asked before a lot shrinks
+        db.Index('ix_reservation_spot', 'spot_id'),
+        # Only open reservations, so "who is parked in this spot" stays tiny
+        db.Index(
+            'ix_reservation_active_spot', 'spot_id',
+            sqlite_where=db.text('end_time IS NULL'),
+            postgresql_where=db.text('end_time IS NULL'),
+        ),
+    )
+
     id             = db.Column(db.Integer, primary_key=True)
     user_id        = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     lot_id         = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
@@ -53,6 +79,9 @@ class Reservation(db.Model):
     end_time       = db.Column(db.DateTime, nullable=True)
     released_at    = db.Column(db.DateTime, nullable=True)
     cost           = db.Column(db.Float, nullable=True)
+    # Stored by release (see backend/billing.py); NULL while the reservation is open
+    duration_seconds = db.Column(db.Integer, nullable=True)
+    billed_hours     = db.Column(db.Integer, nullable=True)
     vehicle_number = db.Column(db.String(50), nullable=False)
 
     parking_spot = db.relationship(
@@ -63,3 +92,62 @@ class Reservation(db.Model):
 )
 
 
+class ReservationArchive(db.Model):
+    """Finished reservations of deleted lots, with the lot and spot details copied in."""
+    __tablename__ = 'reservation_archive'
+    __table_args__ = (
+        db.Index('ix_reservation_archive_user', 'user_id'),
+        # Monthly summaries and reports read a month of it by end_time
+        db.Index('ix_reservation_archive_end', 'end_time'),
+    )
+
+    # Same id as the reservation it came from; lot/spot ids are kept for
+    # reference only, as those rows no longer exist
+    id               = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id          = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    lot_id           = db.Column(db.Integer, nullable=False)
+    lot_name         = db.Column(db.String(120), nullable=False)
+    spot_id          = db.Column(db.Integer, nullable=False)
+    spot_number      = db.Column(db.Integer, nullable=True)
+    start_time       = db.Column(db.DateTime, nullable=True)
+    end_time         = db.Column(db.DateTime, nullable=True)
+    cost             = db.Column(db.Float, nullable=True)
+    duration_seconds = db.Column(db.Integer, nullable=True)
+    billed_hours     = db.Column(db.Integer, nullable=True)
+    vehicle_number   = db.Column(db.String(50), nullable=False)
+    archived_at      = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+class ReservationMonthlyRollup(db.Model):
+    """Finished reservations per user, lot and month (by end_time), kept up to date on release."""
+    __tablename__ = 'reservation_monthly_rollup'
+    __table_args__ = (
+        # Monthly report reads a whole month across users
+        db.Index('ix_reservation_monthly_rollup_month', 'month', 'user_id'),
+    )
+
+    # Key columns ordered so "this user, this month" is a primary-key range read
+    user_id       = db.Column(db.Integer, db.ForeignKey('users.id'),       primary_key=True)
+    month         = db.Column(db.Date,                                      primary_key=True)  # first of month
+    lot_id        = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key=True)
+    visits        = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Integer, nullable=False, default=0)
+    total_cost    = db.Column(db.Float,   nullable=False, default=0)
+class OutboxMessage(db.Model):
+    """A Celery task to publish, written in the same transaction as the change it announces."""
+    __tablename__ = 'outbox_message'
+    __table_args__ = (
+        # The relay only ever reads unsent, not given-up rows, oldest first
+        db.Index(
+            'ix_outbox_message_pending', 'id',
+            sqlite_where=db.text('sent_at IS NULL AND failed_at IS NULL'),
+            postgresql_where=db.text('sent_at IS NULL AND failed_at IS NULL'),
+        ),
+    )
+
+    id         = db.Column(db.Integer, primary_key=True)
+    task       = db.Column(db.String(120), nullable=False)
+    args       = db.Column(db.Text,        nullable=False)   # JSON list
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at    = db.Column(db.DateTime, nullable=True)
+    attempts   = db.Column(db.Integer,  nullable=False, default=0, server_default='0')
+    last_error = db.Column(db.String(255), nullable=True)
+    failed_at  = db.Column(db.DateTime, nullable=True)   # set after MAX_ATTEMPTS failures
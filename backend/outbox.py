@@ -0,0 +1,135 @@
+# backend/outbox.py
+"""
+Transactional outbox for Celery tasks.
+
+Request handlers call `enqueue_task` before `db.session.commit()`, so the
+task row commits (or rolls back) together with the reservation change and
+the response never waits on the broker. `relay_outbox` runs in a separate
+process (`flask relay-outbox`): it publishes pending rows in id order and
+stamps them sent.
+
+Delivery is at-least-once: a relay that dies between publishing and
+committing will publish that batch again, so tasks fed from here must be
+safe to run twice.
+
+A row that fails to publish for its own reasons (bad arguments, an
+unknown task, ...) is retried on later passes, but after MAX_ATTEMPTS it
+is stamped failed_at and skipped from then on, so it cannot hold up the
+rows behind it. `flask relay-outbox --requeue-failed` puts failed rows
+back in line. A broker that cannot be reached is not the row's fault:
+the pass stops and no attempt is counted.
+
+With `task_always_eager` set, publishing runs the task inline, which is
+how the relay can be exercised without a broker.
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+from kombu.exceptions import OperationalError
+
+from backend.extensions import celery
+from backend.models import db, OutboxMessage
+
+RELAY_BATCH_SIZE = 100
+RELAY_INTERVAL = 1.0    # seconds the relay sleeps when the outbox is empty
+SENT_RETENTION = timedelta(days=7)
+PURGE_EVERY = 3600      # seconds between purges of old sent rows
+MAX_ATTEMPTS = 5        # publish failures before a row is given up on
+
+
+def enqueue_task(task, *args):
+    """Stage `task(*args)` in the current session; it is sent once committed."""
+    message = OutboxMessage(task=task, args=json.dumps(args))
+    db.session.add(message)
+    return message
+
+
+def publish(message):
+    # signature() resolves registered tasks, so eager mode is honoured;
+    # unknown names fall back to a plain send_task
+    celery.signature(message.task, args=json.loads(message.args)).apply_async()
+
+
+def relay_outbox(batch_size=RELAY_BATCH_SIZE):
+    """
+    Publish one batch of pending outbox rows. Needs an app context.
+
+    A row that fails records the error and an attempt, and is marked
+    failed once it reaches MAX_ATTEMPTS; the rows after it are still
+    published. If the broker itself is unreachable the pass stops at that
+    row without counting an attempt, since the rest would fail too.
+    Returns (published, failed).
+    """
+    pending = (
+        OutboxMessage.query
+        .filter(OutboxMessage.sent_at.is_(None), OutboxMessage.failed_at.is_(None))
+        .order_by(OutboxMessage.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    published = failed = 0
+    for message in pending:
+        try:
+            publish(message)
+        except OperationalError as exc:
+            message.last_error = f"{type(exc).__name__}: {exc}"[:255]
+            failed += 1
+            break
+        except Exception as exc:
+            message.attempts += 1
+            message.last_error = f"{type(exc).__name__}: {exc}"[:255]
+            if message.attempts >= MAX_ATTEMPTS:
+                message.failed_at = datetime.utcnow()
+            failed += 1
+            continue
+        message.sent_at = datetime.utcnow()
+        published += 1
+
+    db.session.commit()
+    return published, failed
+
+
+def requeue_failed():
+    """Give every failed row a fresh set of attempts. Returns how many."""
+    requeued = (
+        OutboxMessage.query
+        .filter(OutboxMessage.failed_at.isnot(None))
+        .update({'failed_at': None, 'attempts': 0}, synchronize_session=False)
+    )
+    db.session.commit()
+    return requeued
+
+
+def purge_sent(retention=SENT_RETENTION):
+    """Delete rows that were published more than `retention` ago."""
+    deleted = (
+        OutboxMessage.query
+        .filter(OutboxMessage.sent_at < datetime.utcnow() - retention)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    return deleted
+
+
+def run_relay(batch_size=RELAY_BATCH_SIZE, interval=RELAY_INTERVAL, once=False):
+    """
+    Relay until interrupted, sleeping `interval` whenever there is nothing
+    to do. With `once`, return the number published as soon as the outbox
+    is drained (or publishing fails).
+    """
+    total = 0
+    last_purge = time.monotonic()
+    while True:
+        published, failed = relay_outbox(batch_size)
+        total += published
+        if failed or published < batch_size:
+            if once:
+                return total
+            if time.monotonic() - last_purge > PURGE_EVERY:
+                purge_sent()
+                last_purge = time.monotonic()
+            time.sleep(interval)
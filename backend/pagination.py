@@ -0,0 +1,92 @@
+# backend/pagination.py
+"""
+Keyset (cursor) pagination helpers for list endpoints ordered by
+(start_time DESC, id DESC). Cursors are opaque to clients.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed limit, cursor or filter value."""
+
+
+def encode_cursor(start_time, row_id):
+    raw = json.dumps([start_time.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        start_iso, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(start_iso), int(row_id)
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_datetime(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise PaginationError(f'{name} must be an ISO date or datetime')
+
+
+def parse_id(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise PaginationError(f'{name} must be an integer')
+
+
+def after_cursor(start_col, id_col, cursor):
+    """Filter for rows strictly after `cursor` in (start DESC, id DESC) order."""
+    start_time, row_id = cursor
+    return or_(
+        start_col < start_time,
+        and_(start_col == start_time, id_col < row_id),
+    )
+
+
+def paginate(query, start_col, id_col, limit, cursor=None):
+    """
+    Apply the cursor and ordering to `query` and fetch one page.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    `query` rows must expose `start_time` and `id` attributes.
+    """
+    if cursor is not None:
+        query = query.filter(after_cursor(start_col, id_col, cursor))
+    rows = (
+        query
+        .order_by(start_col.desc(), id_col.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.start_time, last.id)
@@ -0,0 +1,249 @@
+# backend/profiling.py
+"""
+On-demand profiling of single requests.
+
+With PROFILING_ENABLED on, an admin fetches a short-lived profiling token
+from POST /admin/profiles/token. Any request carrying that token, in
+the X-Profile-Token header or the _profile query parameter, runs under a
+profiler. This works on any route and with any other credentials, so a
+user-only route can be profiled with the user's own JWT. The response
+gets an X-Profile-Id header. Only one request per process is profiled
+at a time; a token arriving while another profile runs is ignored.
+
+The profiler is pyinstrument (sampling, HTML output) when it is
+installed and PROFILER is 'auto' or 'sampling', otherwise cProfile,
+whose output is a pstats dump. Profiling starts before the view and
+stops at teardown, so a streamed body is included. Each profile is
+written to PROFILE_DIR with a JSON sidecar describing the request
+(query argument names, never their values); only the newest
+PROFILE_KEEP are kept. GET /admin/profiles lists them
+and GET /admin/profiles/<id> downloads one (?format=text renders a
+cProfile dump as a pstats summary).
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_PARAM = '_profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+# How long a profiling token stays valid (seconds)
+TOKEN_MAX_AGE = 15 * 60
+
+_SALT = 'request-profile'
+_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$')
+
+# One profiled request at a time per process: profilers hook the
+# interpreter, and a second one would either fail or skew the first
+_profiling = threading.Lock()
+
+# file suffix and mimetype per profiler kind
+OUTPUTS = {
+    'cprofile': ('.prof', 'application/octet-stream'),
+    'sampling': ('.html', 'text/html'),
+}
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt=_SALT)
+
+
+def make_profile_token(admin_id):
+    return _serializer().dumps({'admin_id': admin_id})
+
+
+def load_profile_token(token):
+    """The admin id the token was issued to, or None if it is bad or expired."""
+    try:
+        return _serializer().loads(token, max_age=TOKEN_MAX_AGE)['admin_id']
+    except (BadSignature, KeyError, TypeError):
+        return None
+
+
+def profile_dir():
+    return current_app.config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+
+
+def valid_profile_id(profile_id):
+    return bool(_ID_RE.match(profile_id or ''))
+
+
+class _SamplingProfiler:
+    """pyinstrument behind the same start/stop/write interface as _CProfiler."""
+
+    kind = 'sampling'
+
+    def __init__(self):
+        from pyinstrument import Profiler
+        self.profiler = Profiler()
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(self.profiler.output_html())
+
+
+class _CProfiler:
+    kind = 'cprofile'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def write(self, path):
+        self.profiler.dump_stats(path)
+
+
+def make_profiler():
+    if current_app.config.get('PROFILER', 'auto') in ('auto', 'sampling'):
+        try:
+            return _SamplingProfiler()
+        except ImportError:
+            pass
+    return _CProfiler()
+
+
+def _start_profile():
+    token = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+    if not token:
+        return
+    admin_id = load_profile_token(token)
+    if admin_id is None or not _profiling.acquire(blocking=False):
+        return
+
+    # Until g.profile is set, teardown will not release the lock; any
+    # failure before then must, or profiling stays off for the process
+    try:
+        profiler = make_profiler()
+        profiler.start()
+    except BaseException:
+        _profiling.release()
+        raise
+    g.profile = {
+        'id': datetime.utcnow().strftime('%Y%m%dT%H%M%S%f') + '-' + uuid.uuid4().hex[:8],
+        'profiler': profiler,
+        'admin_id': admin_id,
+        'started': time.perf_counter(),
+    }
+
+
+def _tag_response(response):
+    profile = g.get('profile')
+    if profile:
+        profile['status'] = response.status_code
+        response.headers[PROFILE_ID_HEADER] = profile['id']
+    return response
+
+
+def _finish_profile(exc):
+    profile = g.pop('profile', None)
+    if not profile:
+        return
+    profiler = profile['profiler']
+    try:
+        profiler.stop()
+    finally:
+        _profiling.release()
+    seconds = time.perf_counter() - profile['started']
+
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    suffix, _mimetype = OUTPUTS[profiler.kind]
+    profiler.write(os.path.join(directory, profile['id'] + suffix))
+    with open(os.path.join(directory, profile['id'] + '.json'), 'w', encoding='utf-8') as fh:
+        json.dump({
+            'id': profile['id'],
+            'kind': profiler.kind,
+            'method': request.method,
+            'path': request.path,
+            # names only: values can be credentials (the export download's
+            # token, the profiling token itself) that must not outlive the request
+            'args': sorted(k for k in request.args if k != PROFILE_PARAM),
+            'endpoint': request.endpoint,
+            'status': profile.get('status', 500),
+            'seconds': round(seconds, 4),
+            'admin_id': profile['admin_id'],
+            'created_at': datetime.utcnow().isoformat(),
+        }, fh)
+    prune_profiles(directory, current_app.config.get('PROFILE_KEEP', 50))
+
+
+def prune_profiles(directory, keep):
+    """Delete all but the newest `keep` profiles (and their sidecars)."""
+    ids = sorted(
+        (name[:-len('.json')] for name in os.listdir(directory) if name.endswith('.json')),
+        reverse=True,     # ids start with a UTC timestamp
+    )
+    for profile_id in ids[keep:]:
+        for suffix in ('.json',) + tuple(s for s, _ in OUTPUTS.values()):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Metadata of the kept profiles, newest first."""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as fh:
+                profiles.append(json.load(fh))
+        except (OSError, ValueError):
+            continue     # pruned or half-written under us
+    return profiles
+
+
+def profile_file(profile_id):
+    """(path, mimetype, kind) of a kept profile, or None."""
+    if not valid_profile_id(profile_id):
+        return None
+    for kind, (suffix, mimetype) in OUTPUTS.items():
+        path = os.path.join(profile_dir(), profile_id + suffix)
+        if os.path.exists(path):
+            return path, mimetype, kind
+    return None
+
+
+def pstats_text(path, limit=60):
+    """A cProfile dump as a cumulative-time pstats listing."""
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def init_profiling(app):
+    """Install the request hooks if PROFILING_ENABLED is set."""
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    app.before_request(_start_profile)
+    app.after_request(_tag_response)
+    app.teardown_request(_finish_profile)
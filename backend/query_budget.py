@@ -0,0 +1,137 @@
+# backend/query_budget.py
+"""
+Query budgets: a declared ceiling on the SQL statements one request or
+task may run.
+
+    @app.route('/user/dashboard')
+    @query_budget(3)
+    def user_dashboard(): ...
+
+    with query_budget(2, 'tasks.export_reservations_to_csv'):
+        ...
+
+A lazy relationship load inside a loop turns a fixed number of queries
+into one per row; under a budget that shows up as QueryBudgetExceeded
+the first time the route runs against more than a handful of rows,
+instead of as a slow page in production.
+
+Budgets raise when QUERY_BUDGET_ENFORCE is set, which defaults to on in
+debug and testing; otherwise an overrun is only logged. Budgets nest: a
+statement counts against every budget that is open at the time. When a
+decorated view returns a streamed response, its budget stays open
+while the body is read, so the queries the stream runs count too.
+backend/tests/test_query_budgets.py runs every route against two
+dataset sizes and checks the counts stay within budget and do not grow.
+"""
+
+import contextvars
+import logging
+from functools import wraps
+
+from flask import Response, current_app, has_app_context
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_active = contextvars.ContextVar('query_budgets', default=())
+
+# Statements kept per budget for the error message
+MAX_KEPT_STATEMENTS = 50
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """More SQL statements ran than the enclosing query_budget allows."""
+
+
+def _enforcing():
+    if not has_app_context():
+        return False
+    app = current_app
+    enforce = app.config.get('QUERY_BUDGET_ENFORCE')
+    if enforce is None:
+        return app.debug or app.testing
+    return bool(enforce)
+
+
+class query_budget:
+    """Context manager / decorator allowing at most `limit` statements."""
+
+    def __init__(self, limit, name=None):
+        self.limit = limit
+        self.name = name
+        self.count = 0
+        self.statements = []
+
+    def __enter__(self):
+        self.count = 0
+        self.statements = []
+        self._token = _active.set(_active.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active.reset(self._token)
+        if exc_type is None:
+            self._check(_enforcing())
+        return False
+
+    def _check(self, enforce):
+        if self.count <= self.limit:
+            return
+        message = (
+            f"{self.name or 'block'} ran {self.count} SQL statements, "
+            f"budget is {self.limit}"
+        )
+        if enforce:
+            raise QueryBudgetExceeded(message + ':\n' + '\n'.join(self.statements))
+        logger.warning(message)
+
+    def _counting(self, body, enforce):
+        """Iterate a response body with this budget open around each chunk."""
+        chunks = iter(body)
+        try:
+            while True:
+                token = _active.set(_active.get() + (self,))
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    _active.reset(token)
+                yield chunk
+            self._check(enforce)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    def __call__(self, fn):
+        name = self.name or fn.__name__
+        limit = self.limit
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # A fresh counter per call, so concurrent requests never share one
+            budget = query_budget(limit, name)
+            with budget:
+                rv = fn(*args, **kwargs)
+            response = rv[0] if isinstance(rv, tuple) else rv
+            if isinstance(response, Response) and response.is_streamed:
+                # the app context is gone by the time the body is drained
+                response.response = budget._counting(response.response, _enforcing())
+            return rv
+
+        wrapper.query_budget = limit
+        return wrapper
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for budget in _active.get():
+        budget.count += 1
+        if len(budget.statements) < MAX_KEPT_STATEMENTS:
+            budget.statements.append(statement)
+
+
+def init_query_budgets(app, db):
+    """Count statements on the app's engine for any open budget."""
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _count_statement)
@@ -0,0 +1,140 @@
+# backend/query_plans.py
+"""
+EXPLAIN QUERY PLAN checks on the SQL the hot routes actually emit, so a
+dropped or unused index shows up as a failing check instead of a slow
+page. SQLite only.
+
+`capture_plans` explains every statement sent while it is open, on the
+same connection and with the same parameters the driver saw. Wrapped
+around a test-client request (body read inside, so streamed queries
+count) it yields the plans behind that route. A plan line that reads a
+whole table is a failure unless EXPECTED_SCANS lists it for the route.
+
+backend/tests/test_query_plans.py drives every hot route, writes
+included, against a seeded database; `flask check-query-plans` drives
+the read-only ones against the configured database.
+"""
+
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import event
+
+from backend.models import db, ParkingSpot, Reservation, User
+
+# Whole-table reads a route makes on purpose: endpoint -> table names
+EXPECTED_SCANS = {
+    'get_all_lots': {'parking_lot'},        # lists every lot
+    'admin_list_users': {'users'},          # lists every user
+    'generate_monthly_reports': {'users'},  # one report per user
+}
+
+
+def is_table_scan(detail):
+    """True for plan lines that walk a whole table rather than an index."""
+    return detail.startswith('SCAN ') and ' USING ' not in detail
+
+
+def scanned_tables(plan):
+    """Tables (not CTEs or constant rows) the plan lines read in full."""
+    tables = set()
+    for line in plan:
+        if is_table_scan(line):
+            name = line.split()[1]
+            if name in db.metadata.tables:
+                tables.add(name)
+    return tables
+
+
+@contextmanager
+def capture_plans():
+    """Collect (statement, plan lines) for every statement run inside the block."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            return
+        raw = conn.connection.cursor()
+        try:
+            raw.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            captured.append((statement, [row[-1] for row in raw.fetchall()]))
+        finally:
+            raw.close()
+
+    with current_app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def route_plans(client, method, url, body=None, headers=None):
+    """Call one route; return (status, [(statement, plan lines)]) for everything it ran."""
+    with client.application.app_context(), capture_plans() as captured:
+        resp = client.open(url, method=method, json=body, headers=headers or {})
+        try:
+            resp.get_data()
+        finally:
+            resp.close()
+    return resp.status_code, captured
+
+
+def unexpected_scans(endpoint, captured):
+    """{table: statement} for full scans the route is not expected to make."""
+    allowed = EXPECTED_SCANS.get(endpoint, set())
+    found = {}
+    for statement, plan in captured:
+        for table in scanned_tables(plan) - allowed:
+            found.setdefault(table, statement)
+    return found
+
+
+def read_routes(lot_id, spot_id):
+    """(endpoint, method, url, who) for the read-only hot routes."""
+    return [
+        ('user_dashboard',   'GET', '/user/dashboard', 'user'),
+        ('user_summary',     'GET', '/user/summary', 'user'),
+        ('get_all_lots',     'GET', '/user/lots', 'user'),
+        ('admin_dashboard',  'GET', '/admin/dashboard', 'admin'),
+        ('admin_bookings',   'GET', '/admin/bookings', 'admin'),
+        ('get_spot_details', 'GET', f'/admin/lots/{lot_id}/spot/{spot_id}', 'admin'),
+    ]
+
+
+def check_query_plans():
+    """
+    Drive the read-only hot routes against the configured database as
+    its first admin and the holder of a reserved spot. Returns
+    {endpoint: (status, captured)} and {endpoint: unexpected scans}.
+    """
+    from flask_jwt_extended import create_access_token
+
+    admin = db.session.query(User.id).filter(User.role == 'admin').order_by(User.id).first()
+    held = (
+        db.session.query(Reservation.user_id, ParkingSpot.lot_id, ParkingSpot.id)
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .filter(Reservation.end_time.is_(None), ParkingSpot.is_reserved == True)
+        .first()
+    )
+    db.session.remove()
+    if admin is None or held is None:
+        raise LookupError('needs an admin and at least one reserved spot')
+
+    headers = {
+        'admin': {'Authorization': 'Bearer ' + create_access_token(
+            identity=str(admin.id), additional_claims={'role': 'admin'})},
+        'user': {'Authorization': 'Bearer ' + create_access_token(
+            identity=str(held.user_id), additional_claims={'role': 'user'})},
+    }
+    client = current_app.test_client()
+    client.get('/')   # once-per-process hooks run on the first request; keep them out
+    plans, failures = {}, {}
+    for endpoint, method, url, who in read_routes(held.lot_id, held.id):
+        status, captured = route_plans(client, method, url, headers=headers[who])
+        plans[endpoint] = (status, captured)
+        scans = unexpected_scans(endpoint, captured)
+        if scans:
+            failures[endpoint] = scans
+    return plans, failures
@@ -0,0 +1,326 @@
+# backend/reports.py
+"""
+Reusable reporting queries. Everything here aggregates in SQL and returns
+plain rows/dicts, so routes and Celery tasks can share them.
+"""
+
+from datetime import date, datetime
+
+from sqlalchemy import Date, and_, cast, func, literal, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from backend.models import (
+    db, User, ParkingLot, Reservation, ReservationArchive, ReservationMonthlyRollup
+)
+
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE; others get UPDATE-then-INSERT
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def rollup_month(moment):
+    """The rollup `month` key (first of the month) for a date or datetime."""
+    return date(moment.year, moment.month, 1)
+
+
+def month_bounds(month):
+    """[start, end) datetimes of the rollup `month` (a first-of-month date)."""
+    start = datetime(month.year, month.month, 1)
+    if month.month == 12:
+        return start, datetime(month.year + 1, 1, 1)
+    return start, datetime(month.year, month.month + 1, 1)
+
+
+def elapsed_hours(start_col, now):
+    """
+    SQL expression for the hours between `start_col` and the fixed `now`,
+    in whatever date arithmetic the bound database speaks.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return (func.julianday(literal(now)) - func.julianday(start_col)) * 24.0
+    return func.extract('epoch', literal(now) - start_col) / 3600.0
+
+
+def month_start(col):
+    """SQL expression truncating a timestamp column to its rollup month."""
+    if db.engine.dialect.name == 'sqlite':
+        return func.date(col, 'start of month')
+    return cast(func.date_trunc('month', col), Date)
+
+
+def add_to_monthly_rollup(reservation):
+    """
+    Fold a just-finalized reservation into its (user, month, lot) rollup
+    row, creating the row if needed. Runs in the caller's transaction, so
+    it commits or rolls back with the release itself.
+    """
+    seconds = reservation.duration_seconds
+    values = {
+        'user_id':       reservation.user_id,
+        'month':         rollup_month(reservation.end_time),
+        'lot_id':        reservation.lot_id,
+        'visits':        1,
+        'total_seconds': seconds,
+        'total_cost':    reservation.cost or 0,
+    }
+
+    insert = UPSERT_INSERTS.get(db.engine.dialect.name)
+    if insert is None:
+        _update_or_insert_rollup(values)
+        return
+
+    rollup = ReservationMonthlyRollup.__table__
+    stmt = insert(rollup).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[rollup.c.user_id, rollup.c.month, rollup.c.lot_id],
+        set_=_rollup_increments(rollup, values),
+    )
+    db.session.execute(stmt)
+
+
+def _rollup_increments(rollup, values):
+    return {
+        'visits':        rollup.c.visits + 1,
+        'total_seconds': rollup.c.total_seconds + values['total_seconds'],
+        'total_cost':    rollup.c.total_cost + values['total_cost'],
+    }
+
+
+def _update_or_insert_rollup(values):
+    """
+    The upsert for databases without ON CONFLICT: bump the row, and if
+    there was none insert it inside a savepoint. Losing the insert race
+    to a concurrent release only rolls back the savepoint, after which
+    the row that release created is bumped instead.
+    """
+    rollup = ReservationMonthlyRollup.__table__
+    bump = (
+        rollup.update()
+        .where(
+            rollup.c.user_id == values['user_id'],
+            rollup.c.month == values['month'],
+            rollup.c.lot_id == values['lot_id'],
+        )
+        .values(**_rollup_increments(rollup, values))
+    )
+    if db.session.execute(bump).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(rollup.insert().values(**values))
+    except IntegrityError:
+        db.session.execute(bump)
+
+
+def rebuild_monthly_rollup():
+    """
+    Recompute reservation_monthly_rollup from every finished reservation.
+    Does not commit. Returns the number of rollup rows written.
+    """
+    month = month_start(Reservation.end_time)
+    grouped = (
+        db.session.query(
+            Reservation.user_id,
+            month.label('month'),
+            Reservation.lot_id,
+            func.count(Reservation.id),
+            func.coalesce(func.sum(Reservation.duration_seconds), 0),
+            func.coalesce(func.sum(Reservation.cost), 0),
+        )
+        .filter(Reservation.end_time.isnot(None))
+        .group_by(Reservation.user_id, month, Reservation.lot_id)
+    )
+
+    rollup = ReservationMonthlyRollup.__table__
+    db.session.execute(rollup.delete())
+    result = db.session.execute(
+        rollup.insert().from_select(
+            ['user_id', 'month', 'lot_id', 'visits', 'total_seconds', 'total_cost'],
+            grouped,
+        )
+    )
+    return result.rowcount
+
+
+def archived_month_rows(month, user_id=None):
+    """
+    reservation_archive rows of deleted lots (which have no rollup rows)
+    grouped the way the rollup is: per user and lot, for reservations that
+    ended in the rollup `month`.
+    """
+    archive = ReservationArchive
+    start, end = month_bounds(month)
+    query = (
+        select(
+            archive.user_id,
+            archive.lot_id,
+            archive.lot_name,
+            func.count(archive.id).label('visits'),
+            func.coalesce(func.sum(archive.duration_seconds), 0).label('total_seconds'),
+            func.coalesce(func.sum(archive.cost), 0).label('total_cost'),
+        )
+        .where(archive.end_time >= start, archive.end_time < end)
+        .group_by(archive.user_id, archive.lot_id, archive.lot_name)
+    )
+    if user_id is not None:
+        query = query.where(archive.user_id == user_id)
+    return query
+
+
+def user_month_summary(user_id, month):
+    """
+    Per-lot visits, seconds and cost for one user in one rollup month,
+    deleted lots (from the archive) included.
+    """
+    rollup = ReservationMonthlyRollup
+    live = (
+        select(
+            rollup.user_id,
+            rollup.lot_id,
+            ParkingLot.name.label('lot_name'),
+            rollup.visits,
+            rollup.total_seconds,
+            rollup.total_cost,
+        )
+        .join(ParkingLot, ParkingLot.id == rollup.lot_id)
+        .where(rollup.user_id == user_id, rollup.month == month)
+    )
+    rows = union_all(live, archived_month_rows(month, user_id)).subquery()
+    return (
+        db.session.query(
+            rows.c.lot_name,
+            rows.c.visits,
+            rows.c.total_seconds,
+            rows.c.total_cost,
+        )
+        .order_by(rows.c.lot_id)
+        .all()
+    )
+
+
+def ongoing_revenue_by_lot(admin_id=None, now=None):
+    """
+    Revenue accrued so far by still-open reservations, per lot.
+
+    Every row is priced against the same `now` (default: utcnow), and the
+    sum runs in one grouped query over the open-reservation index. Lots
+    with no open reservations report 0. Pass `admin_id` to restrict the
+    result to lots created by that admin.
+
+    Returns a list of {'lot_id', 'name', 'revenue'} ordered by lot id.
+    """
+    now = now or datetime.utcnow()
+
+    revenue = func.coalesce(
+        func.sum(elapsed_hours(Reservation.start_time, now) * ParkingLot.price_per_hour),
+        0
+    )
+    query = (
+        db.session.query(
+            ParkingLot.id,
+            ParkingLot.name,
+            revenue.label('revenue'),
+        )
+        .outerjoin(
+            Reservation,
+            (Reservation.lot_id == ParkingLot.id) & Reservation.end_time.is_(None)
+        )
+        .group_by(ParkingLot.id, ParkingLot.name)
+        .order_by(ParkingLot.id)
+    )
+    if admin_id is not None:
+        query = query.filter(ParkingLot.created_by == admin_id)
+
+    return [
+        {'lot_id': row.id, 'name': row.name, 'revenue': round(row.revenue or 0, 2)}
+        for row in query.all()
+    ]
+
+
+def completed_revenue_by_month(admin_id):
+    """
+    What finished reservations in this admin's lots were charged, summed
+    per month of their end_time in one grouped query. Returns
+    {'YYYY-MM': revenue}.
+    """
+    month = month_start(Reservation.end_time)
+    rows = (
+        db.session.query(month.label('month'), func.sum(Reservation.cost).label('revenue'))
+        .join(ParkingLot, ParkingLot.id == Reservation.lot_id)
+        .filter(
+            ParkingLot.created_by == admin_id,
+            Reservation.end_time.isnot(None),
+            Reservation.cost.isnot(None),
+        )
+        .group_by(month)
+        .all()
+    )
+    # SQLite hands back 'YYYY-MM-01', PostgreSQL a date
+    return {str(row.month)[:7]: round(row.revenue or 0, 2) for row in rows}
+
+
+def monthly_user_stats(month):
+    """
+    One row per user with their visits, spend and favourite lot for
+    reservations that ended in the rollup `month` (a first-of-month date).
+
+    Reads the month's reservation_monthly_rollup rows, which already hold
+    the per-(user, lot) counts, plus the same counts for deleted lots from
+    reservation_archive; those are ranked with a window function
+    to pick the favourite lot (ties go to the lower lot id), and users
+    with no visits still get a row with zero counts and no favourite.
+    Returns an un-executed query ordered by user id, so callers can
+    stream it with yield_per.
+    """
+    rollup = ReservationMonthlyRollup
+    live = (
+        select(
+            rollup.user_id,
+            rollup.lot_id,
+            ParkingLot.name.label('lot_name'),
+            rollup.visits,
+            rollup.total_seconds,
+            rollup.total_cost,
+        )
+        .join(ParkingLot, ParkingLot.id == rollup.lot_id)
+        .where(rollup.month == month)
+    )
+    merged = union_all(live, archived_month_rows(month)).subquery()
+    per_lot = (
+        db.session.query(
+            merged.c.user_id.label('user_id'),
+            merged.c.lot_id.label('lot_id'),
+            merged.c.lot_name.label('lot_name'),
+            merged.c.visits.label('visits'),
+            merged.c.total_cost.label('spent'),
+        )
+        .subquery()
+    )
+    ranked = (
+        db.session.query(
+            per_lot.c.user_id,
+            per_lot.c.lot_id,
+            per_lot.c.lot_name,
+            func.row_number().over(
+                partition_by=per_lot.c.user_id,
+                order_by=(per_lot.c.visits.desc(), per_lot.c.lot_id),
+            ).label('rank'),
+            func.sum(per_lot.c.visits).over(partition_by=per_lot.c.user_id).label('visits'),
+            func.sum(per_lot.c.spent).over(partition_by=per_lot.c.user_id).label('spent'),
+        )
+        .subquery()
+    )
+
+    return (
+        db.session.query(
+            User.id,
+            User.email,
+            User.fullname,
+            func.coalesce(ranked.c.visits, 0).label('visits'),
+            func.coalesce(ranked.c.spent, 0).label('spent'),
+            ranked.c.lot_name.label('favorite_lot'),
+        )
+        .outerjoin(ranked, and_(ranked.c.user_id == User.id, ranked.c.rank == 1))
+        .order_by(User.id)
+    )
@@ -0,0 +1,214 @@
+# backend/slow_queries.py
+"""
+Opt-in slow-query log on the SQLAlchemy engine.
+
+With SLOW_QUERY_LOG on, every statement slower than
+SLOW_QUERY_THRESHOLD_MS is logged with its SQL, the route (or Celery
+task) that ran it and the innermost backend/ stack frame. Parameter
+values (password hashes, emails, addresses) are left out unless
+SLOW_QUERY_LOG_PARAMS is also on, and even then any bind parameter
+named like a credential is redacted.
+On SQLite the statement's EXPLAIN QUERY PLAN is captured too, the first
+time each statement is seen slow.
+
+Slow statements are also aggregated per SQL text, which SQLAlchemy
+already parameterises, so a route issuing the same query for every row
+shows up as one entry with a high count. GET /admin/slow-queries lists
+the top offenders and every statement whose plan has a full table SCAN.
+The aggregate is per process, like the /metrics counters.
+
+When the log is off no listeners are installed, so it costs nothing.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+
+from celery import current_task
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from backend.query_plans import is_table_scan
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_STATEMENTS = 500    # distinct statements kept; the cheapest are evicted
+MAX_PARAMS_CHARS = 500
+
+# Bind parameters whose values are never recorded, even with SLOW_QUERY_LOG_PARAMS
+SENSITIVE_PARAM = re.compile(r'passw|secret|token', re.IGNORECASE)
+REDACTED = '<redacted>'
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.abspath(__file__)}
+
+
+def _origin():
+    """The endpoint or Celery task the current statement runs for."""
+    if has_request_context():
+        return request.endpoint or request.path
+    if current_task and current_task.request.id:
+        return 'task:' + current_task.name
+    return '-'
+
+
+def _caller():
+    """Innermost stack frame in the backend package outside this module."""
+    for frame in reversed(traceback.extract_stack()):
+        path = os.path.abspath(frame.filename)
+        if (path.startswith(_BACKEND_DIR) and path not in _SKIP_FILES
+                and 'site-packages' not in path):
+            return f"{os.path.relpath(path, os.path.dirname(_BACKEND_DIR))}:{frame.lineno} in {frame.name}"
+    return None
+
+
+def _params(context, executemany):
+    """repr of the statement's bind parameters by name, credentials redacted."""
+    rows = [
+        {name: REDACTED if SENSITIVE_PARAM.search(name) else value for name, value in row.items()}
+        for row in getattr(context, 'compiled_parameters', None) or ()
+    ]
+    if not rows:
+        return None     # raw SQL: no names to redact by, so nothing is kept
+    params = repr(rows if executemany else rows[0])
+    if len(params) > MAX_PARAMS_CHARS:
+        params = params[:MAX_PARAMS_CHARS] + '...'
+    return params
+
+
+def _explain(conn, statement, parameters):
+    """EXPLAIN QUERY PLAN detail lines, or None if SQLite cannot explain it."""
+    raw = conn.connection.cursor()
+    try:
+        raw.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [row[-1] for row in raw.fetchall()]
+    except Exception:
+        return None
+    finally:
+        raw.close()
+
+
+class SlowQueryLog:
+    """Slow statements aggregated by SQL text, for one process."""
+
+    def __init__(self, max_statements=MAX_TRACKED_STATEMENTS):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.entries = {}
+            self.evicted = 0
+
+    def known_plan(self, statement):
+        with self._lock:
+            entry = self.entries.get(statement)
+            return entry is not None and entry['plan'] is not None
+
+    def record(self, statement, ms, params, origin, caller, plan=None):
+        with self._lock:
+            entry = self.entries.get(statement)
+            if entry is None:
+                if len(self.entries) >= self.max_statements:
+                    cheapest = min(self.entries, key=lambda s: self.entries[s]['total_ms'])
+                    del self.entries[cheapest]
+                    self.evicted += 1
+                entry = self.entries[statement] = {
+                    'statement': statement, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'origins': Counter(), 'plan': None, 'last': None,
+                }
+            entry['count'] += 1
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+            entry['origins'][origin] += 1
+            if plan is not None and entry['plan'] is None:
+                entry['plan'] = plan
+            entry['last'] = {
+                'ms': round(ms, 2), 'params': params, 'origin': origin,
+                'caller': caller, 'at': datetime.utcnow().isoformat(),
+            }
+
+    def report(self, limit=20, sort='total_ms'):
+        """Top `limit` statements by `sort` (total_ms, max_ms or count), and all SCAN plans."""
+        with self._lock:
+            entries = [self._public(e) for e in self.entries.values()]
+            evicted = self.evicted
+        entries.sort(key=lambda e: e[sort], reverse=True)
+        return {
+            'statements': len(entries),
+            'evicted': evicted,
+            'top': entries[:limit],
+            'table_scans': [e for e in entries if e['table_scan']],
+        }
+
+    @staticmethod
+    def _public(entry):
+        plan = entry['plan']
+        return {
+            'statement': entry['statement'],
+            'count': entry['count'],
+            'total_ms': round(entry['total_ms'], 2),
+            'avg_ms': round(entry['total_ms'] / entry['count'], 2),
+            'max_ms': round(entry['max_ms'], 2),
+            'origins': dict(entry['origins'].most_common()),
+            'plan': plan,
+            'table_scan': bool(plan) and any(is_table_scan(line) for line in plan),
+            'last': entry['last'],
+        }
+
+
+slow_query_log = SlowQueryLog()
+
+
+def init_slow_query_log(app, db):
+    """Install the engine listeners if SLOW_QUERY_LOG is set."""
+    if not app.config.get('SLOW_QUERY_LOG'):
+        return
+    threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 100) / 1000.0
+    with app.app_context():
+        engine = db.engine
+    explain = app.config.get('SLOW_QUERY_EXPLAIN', True) and engine.dialect.name == 'sqlite'
+    log_params = app.config.get('SLOW_QUERY_LOG_PARAMS', False)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('slow_query_start')
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        if elapsed < threshold:
+            return
+
+        ms = elapsed * 1000
+        params = _params(context, executemany) if log_params else None
+        origin, caller = _origin(), _caller()
+        plan = None
+        if explain and not executemany and not slow_query_log.known_plan(statement):
+            plan = _explain(conn, statement, parameters)
+        slow_query_log.record(statement, ms, params, origin, caller, plan)
+
+        logger.warning(
+            "slow query %.1fms [%s] at %s\n%s%s%s",
+            ms, origin, caller, statement,
+            '\nparams: ' + params if params else '',
+            ''.join('\n  plan: ' + line for line in plan) if plan else '',
+        )
+
+    def handle_error(exception_context):
+        # a failed statement never reaches after_cursor_execute; drop its start
+        conn = exception_context.connection
+        stack = conn.info.get('slow_query_start') if conn is not None else None
+        if stack and exception_context.execution_context is not None:
+            stack.pop()
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(engine, 'handle_error', handle_error)
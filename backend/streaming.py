@@ -0,0 +1,55 @@
+# backend/streaming.py
+"""
+Incremental JSON responses for large list endpoints. The list is written
+element by element as rows come off the cursor, so memory stays flat no
+matter how many rows the query returns.
+
+Clients opt in with `?stream=1` or an `Accept: application/stream+json`
+header; everyone else keeps getting the normal buffered response.
+"""
+
+import json
+
+from flask import Response, request, stream_with_context
+
+STREAM_MIMETYPE = 'application/stream+json'
+
+# Rows fetched per round trip, and rows serialized per chunk written
+YIELD_PER = 1000
+CHUNK_ROWS = 200
+
+
+def wants_stream():
+    """True when the current request asked for a streamed response."""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', STREAM_MIMETYPE])
+    return best == STREAM_MIMETYPE
+
+
+def stream_json(key, items, envelope=None):
+    """
+    Stream `{**envelope, key: [item, ...]}` as JSON.
+
+    `items` is any iterable of JSON-serializable objects, normally a
+    generator over `query.yield_per(YIELD_PER)`. It is consumed lazily
+    inside the request context.
+    """
+    head = json.dumps(envelope or {})[:-1]
+    if envelope:
+        head += ', '
+
+    def generate():
+        yield f'{head}{json.dumps(key)}: ['
+        buf, first = [], True
+        for item in items:
+            buf.append(json.dumps(item) if first else ',' + json.dumps(item))
+            first = False
+            if len(buf) >= CHUNK_ROWS:
+                yield ''.join(buf)
+                buf = []
+        if buf:
+            yield ''.join(buf)
+        yield ']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
@@ -2,19 +2,126 @@
 """
 Celery tasks for booking/release emails, daily reminders,
 monthly reports, and CSV export, using explicit Flask app imports.
+
+All mail goes out through the per-worker pooled SMTP connection in
+backend.mailer.
 """
 
-from datetime import datetime, timedelta
-from io import StringIO
-import csv
+from datetime import date, datetime, timedelta
+import os
+import smtplib
+import tempfile
 
+from celery.signals import worker_process_shutdown
 from flask_mail import Message
-from flask import render_template_string
+from flask import current_app, render_template_string
+from sqlalchemy import select
+
+from backend.export import LINK_MAX_AGE, export_chunks, export_filename, export_mimetype
+from backend.extensions import celery
+from backend.mailer import get_mail_queue, smtp_pool
+from backend.query_budget import query_budget
+from backend.models import db, User, Reservation
+from backend.reports import monthly_user_stats
+
+
+@worker_process_shutdown.connect
+def close_smtp_pool(**kwargs):
+    smtp_pool.close()
+
+
+def deliver_email(subject, recipients, body):
+    """
+    Send a transactional email over the pooled connection. With
+    MAIL_MICRO_BATCH on, queue it instead and make sure a drain is
+    scheduled within MAIL_BATCH_WINDOW seconds. Needs an app context.
+    """
+    config = current_app.config
+    if not config.get('MAIL_MICRO_BATCH'):
+        smtp_pool.send(Message(subject=subject, recipients=recipients, body=body))
+        return
+
+    queue = get_mail_queue()
+    queue.push({'subject': subject, 'recipients': recipients, 'body': body})
+    window = config.get('MAIL_BATCH_WINDOW', 2)
+    if queue.claim_drain(window):
+        drain_mail_queue.apply_async(countdown=window)
+
 
-from backend.extensions import celery, mail
-from backend.models import User, Reservation
+# Most SQL statements each heavy task may run, however much data it covers
+# (checked by backend/tests/test_query_budgets.py)
+TASK_QUERY_BUDGETS = {
+    'tasks.export_reservations_to_csv': 2,
+    'tasks.generate_monthly_reports':   1,
+}
 
 
+# event -> (subject, template under backend/templates)
+RESERVATION_EMAILS = {
+    'booked':   ("Booking Confirmed",     'email/reservation_booked.txt'),
+    'released': ("Parking Spot Released", 'email/reservation_released.txt'),
+}
+
+# Compiled templates, loaded once per worker process
+_templates = {}
+
+
+def get_email_template(app, name):
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = app.jinja_env.get_template(name)
+    return template
+
+
+def reservation_email_context(reservation, user):
+    """Template variables for a reservation email, read from the saved row."""
+    context = {
+        'fullname':       user.fullname,
+        'spot_id':        reservation.spot_id,
+        'vehicle_number': reservation.vehicle_number,
+        'start_time':     reservation.start_time,
+    }
+    if reservation.end_time:
+        context.update(
+            duration_hours = round(reservation.duration_seconds / 3600, 2),
+            billed_hours   = reservation.billed_hours,
+            cost           = reservation.cost or 0,
+        )
+    return context
+
+
+@celery.task(name='tasks.send_reservation_email')
+def send_reservation_email(reservation_id, event):
+    """
+    Send the booking ('booked') or release ('released') email for a
+    reservation. Only the ID travels through the broker; the body is
+    rendered here from the cached templates.
+    """
+    from backend.app import app  # ✅ Import locally to avoid circular import
+
+    subject, template_name = RESERVATION_EMAILS[event]
+    with app.app_context():
+        row = (
+            db.session.query(Reservation, User)
+            .join(User, User.id == Reservation.user_id)
+            .filter(Reservation.id == reservation_id)
+            .first()
+        )
+        if row is None:
+            return False
+        reservation, user = row
+
+        body = get_email_template(app, template_name).render(
+            **reservation_email_context(reservation, user)
+        )
+        deliver_email(subject, [user.email], body)
+    return True
+
+
+# The two tasks below take a pre-rendered body. The app no longer enqueues
+# them; they stay registered so messages already sitting in the broker
+# from before the switch to send_reservation_email still get delivered.
+
 @celery.task(name='tasks.send_booking_email')
 def send_booking_email(to_email, body):
     """
@@ -23,12 +130,7 @@ def send_booking_email(to_email, body):
     from backend.app import app  # ✅ Import locally to avoid circular import
 
     with app.app_context():
-        msg = Message(
-            subject="Booking Confirmed",
-            recipients=[to_email],
-            body=body
-        )
-        mail.send(msg)
+        deliver_email("Booking Confirmed", [to_email], body)
 
 
 @celery.task(name='tasks.send_release_email')
@@ -39,119 +141,233 @@ def send_release_email(to_email, body):
     from backend.app import app  # ✅ Import locally to avoid circular import
 
     with app.app_context():
-        msg = Message(
-            subject="Parking Spot Released",
-            recipients=[to_email],
-            body=body
-        )
-        mail.send(msg)
+        deliver_email("Parking Spot Released", [to_email], body)
+
+
+@celery.task(name='tasks.drain_mail_queue')
+def drain_mail_queue():
+    """
+    Send everything waiting in the micro-batch mail queue over one pooled
+    connection, MAIL_BATCH_SIZE at a time. If delivery fails, the unsent
+    part of the batch goes back to the head of the queue.
+    """
+    from backend.app import app  # ✅ Import locally
+
+    sent = 0
+    with app.app_context():
+        queue = get_mail_queue()
+        queue.release_drain()
+        batch_size = current_app.config.get('MAIL_BATCH_SIZE', 50)
+        while True:
+            batch = queue.pop_many(batch_size)
+            if not batch:
+                break
+            for i, item in enumerate(batch):
+                msg = Message(subject=item['subject'],
+                              recipients=item['recipients'],
+                              body=item['body'])
+                try:
+                    smtp_pool.send(msg)
+                    sent += 1
+                except smtplib.SMTPRecipientsRefused:
+                    continue
+                except Exception:
+                    queue.push_front(batch[i:])
+                    raise
+    return sent
+
+
+# Recipients handed to each reminder sub-task
+REMINDER_BATCH_SIZE = 200
 
 
 @celery.task(name='tasks.send_daily_reminders')
 def send_daily_reminders():
     """
     Email users who never booked or haven’t booked in the last 3+ days.
+
+    Selection is one anti-join (no reservation started since the cutoff),
+    read in batches and fanned out as send_reminder_batch sub-tasks.
     """
     from backend.app import app  # ✅ Import locally
 
     cutoff = datetime.utcnow() - timedelta(days=3)
     with app.app_context():
-        users = User.query.filter_by(role='user').all()
-        for u in users:
-            last = (
-                Reservation.query
-                .filter_by(user_id=u.id)
-                .order_by(Reservation.start_time.desc())
-                .first()
+        recent_booking = (
+            select(Reservation.id)
+            .where(
+                Reservation.user_id == User.id,
+                Reservation.start_time >= cutoff
+            )
+            .exists()
+        )
+        rows = (
+            db.session.query(User.email, User.fullname)
+            .filter(User.role == 'user', ~recent_booking)
+            .order_by(User.id)
+            .yield_per(REMINDER_BATCH_SIZE)
+        )
+
+        batches = 0
+        batch = []
+        for row in rows:
+            batch.append([row.email, row.fullname])
+            if len(batch) >= REMINDER_BATCH_SIZE:
+                send_reminder_batch.delay(batch)
+                batches += 1
+                batch = []
+        if batch:
+            send_reminder_batch.delay(batch)
+            batches += 1
+        return batches
+
+
+@celery.task(name='tasks.send_reminder_batch')
+def send_reminder_batch(recipients):
+    """
+    Send the "we miss you" reminder to [email, fullname] pairs over the
+    pooled SMTP connection. A refused address is skipped, not fatal to the
+    batch.
+    """
+    from backend.app import app  # ✅ Import locally
+
+    sent = 0
+    with app.app_context():
+        for email, fullname in recipients:
+            body = (
+                f"Hi {fullname},\n\n"
+                "We noticed you haven't parked with us recently. "
+                "Book a spot today!\n\n– ParkWise Team"
+            )
+            msg = Message(
+                subject="We miss you at ParkWise",
+                recipients=[email],
+                body=body
             )
-            if not last or last.start_time < cutoff:
-                body = (
-                    f"Hi {u.fullname},\n\n"
-                    "We noticed you haven't parked with us recently. "
-                    "Book a spot today!\n\n– ParkWise Team"
-                )
-                msg = Message(
-                    subject="We miss you at ParkWise",
-                    recipients=[u.email],
-                    body=body
-                )
-                mail.send(msg)
+            try:
+                smtp_pool.send(msg)
+                sent += 1
+            except smtplib.SMTPRecipientsRefused:
+                continue
+    return sent
+
+
+# Users per monthly-report sub-task
+REPORT_BATCH_SIZE = 200
 
 
 @celery.task(name='tasks.generate_monthly_reports')
-def generate_monthly_reports():
+def generate_monthly_reports(year=None, month=None, dry_run_dir=None):
     """
     Generate monthly summary report and email it to all users.
+
+    Visits, spend and favourite lot for every user come from one query
+    over the month's reservation_monthly_rollup rows, streamed in batches
+    into send_monthly_report_batch sub-tasks. Defaults to the current
+    month. With `dry_run_dir`, the rendered reports are written there
+    instead of being emailed.
     """
     from backend.app import app  # ✅ Import locally
 
-    with app.app_context():
+    name = 'tasks.generate_monthly_reports'
+    with app.app_context(), query_budget(TASK_QUERY_BUDGETS[name], name):
         now = datetime.utcnow()
-        first_day = datetime(now.year, now.month, 1)
-        last_day = datetime(now.year, now.month + 1, 1) if now.month < 12 else datetime(now.year + 1, 1, 1)
+        first_day = date(year or now.year, month or now.month, 1)
 
-        users = User.query.all()
-        for user in users:
-            reservations = Reservation.query.filter(
-                Reservation.user_id == user.id,
-                Reservation.end_time >= first_day,
-                Reservation.end_time < last_day
-            ).all()
+        rows = monthly_user_stats(first_day).yield_per(REPORT_BATCH_SIZE)
+        batches = 0
+        batch = []
+        for row in rows:
+            batch.append({
+                'user_id':      row.id,
+                'email':        row.email,
+                'fullname':     row.fullname,
+                'visits':       int(row.visits),
+                'spent':        round(float(row.spent), 2),
+                'favorite_lot': row.favorite_lot or "N/A",
+            })
+            if len(batch) >= REPORT_BATCH_SIZE:
+                send_monthly_report_batch.delay(batch, dry_run_dir)
+                batches += 1
+                batch = []
+        if batch:
+            send_monthly_report_batch.delay(batch, dry_run_dir)
+            batches += 1
+        return batches
+
+
+def render_monthly_report(report):
+    return f"""ParkWise Monthly Report
+User: {report['fullname']}
+
+Total Visits: {report['visits']}
+Total Spent: ₹{report['spent']}
+Favorite Lot: {report['favorite_lot']}
+"""
 
-            total_spent = sum(r.cost for r in reservations if r.cost)
-            total_visits = len(reservations)
 
-            lot_counts = {}
-            for res in reservations:
-                if res.parking_spot and res.parking_spot.lot:
-                    lot_name = res.parking_spot.lot.name
-                    lot_counts[lot_name] = lot_counts.get(lot_name, 0) + 1
+@celery.task(name='tasks.send_monthly_report_batch')
+def send_monthly_report_batch(reports, dry_run_dir=None):
+    """
+    Email a batch of monthly reports over the pooled SMTP connection, or
+    write them to `dry_run_dir` as <user_id>.txt when set.
+    """
+    if dry_run_dir:
+        os.makedirs(dry_run_dir, exist_ok=True)
+        for report in reports:
+            path = os.path.join(dry_run_dir, f"{report['user_id']}.txt")
+            with open(path, 'w', encoding='utf-8') as fh:
+                fh.write(f"To: {report['email']}\n\n{render_monthly_report(report)}")
+        return len(reports)
 
-            favorite_lot = max(lot_counts.items(), key=lambda x: x[1])[0] if lot_counts else "N/A"
+    from backend.app import app  # ✅ Import locally
 
+    sent = 0
+    with app.app_context():
+        for report in reports:
             msg = Message(
                 subject="ParkWise Monthly Report",
                 sender="noreply@parkwise.com",
-                recipients=[user.email]
+                recipients=[report['email']],
+                body=render_monthly_report(report)
             )
-            msg.body = f"""ParkWise Monthly Report
-User: {user.fullname}
-
-Total Visits: {total_visits}
-Total Spent: ₹{total_spent}
-Favorite Lot: {favorite_lot}
-"""
-            mail.send(msg)
+            try:
+                smtp_pool.send(msg)
+                sent += 1
+            except smtplib.SMTPRecipientsRefused:
+                continue
+    return sent
 
 
 @celery.task(name='tasks.export_reservations_to_csv')
-def export_reservations_to_csv(user_id):
+def export_reservations_to_csv(user_id, download_url=None):
     """
-    Generate CSV of all reservations for a user and send it via email.
+    Email a user their reservation history.
+
+    With `download_url` (a signed link from /user/export-history) the email
+    just carries the link and the CSV streams from the web app on demand.
+    Without one, the export is gzipped into a temporary file and attached.
     """
     from backend.app import app  # ✅ Import locally
 
-    with app.app_context():
+    name = 'tasks.export_reservations_to_csv'
+    with app.app_context(), query_budget(TASK_QUERY_BUDGETS[name], name):
         u = User.query.get(user_id)
-        resvs = Reservation.query.filter_by(user_id=user_id).all()
-
-        buf = StringIO()
-        writer = csv.writer(buf)
-        writer.writerow(['Reservation ID', 'Lot', 'Spot', 'Start', 'End', 'Cost'])
-        for r in resvs:
-            writer.writerow([
-                r.id,
-                r.lot.name,
-                r.spot.spot_number,
-                r.start_time.isoformat(),
-                r.end_time.isoformat() if r.end_time else '',
-                getattr(r, 'cost', '')
-            ])
 
         msg = Message(
             subject="Your ParkWise Reservation History",
             recipients=[u.email],
-            body="Find your reservation history attached."
         )
-        msg.attach("reservations.csv", "text/csv", buf.getvalue())
-        mail.send(msg)
+        if download_url:
+            msg.body = (
+                "Your reservation history is ready. Download it here "
+                f"(the link expires in {LINK_MAX_AGE // 3600} hours):\n\n{download_url}"
+            )
+        else:
+            msg.body = "Find your reservation history attached."
+            with tempfile.TemporaryFile() as spool:
+                for chunk in export_chunks(user_id, compress=True):
+                    spool.write(chunk)
+                spool.seek(0)
+                msg.attach(export_filename(True), export_mimetype(True), spool.read())
+        smtp_pool.send(msg)
@@ -0,0 +1,84 @@
+# backend/tests/conftest.py
+"""
+Shared fixtures. The app binds to DATABASE_URL when backend.app is
+imported, so it is pointed at a throwaway SQLite file here, before any
+test imports it. Each test gets freshly created tables.
+
+    python -m pytest -q backend/tests
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix='parkwise-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TMP, 'test.db')
+os.environ['MAIL_QUEUE_URL'] = 'memory://'
+
+
+@pytest.fixture(scope='session')
+def app():
+    from backend.app import app
+    from backend.extensions import celery
+
+    app.config.update(TESTING=True)
+    app.extensions['mail'].suppress = True   # read at init_app, so set it directly
+    celery.conf.task_always_eager = True
+    return app
+
+
+@pytest.fixture
+def db(app):
+    from backend.identity import identity_cache
+    from backend.models import db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    identity_cache.clear()
+    yield db
+    with app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, db):
+    client = app.test_client()
+    client.get('/')   # let the once-per-process hooks run before anything is measured
+    return client
+
+
+@pytest.fixture
+def seed(app, db):
+    """seed(**sizes) bulk-inserts a dataset (see backend.loadtest.seed_dataset)."""
+    from backend.loadtest import seed_dataset
+
+    def seed(admins=1, lots=2, spots_per_lot=10, users=5, history=5, active=2):
+        with app.app_context():
+            dataset = seed_dataset(admins, lots, spots_per_lot, users, history, active)
+            db.session.remove()
+        return dataset
+    return seed
+
+
+@pytest.fixture
+def auth(app):
+    """auth(user_id, role) -> Authorization header dict."""
+    from flask_jwt_extended import create_access_token
+
+    def auth(user_id, role='user'):
+        with app.app_context():
+            token = create_access_token(identity=str(user_id), additional_claims={'role': role})
+        return {'Authorization': f'Bearer {token}'}
+    return auth
+
+
+@contextmanager
+def counting_queries():
+    """Count every SQL statement run inside the block (as .count)."""
+    from backend.query_budget import query_budget
+
+    with query_budget(10**9, 'test') as seen:
+        yield seen
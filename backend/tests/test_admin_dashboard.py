@@ -0,0 +1,35 @@
+# backend/tests/test_admin_dashboard.py
+"""Admin dashboard revenue figures and /admin/bookings filter validation."""
+
+import pytest
+
+
+@pytest.mark.parametrize('query', ['lot_id=abc', 'user_id=1.5', 'cursor=nope', 'limit=x'])
+def test_bookings_rejects_bad_filters(client, auth, seed, query):
+    dataset = seed()
+    resp = client.get(f'/admin/bookings?{query}', headers=auth(dataset['admin_ids'][0], 'admin'))
+    assert resp.status_code == 400
+    assert resp.json['msg']
+
+
+def test_dashboard_revenue_matches_bookings(app, client, auth, seed):
+    from backend.models import db, ParkingLot, Reservation
+
+    dataset = seed(admins=1, lots=2, spots_per_lot=10, users=5, history=6, active=2)
+    admin_id = dataset['admin_ids'][0]
+    with app.app_context():
+        charged = (
+            db.session.query(Reservation.end_time, Reservation.cost)
+            .join(ParkingLot, ParkingLot.id == Reservation.lot_id)
+            .filter(ParkingLot.created_by == admin_id, Reservation.end_time.isnot(None))
+            .all()
+        )
+        db.session.remove()
+
+    data = client.get('/admin/dashboard', headers=auth(admin_id, 'admin')).json
+    assert data['completed_revenue'] == pytest.approx(sum(cost for _, cost in charged), abs=0.01)
+    assert len(data['revenue_by_month']) == 6
+    this_month = data['revenue_by_month'][-1]
+    assert data['monthly_revenue'] == this_month['revenue']
+    expected = sum(cost for end, cost in charged if end.strftime('%Y-%m') == this_month['month'])
+    assert this_month['revenue'] == pytest.approx(expected, abs=0.01)
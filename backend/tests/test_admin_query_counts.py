@@ -0,0 +1,46 @@
+# backend/tests/test_admin_query_counts.py
+"""
+The admin dashboard and bookings page must not issue more statements as
+the data grows: the same request is counted against a small and a large
+dataset and the counts have to match.
+"""
+
+import pytest
+
+from backend.identity import identity_cache
+from backend.tests.conftest import counting_queries
+
+SMALL = dict(admins=1, lots=2, spots_per_lot=5, users=3, history=2, active=1)
+LARGE = dict(admins=1, lots=6, spots_per_lot=40, users=30, history=8, active=10)
+
+URLS = [
+    '/admin/dashboard',
+    '/admin/bookings',
+    '/admin/bookings?status=active',
+    '/admin/bookings?status=completed&limit=5',
+]
+
+
+def statements(app, client, auth, seed, sizes, url):
+    from backend.models import db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    dataset = seed(**sizes)
+    headers = auth(dataset['admin_ids'][0], 'admin')
+    client.get(url, headers=headers)   # settle anything cached per process
+    identity_cache.clear()
+
+    with app.app_context(), counting_queries() as seen:
+        resp = client.get(url, headers=headers)
+        resp.get_data()
+    assert 200 <= resp.status_code < 300, f'{url} answered {resp.status_code}'
+    return seen.count
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_statement_count_does_not_grow(app, client, auth, seed, url):
+    small = statements(app, client, auth, seed, SMALL, url)
+    large = statements(app, client, auth, seed, LARGE, url)
+    assert small == large, f'{url}: {small} statements on the small dataset, {large} on the large'
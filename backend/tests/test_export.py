@@ -0,0 +1,26 @@
+# backend/tests/test_export.py
+"""The CSV export keeps reservations whose spot no longer exists."""
+
+import csv
+from io import StringIO
+
+
+def test_export_keeps_reservations_of_removed_spots(app, db, seed):
+    from backend.export import export_chunks
+    from backend.models import ParkingSpot, Reservation
+
+    dataset = seed(users=2, history=4, active=0)
+    user_id = dataset['user_ids'][0]
+    with app.app_context():
+        reservations = Reservation.query.filter_by(user_id=user_id).all()
+        ids = sorted(r.id for r in reservations)
+        gone_id, gone_spot = reservations[0].id, reservations[0].spot_id
+        db.session.execute(db.delete(ParkingSpot).where(ParkingSpot.id == gone_spot))
+        db.session.commit()
+
+        body = b''.join(export_chunks(user_id)).decode()
+        db.session.remove()
+
+    rows = list(csv.reader(StringIO(body)))[1:]
+    assert sorted(int(row[0]) for row in rows) == ids
+    assert next(row for row in rows if int(row[0]) == gone_id)[2] == ''
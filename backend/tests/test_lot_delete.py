@@ -0,0 +1,51 @@
+# backend/tests/test_lot_delete.py
+"""Deleting a lot leaves its users' history, summary, export and report intact."""
+
+import csv
+from datetime import datetime
+from io import StringIO
+
+
+def user_views(app, client, headers, user_id):
+    from backend.export import export_chunks
+    from backend.models import db
+    from backend.reports import monthly_user_stats, rollup_month
+
+    history = client.get('/user/dashboard?status=history&limit=500', headers=headers).json
+    everything = client.get('/user/dashboard?stream=1', headers=headers).json
+    summary = client.get('/user/summary', headers=headers).json['summary']
+    with app.app_context():
+        export = list(csv.reader(StringIO(b''.join(export_chunks(user_id)).decode())))[1:]
+        report = next(
+            (row.visits, round(row.spent, 2), row.favorite_lot)
+            for row in monthly_user_stats(rollup_month(datetime.utcnow()))
+            if row.id == user_id
+        )
+        db.session.remove()
+    return {
+        'history': sorted((r['reservation_id'], r['lot_name'], r['end_time'])
+                          for r in history['reservations']),
+        'all': sorted(r['reservation_id'] for r in everything['reservations']),
+        'summary': summary,
+        'export': sorted(row[:2] + row[3:] for row in export),
+        'report': report,
+    }
+
+
+def test_lot_delete_keeps_user_data(app, client, auth, seed):
+    dataset = seed(lots=2, spots_per_lot=5, users=2, history=3, active=0)
+    user_id, lot_id = dataset['user_ids'][0], dataset['lot_ids'][0]
+    user = auth(user_id)
+
+    # one booking that ends this month, so the summary and report have it
+    reservation_id = client.post('/user/assign', json={'lot_id': lot_id}, headers=user).json['reservation_id']
+    client.post('/user/reserve', json={'reservation_id': reservation_id, 'vehicle_number': 'T1'}, headers=user)
+    assert client.post('/user/release', json={'reservation_id': reservation_id}, headers=user).status_code == 200
+
+    before = user_views(app, client, user, user_id)
+    assert before['summary'] and before['report'][0]
+
+    resp = client.delete(f'/admin/lots/{lot_id}', headers=auth(dataset['admin_ids'][0], 'admin'))
+    assert resp.status_code == 200 and resp.json['archived_reservations']
+
+    assert user_views(app, client, user, user_id) == before
@@ -0,0 +1,13 @@
+# backend/tests/test_metrics.py
+"""A statement that fails must not leave its start time on the connection."""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+def test_failed_statement_does_not_leak_its_start(app, db):
+    with app.app_context(), db.engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM missing'))
+        assert conn.info['metrics_query_start'] == []
@@ -0,0 +1,95 @@
+# backend/tests/test_outbox.py
+"""The relay hands committed messages to Celery; one that keeps failing is given up on."""
+
+import pytest
+from kombu.exceptions import OperationalError
+
+from backend import outbox
+
+
+@pytest.fixture
+def messages(app, db):
+    def messages(*tasks):
+        with app.app_context():
+            rows = [outbox.enqueue_task(task, 1) for task in tasks]
+            db.session.commit()
+            return [row.id for row in rows]
+    return messages
+
+
+def fail_for(monkeypatch, exc, task):
+    sent = []
+
+    def publish(message):
+        if message.task == task:
+            raise exc
+        sent.append(message.id)
+    monkeypatch.setattr(outbox, 'publish', publish)
+    return sent
+
+
+def test_poison_message_is_skipped_then_failed(app, db, messages, monkeypatch):
+    from backend.models import OutboxMessage
+
+    bad, good = messages('bad', 'good')
+    sent = fail_for(monkeypatch, ValueError('boom'), 'bad')
+
+    with app.app_context():
+        assert outbox.relay_outbox() == (1, 1)
+        assert sent == [good]
+        for _ in range(outbox.MAX_ATTEMPTS - 1):
+            outbox.relay_outbox()
+        row = db.session.get(OutboxMessage, bad)
+        assert row.attempts == outbox.MAX_ATTEMPTS
+        assert row.failed_at is not None and row.sent_at is None
+        assert 'boom' in row.last_error
+
+        assert outbox.relay_outbox() == (0, 0)     # no longer picked up
+        assert outbox.requeue_failed() == 1
+        assert outbox.relay_outbox() == (0, 1)
+        db.session.remove()
+
+
+def test_broker_outage_stops_the_pass_without_counting(app, db, messages, monkeypatch):
+    from backend.models import OutboxMessage
+
+    first, second = messages('down', 'down')
+    fail_for(monkeypatch, OperationalError('no broker'), 'down')
+
+    with app.app_context():
+        for _ in range(outbox.MAX_ATTEMPTS + 1):
+            assert outbox.relay_outbox() == (0, 1)
+        rows = [db.session.get(OutboxMessage, i) for i in (first, second)]
+        assert [(r.attempts, r.failed_at) for r in rows] == [(0, None), (0, None)]
+        db.session.remove()
+
+
+def test_committed_booking_is_relayed_to_the_task(app, client, auth, seed):
+    import backend.tasks.background     # registers the task names  # noqa: F401
+    from backend.extensions import mail
+    from backend.models import OutboxMessage, User, db
+    from backend.tasks.background import RESERVATION_EMAILS
+
+    dataset = seed(lots=1, users=1, history=0, active=0)
+    user_id = dataset['user_ids'][0]
+    headers = auth(user_id)
+    resp = client.post('/user/assign', json={'lot_id': dataset['lot_ids'][0]}, headers=headers)
+    assert resp.status_code == 200, resp.json
+    resp = client.post('/user/reserve', json={'reservation_id': resp.json['reservation_id'],
+                                              'vehicle_number': 'KA01AB1234'}, headers=headers)
+    assert resp.status_code == 200, resp.json
+
+    with app.app_context():
+        email = db.session.get(User, user_id).email
+        [row] = OutboxMessage.query.all()
+        assert row.task == 'tasks.send_reservation_email' and row.sent_at is None
+
+        with mail.record_messages() as sent:
+            assert outbox.relay_outbox() == (1, 0)      # real publish, run eagerly
+        [message] = sent
+        assert message.recipients == [email]
+        assert message.subject == RESERVATION_EMAILS['booked'][0]
+
+        db.session.refresh(row)
+        assert row.sent_at is not None and row.attempts == 0
+        db.session.remove()
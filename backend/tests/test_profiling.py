@@ -0,0 +1,56 @@
+# backend/tests/test_profiling.py
+"""Profiling must not lock itself out or keep credentials from the request."""
+
+import pytest
+
+from backend import profiling
+
+
+class BrokenProfiler(profiling._CProfiler):
+    def start(self):
+        raise RuntimeError('profiler busy')
+
+
+@pytest.mark.parametrize('failure', ['make', 'start'])
+def test_failed_start_releases_the_lock(app, monkeypatch, failure):
+    def make_profiler():
+        if failure == 'make':
+            raise RuntimeError('no profiler')
+        return BrokenProfiler()
+    monkeypatch.setattr(profiling, 'make_profiler', make_profiler)
+
+    with app.app_context():
+        token = profiling.make_profile_token(1)
+    with app.test_request_context(headers={profiling.PROFILE_HEADER: token}):
+        with pytest.raises(RuntimeError):
+            profiling._start_profile()
+        assert 'profile' not in profiling.g
+
+    assert profiling._profiling.acquire(blocking=False)
+    profiling._profiling.release()
+
+
+def test_sidecar_keeps_no_query_values(app, db, seed, tmp_path, monkeypatch):
+    import json
+
+    from backend.export import make_export_token
+
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'PROFILER', 'cprofile')
+    user_id = seed(users=1, history=1, active=0)['user_ids'][0]
+    with app.app_context():
+        export_token = make_export_token(user_id)
+        profile_token = profiling.make_profile_token(1)
+
+    url = '/user/export-history/download'
+    query = {'token': export_token, profiling.PROFILE_PARAM: profile_token}
+    with app.test_request_context(url, query_string=query):
+        profiling._start_profile()
+        response = profiling._tag_response(app.full_dispatch_request())
+        response.get_data()
+        profiling._finish_profile(None)
+    assert response.status_code == 200
+
+    sidecar = (tmp_path / (response.headers[profiling.PROFILE_ID_HEADER] + '.json')).read_text()
+    assert json.loads(sidecar)['args'] == ['token']
+    assert export_token not in sidecar and profile_token not in sidecar
@@ -0,0 +1,344 @@
+# backend/tests/test_query_budgets.py
+"""
+Query budgets for every route and the heavy Celery tasks.
+
+Each route is driven once against a seeded database and once more after
+the data has grown FACTOR times. A route passes when it answers 2xx,
+stays within its declared @query_budget at both sizes (enforced, so an
+overrun fails with the offending statements), and its statement count
+did not grow with the data, which is what an N+1 regression breaks.
+Bodies are read inside the measured scope, so the queries a streamed
+response runs as it is consumed count as well.
+"""
+
+import cProfile
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.tests.conftest import counting_queries
+
+FACTOR = 3
+BASE_USERS = 20
+BASE_LOTS = 3
+BASE_SPOTS = 20
+BASE_HISTORY = 30      # finished reservations per user
+
+PROFILE_ID = '20260101T000000000000-00000000'
+
+
+def grow(admin_id, users, lots, spots, history):
+    """Add users, lots of `spots` spots, and `history` finished reservations per new user."""
+    from backend.app import insert_spot_range
+    from backend.models import db, User, ParkingLot, ParkingSpot, Reservation
+    from backend.reports import rebuild_monthly_rollup
+
+    tag = db.session.query(db.func.count(User.id)).scalar()
+    db.session.execute(db.insert(User), [{
+        'fullname': f'User {tag + i}', 'email': f'user-{tag + i}@example.com',
+        'password': 'x', 'address': '-', 'pincode': '000000', 'role': 'user',
+    } for i in range(users)])
+    lot_ids = []
+    for i in range(lots):
+        lot = ParkingLot(name=f'Lot {tag}-{i}', location='-', pincode='000000',
+                         price_per_hour=10.0, created_by=admin_id,
+                         total_spots=spots, available_spots=spots)
+        db.session.add(lot)
+        db.session.flush()
+        insert_spot_range(lot.id, 1, spots)
+        lot_ids.append(lot.id)
+
+    new_users = [uid for (uid,) in db.session.query(User.id).filter(User.id > tag + 1)]
+    spot_rows = db.session.query(ParkingSpot.id, ParkingSpot.lot_id).filter(
+        ParkingSpot.lot_id.in_(lot_ids)).all()
+    start = datetime.utcnow() - timedelta(days=20)
+    db.session.execute(db.insert(Reservation), [{
+        'user_id': uid, 'lot_id': spot_rows[(n + k) % len(spot_rows)].lot_id,
+        'spot_id': spot_rows[(n + k) % len(spot_rows)].id,
+        'start_time': start + timedelta(hours=k),
+        'end_time': start + timedelta(hours=k, minutes=30),
+        'duration_seconds': 1800, 'billed_hours': 1, 'cost': 10.0,
+        'vehicle_number': 'BENCH',
+    } for n, uid in enumerate(new_users) for k in range(history)])
+    rebuild_monthly_rollup()
+    db.session.commit()
+
+
+def grow_probe(probe_id, history):
+    """Add `history` finished reservations for the probe user."""
+    from backend.models import db, ParkingSpot, Reservation
+    from backend.reports import rebuild_monthly_rollup
+
+    spot = db.session.query(ParkingSpot.id, ParkingSpot.lot_id).first()
+    start = datetime.utcnow() - timedelta(days=10)
+    db.session.execute(db.insert(Reservation), [{
+        'user_id': probe_id, 'lot_id': spot.lot_id, 'spot_id': spot.id,
+        'start_time': start + timedelta(minutes=10 * k),
+        'end_time': start + timedelta(minutes=10 * k + 5),
+        'duration_seconds': 300, 'billed_hours': 1, 'cost': 10.0,
+        'vehicle_number': 'BENCH',
+    } for k in range(history)])
+    rebuild_monthly_rollup()
+    db.session.commit()
+
+
+def make_fixtures(admin_id, probe_id):
+    """Rows the mutating routes consume, created fresh for each pass."""
+    from backend.app import insert_spot_range, reserve_spot
+    from backend.models import db, ParkingLot, ParkingSpot
+
+    def lot(name, spots):
+        row = ParkingLot(name=name, location='-', pincode='000000', price_per_hour=10.0,
+                         created_by=admin_id, total_spots=spots, available_spots=spots)
+        db.session.add(row)
+        db.session.flush()
+        insert_spot_range(row.id, 1, spots)
+        return row.id
+
+    stamp = datetime.utcnow().strftime('%H%M%S%f')
+    fx = {
+        'lot':        lot(f'Probe {stamp}', 50),
+        'doomed_lot': lot(f'Doomed {stamp}', 50),
+    }
+    spots = (db.session.query(ParkingSpot.id)
+             .filter(ParkingSpot.lot_id == fx['lot'])
+             .order_by(ParkingSpot.spot_number.desc()).limit(3).all())
+    fx['free_spot'], fx['edit_spot'], fx['doomed_spot'] = (s.id for s in spots)
+
+    held, _ = reserve_spot(probe_id, fx['lot'])
+    to_confirm, _ = reserve_spot(probe_id, fx['lot'])
+    to_confirm_api, _ = reserve_spot(probe_id, fx['lot'])
+    to_release, _ = reserve_spot(probe_id, fx['lot'])
+    db.session.commit()
+    fx['held_spot'] = held.spot_id
+    fx['confirm'] = to_confirm.id
+    fx['confirm_api'] = to_confirm_api.id
+    fx['release'] = to_release.id
+    return fx
+
+
+def scenarios(fx, stamp):
+    """(endpoint, method, url, json, who) for every route."""
+    lot = fx['lot']
+    return [
+        ('home',                     'GET',    '/', None, None),
+        ('metrics',                  'GET',    '/metrics', None, None),
+        ('test_email',               'GET',    '/test-email', None, None),
+        ('register',                 'POST',   '/register', {
+            'fullname': 'New', 'email': f'new-{stamp}@example.com', 'password': 'x',
+            'address': '-', 'pincode': '000000'}, None),
+        ('login',                    'POST',   '/login', {'email': 'probe@example.com', 'password': 'probe'}, None),
+        ('create_parking_lot',       'POST',   '/admin/lots', {
+            'name': f'Created {stamp}', 'address': '-', 'pincode': '0', 'price': 5, 'maxSpots': 100}, 'admin'),
+        ('create_spot',              'POST',   f'/admin/lots/{lot}/spots', {'number': 1000}, 'admin'),
+        ('create_spot_range',        'POST',   f'/admin/lots/{lot}/spots/range', {'count': 100}, 'admin'),
+        ('get_spot_details',         'GET',    f'/admin/lots/{lot}/spot/{fx["held_spot"]}', None, 'admin'),
+        ('edit_spot',                'PUT',    f'/admin/lots/{lot}/spots/{fx["edit_spot"]}', {'number': 5000}, 'admin'),
+        ('delete_spot',              'DELETE', f'/admin/lots/{lot}/spots/{fx["doomed_spot"]}', None, 'admin'),
+        ('delete_parking_spot',      'DELETE', f'/admin/spot/{fx["free_spot"]}', None, 'admin'),
+        ('update_parking_lot',       'PUT',    f'/admin/lots/{lot}', {'price_per_hour': 12, 'maxSpots': 40}, 'admin'),
+        ('admin_dashboard',          'GET',    '/admin/dashboard', None, 'admin'),
+        ('admin_bookings',           'GET',    '/admin/bookings?limit=500', None, 'admin'),
+        ('admin_bookings_stream',    'GET',    '/admin/bookings?stream=1', None, 'admin'),
+        ('admin_list_users',         'GET',    '/admin/users', None, 'admin'),
+        ('admin_list_users_stream',  'GET',    '/admin/users?stream=1', None, 'admin'),
+        ('admin_slow_queries',       'GET',    '/admin/slow-queries', None, 'admin'),
+        ('admin_reset_slow_queries', 'DELETE', '/admin/slow-queries', None, 'admin'),
+        ('admin_profile_token',      'POST',   '/admin/profiles/token', None, 'admin'),
+        ('admin_list_profiles',      'GET',    '/admin/profiles', None, 'admin'),
+        ('admin_download_profile',   'GET',    f'/admin/profiles/{PROFILE_ID}', None, 'admin'),
+        ('admin_update_profile',     'PUT',    '/admin/profile', {'password': 'admin'}, 'admin'),
+        ('delete_parking_lot',       'DELETE', f'/admin/lots/{fx["doomed_lot"]}', None, 'admin'),
+        ('get_all_lots',             'GET',    '/user/lots', None, 'user'),
+        ('assign_spot',              'POST',   '/user/assign', {'lot_id': lot}, 'user'),
+        ('user_confirm_reservation', 'POST',   '/user/reserve', {
+            'reservation_id': fx['confirm'], 'vehicle_number': 'KA01'}, 'user'),
+        ('api_confirm_reservation',  'POST',   '/api/reservations/confirm', {
+            'reservation_id': fx['confirm_api'], 'vehicle_number': 'KA01'}, 'user'),
+        ('release_reservation',      'POST',   '/user/release', {'reservation_id': fx['release']}, 'user'),
+        ('user_dashboard',           'GET',    '/user/dashboard', None, 'user'),
+        ('user_dashboard_stream',    'GET',    '/user/dashboard?stream=1', None, 'user'),
+        ('user_summary',             'GET',    '/user/summary', None, 'user'),
+        ('user_get_profile',         'GET',    '/user/profile', None, 'user'),
+        ('user_update_profile',      'PUT',    '/user/profile', {
+            'fullname': 'Probe', 'email': 'probe@example.com', 'address': '-', 'pincode': '000000'}, 'user'),
+        ('export_history',           'POST',   '/user/export-history', None, 'user'),
+        ('download_export',          'GET',    '/user/export-history/download?token={export_token}', None, None),
+    ]
+
+
+SCENARIOS = [name for name, *_ in scenarios(defaultdict(int), '')]
+TASKS = ['tasks.export_reservations_to_csv', 'tasks.generate_monthly_reports']
+
+
+def write_profile(directory):
+    """A real cProfile dump plus sidecar, for the download route to serve."""
+    os.makedirs(directory, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    sum(range(100))
+    profiler.disable()
+    profiler.dump_stats(os.path.join(directory, PROFILE_ID + '.prof'))
+    with open(os.path.join(directory, PROFILE_ID + '.json'), 'w', encoding='utf-8') as fh:
+        json.dump({'id': PROFILE_ID, 'kind': 'cprofile'}, fh)
+
+
+def measure_routes(app, client, headers, admin_id, probe_id):
+    from backend.export import make_export_token
+    from backend.identity import identity_cache
+    from backend.models import db
+    from backend.query_budget import QueryBudgetExceeded
+
+    with app.app_context():
+        fx = make_fixtures(admin_id, probe_id)
+        export_token = make_export_token(probe_id)
+
+    counts = {}
+    stamp = datetime.utcnow().strftime('%H%M%S%f')
+    for name, method, url, body, who in scenarios(fx, stamp):
+        url = url.format(export_token=export_token)
+        identity_cache.clear()   # count the cold-cache user lookup too
+        status = error = None
+        with counting_queries() as seen:
+            try:
+                resp = client.open(url, method=method, json=body, headers=headers.get(who, {}))
+                try:
+                    # streamed bodies run their queries as they are read
+                    resp.get_data()
+                finally:
+                    resp.close()
+                status = resp.status_code
+            except QueryBudgetExceeded as exc:
+                error = str(exc)
+        counts[name] = {'queries': seen.count, 'status': status, 'error': error}
+        with app.app_context():
+            db.session.remove()
+    return counts
+
+
+def measure_tasks(probe_id, out):
+    from backend.query_budget import QueryBudgetExceeded
+    from backend.tasks.background import export_reservations_to_csv, generate_monthly_reports
+
+    calls = {
+        'tasks.export_reservations_to_csv':
+            lambda: export_reservations_to_csv.apply(args=(probe_id,)).get(),
+        'tasks.generate_monthly_reports':
+            lambda: generate_monthly_reports.apply(kwargs={'dry_run_dir': out}).get(),
+    }
+    counts = {}
+    for name in TASKS:
+        error = None
+        with counting_queries() as seen:
+            try:
+                calls[name]()
+            except QueryBudgetExceeded as exc:
+                error = str(exc)
+        counts[name] = {'queries': seen.count, 'error': error}
+    return counts
+
+
+@pytest.fixture(scope='module')
+def measured(app, tmp_path_factory):
+    """{'small': counts, 'large': counts} for every scenario and task."""
+    from flask_jwt_extended import create_access_token
+    from werkzeug.security import generate_password_hash
+    from backend.identity import identity_cache
+    from backend.models import db, User
+
+    profiles = str(tmp_path_factory.mktemp('profiles'))
+    write_profile(profiles)
+    saved = {key: app.config.get(key) for key in ('PROFILING_ENABLED', 'PROFILE_DIR')}
+    app.config.update(PROFILING_ENABLED=True, PROFILE_DIR=profiles)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        admin = User(fullname='Bench Admin', email='admin@example.com',
+                     password=generate_password_hash('admin'), address='-',
+                     pincode='000000', role='admin')
+        probe = User(fullname='Probe', email='probe@example.com',
+                     password=generate_password_hash('probe'), address='-',
+                     pincode='000000', role='user')
+        db.session.add_all([admin, probe])
+        db.session.commit()
+        admin_id, probe_id = admin.id, probe.id
+        headers = {
+            'admin': {'Authorization': 'Bearer ' + create_access_token(
+                identity=str(admin_id), additional_claims={'role': 'admin'})},
+            'user': {'Authorization': 'Bearer ' + create_access_token(
+                identity=str(probe_id), additional_claims={'role': 'user'})},
+        }
+    identity_cache.clear()
+
+    client = app.test_client()
+    client.get('/')   # let the once-per-process hooks run first
+
+    sizes = {}
+    try:
+        for label, mult in (('small', 1), ('large', FACTOR)):
+            with app.app_context():
+                grow(admin_id, BASE_USERS * mult, BASE_LOTS * mult, BASE_SPOTS * mult, BASE_HISTORY)
+                # the probe user's own history grows too
+                grow_probe(probe_id, BASE_HISTORY * mult)
+            sizes[label] = measure_routes(app, client, headers, admin_id, probe_id)
+            with app.app_context():
+                sizes[label].update(measure_tasks(probe_id, str(tmp_path_factory.mktemp('reports'))))
+                db.session.remove()
+    finally:
+        app.config.update(saved)
+    return sizes
+
+
+def budget_of(app, name):
+    from backend.tasks.background import TASK_QUERY_BUDGETS
+
+    if name in TASK_QUERY_BUDGETS:
+        return TASK_QUERY_BUDGETS[name]
+    endpoint = name[:-len('_stream')] if name.endswith('_stream') else name
+    return getattr(app.view_functions[endpoint], 'query_budget', None)
+
+
+@pytest.mark.parametrize('name', SCENARIOS + TASKS)
+def test_query_budget(app, measured, name):
+    budget = budget_of(app, name)
+    assert budget is not None, f'{name} declares no query budget'
+    small, large = measured['small'][name], measured['large'][name]
+    for size in (small, large):
+        assert not size['error'], size['error']
+        if name in SCENARIOS:
+            assert 200 <= size['status'] < 300, f"{name} answered {size['status']}"
+        assert size['queries'] <= budget
+    assert small['queries'] == large['queries'], (
+        f"{name}: {small['queries']} statements on the small dataset, "
+        f"{large['queries']} after growing it {FACTOR}x"
+    )
+
+
+def test_every_route_is_budgeted_and_exercised(app):
+    routes = {endpoint for endpoint in app.view_functions if endpoint != 'static'}
+    assert routes - set(SCENARIOS) == set()
+    assert {r for r in routes if getattr(app.view_functions[r], 'query_budget', None) is None} == set()
+
+
+def test_streamed_body_counts_against_the_view_budget(app, db):
+    from flask import Response, stream_with_context
+    from sqlalchemy import text
+    from backend.query_budget import QueryBudgetExceeded, query_budget
+
+    @query_budget(2, 'streaming_view')
+    def view():
+        db.session.execute(text('SELECT 1'))
+
+        def rows():
+            for _ in range(3):
+                yield str(db.session.execute(text('SELECT 1')).scalar())
+        return Response(stream_with_context(rows()))
+
+    with app.test_request_context():
+        response = view()
+    with pytest.raises(QueryBudgetExceeded, match='streaming_view ran 4 SQL statements'):
+        b''.join(response.response)
@@ -0,0 +1,83 @@
+# backend/tests/test_query_plans.py
+"""
+Every statement behind the hot routes must be answered from an index:
+the routes run for real and each statement they send is explained.
+"""
+
+import pytest
+
+from backend.query_plans import capture_plans, read_routes, route_plans, unexpected_scans
+
+
+@pytest.fixture
+def dataset(seed):
+    return seed(admins=1, lots=3, spots_per_lot=20, users=6, history=10, active=3)
+
+
+def assert_indexed(endpoint, status, captured):
+    assert 200 <= status < 300, f'{endpoint} answered {status}'
+    assert captured, f'{endpoint} ran no SQL'
+    scans = unexpected_scans(endpoint, captured)
+    assert not scans, f'{endpoint} scans {scans}'
+
+
+def held_spot(app, dataset):
+    from backend.models import db, Reservation
+
+    lot_id, spot_id = dataset['held_spots'][0]
+    with app.app_context():
+        holder = db.session.query(Reservation.user_id).filter_by(spot_id=spot_id, end_time=None).scalar()
+        db.session.remove()
+    return lot_id, spot_id, holder
+
+
+@pytest.mark.parametrize('endpoint', [route[0] for route in read_routes(0, 0)])
+def test_read_route_plans(app, client, auth, dataset, endpoint):
+    lot_id, spot_id, holder = held_spot(app, dataset)
+    headers = {'user': auth(holder), 'admin': auth(dataset['admin_ids'][0], 'admin')}
+    _, method, url, who = next(r for r in read_routes(lot_id, spot_id) if r[0] == endpoint)
+
+    status, captured = route_plans(client, method, url, headers=headers[who])
+    assert_indexed(endpoint, status, captured)
+
+
+def test_booking_flow_plans(client, auth, dataset):
+    user = auth(dataset['user_ids'][-1])
+    lot_id = dataset['lot_ids'][0]
+
+    status, captured = route_plans(client, 'POST', '/user/assign', {'lot_id': lot_id}, user)
+    assert_indexed('assign_spot', status, captured)
+    reservation_id = client.post('/user/assign', json={'lot_id': lot_id}, headers=user).json['reservation_id']
+
+    status, captured = route_plans(client, 'POST', '/user/reserve',
+                                   {'reservation_id': reservation_id, 'vehicle_number': 'T1'}, user)
+    assert_indexed('user_confirm_reservation', status, captured)
+
+    status, captured = route_plans(client, 'POST', '/user/release',
+                                   {'reservation_id': reservation_id}, user)
+    assert_indexed('release_reservation', status, captured)
+
+
+def test_spot_admin_plans(client, auth, dataset):
+    admin = auth(dataset['admin_ids'][0], 'admin')
+    lot_id = dataset['lot_ids'][0]
+
+    status, captured = route_plans(client, 'POST', f'/admin/lots/{lot_id}/spots', {'number': 500}, admin)
+    assert_indexed('create_spot', status, captured)
+
+    status, captured = route_plans(client, 'POST', f'/admin/lots/{lot_id}/spots/range', {'count': 5}, admin)
+    assert_indexed('create_spot_range', status, captured)
+
+    # back to 20: drops the six spots just added, the only ones never booked
+    status, captured = route_plans(client, 'PUT', f'/admin/lots/{lot_id}', {'maxSpots': 20}, admin)
+    assert_indexed('update_parking_lot', status, captured)
+
+
+def test_monthly_report_plans(app, dataset, tmp_path):
+    from backend.tasks.background import generate_monthly_reports
+
+    with app.app_context(), capture_plans() as captured:
+        generate_monthly_reports.apply(kwargs={'dry_run_dir': str(tmp_path)}).get()
+    assert captured
+    scans = unexpected_scans('generate_monthly_reports', captured)
+    assert not scans, f'monthly reports scan {scans}'
@@ -0,0 +1,62 @@
+# backend/tests/test_release.py
+"""Releasing a reservation frees its spot and is counted exactly once."""
+
+from datetime import datetime
+
+
+def state(db, reservation_id):
+    from backend.models import ParkingLot, Reservation, ReservationMonthlyRollup
+
+    reservation = db.session.get(Reservation, reservation_id)
+    lot = db.session.get(ParkingLot, reservation.lot_id)
+    rollups = [(r.visits, r.total_seconds, r.total_cost)
+               for r in ReservationMonthlyRollup.query.filter_by(user_id=reservation.user_id).all()]
+    return lot.available_spots, sorted(rollups)
+
+
+def active_reservation(app, db, seed):
+    from backend.models import Reservation
+
+    seed(users=1, history=2, active=1)
+    with app.app_context():
+        reservation = Reservation.query.filter(Reservation.end_time.is_(None)).one()
+        ids = reservation.id, reservation.user_id
+        db.session.remove()
+    return ids
+
+
+def test_second_release_changes_nothing(app, db, client, auth, seed):
+    reservation_id, user_id = active_reservation(app, db, seed)
+    headers = auth(user_id)
+
+    resp = client.post('/user/release', json={'reservation_id': reservation_id}, headers=headers)
+    assert resp.status_code == 200
+    with app.app_context():
+        after_first = state(db, reservation_id)
+        db.session.remove()
+
+    resp = client.post('/user/release', json={'reservation_id': reservation_id}, headers=headers)
+    assert resp.status_code == 409
+    with app.app_context():
+        assert state(db, reservation_id) == after_first
+        db.session.remove()
+
+
+def test_release_racing_a_stale_read_changes_nothing(app, db, client, auth, seed):
+    from backend.app import close_reservation
+    from backend.models import Reservation
+
+    reservation_id, user_id = active_reservation(app, db, seed)
+    with app.app_context():
+        stale = db.session.get(Reservation, reservation_id)     # read before the other release
+        assert stale.end_time is None
+
+        resp = client.post('/user/release', json={'reservation_id': reservation_id}, headers=auth(user_id))
+        assert resp.status_code == 200
+        db.session.expire_all()
+        after_release = state(db, reservation_id)
+
+        assert close_reservation(stale, datetime.utcnow(), 10.0) is False
+        db.session.commit()
+        assert state(db, reservation_id) == after_release
+        db.session.remove()
@@ -0,0 +1,39 @@
+# backend/tests/test_reports.py
+"""Releases keep the monthly rollup equal to a rebuild, with or without ON CONFLICT."""
+
+import pytest
+
+from backend import reports
+
+
+def rollup_rows(db):
+    from backend.models import ReservationMonthlyRollup as R
+
+    return sorted(
+        (r.user_id, r.month, r.lot_id, r.visits, r.total_seconds, round(r.total_cost, 2))
+        for r in R.query.all()
+    )
+
+
+@pytest.mark.parametrize('upsert', ['on_conflict', 'update_then_insert'])
+def test_release_keeps_rollup_in_step(app, client, auth, seed, monkeypatch, upsert):
+    from backend.models import db, Reservation
+
+    if upsert == 'update_then_insert':
+        monkeypatch.setattr(reports, 'UPSERT_INSERTS', {})
+    dataset = seed(users=4, history=3, active=4)
+    with app.app_context():
+        open_rows = [(r.id, r.user_id) for r in Reservation.query.filter_by(end_time=None)]
+        db.session.remove()
+    assert open_rows
+
+    for reservation_id, user_id in open_rows:
+        resp = client.post('/user/release', json={'reservation_id': reservation_id},
+                           headers=auth(user_id))
+        assert resp.status_code == 200, resp.json
+
+    with app.app_context():
+        kept = rollup_rows(db)
+        reports.rebuild_monthly_rollup()
+        assert kept == rollup_rows(db)
+        db.session.rollback()
@@ -0,0 +1,51 @@
+# backend/tests/test_resize_lot.py
+"""Resizing a lot: growth is capped per request; shrinking keeps booked spots."""
+
+
+def lot_state(app, lot_id):
+    from backend.models import db, ParkingSpot, Reservation
+
+    with app.app_context():
+        spots = {s.id for s in ParkingSpot.query.filter_by(lot_id=lot_id)}
+        booked = {r.spot_id for r in Reservation.query.filter_by(lot_id=lot_id)}
+        reserved = {s.id for s in ParkingSpot.query.filter_by(lot_id=lot_id, is_reserved=True)}
+        db.session.remove()
+    return spots, booked, reserved
+
+
+def test_shrink_keeps_spots_with_bookings(app, client, auth, seed):
+    dataset = seed(lots=1, spots_per_lot=20, users=4, history=2, active=1)
+    admin = auth(dataset['admin_ids'][0], 'admin')
+    lot_id = dataset['lot_ids'][0]
+    spots, booked, reserved = lot_state(app, lot_id)
+    unused = spots - booked - reserved
+    assert booked and unused
+
+    resp = client.put(f'/admin/lots/{lot_id}', json={'maxSpots': len(spots) - len(unused) - 1},
+                      headers=admin)
+    assert resp.status_code == 409
+    assert lot_state(app, lot_id)[0] == spots
+
+    resp = client.put(f'/admin/lots/{lot_id}', json={'maxSpots': len(spots) - len(unused)},
+                      headers=admin)
+    assert resp.status_code == 200, resp.json
+    assert lot_state(app, lot_id)[0] == spots - unused
+
+
+def test_growth_per_request_is_capped(app, client, auth, seed):
+    from backend.app import MAX_SPOTS_PER_REQUEST
+
+    dataset = seed(lots=1, spots_per_lot=5, users=1, history=0, active=0)
+    admin = auth(dataset['admin_ids'][0], 'admin')
+    lot_id = dataset['lot_ids'][0]
+    spots = lot_state(app, lot_id)[0]
+
+    resp = client.put(f'/admin/lots/{lot_id}', json={'maxSpots': len(spots) + MAX_SPOTS_PER_REQUEST + 1},
+                      headers=admin)
+    assert resp.status_code == 400
+    assert lot_state(app, lot_id)[0] == spots
+
+    resp = client.put(f'/admin/lots/{lot_id}', json={'maxSpots': len(spots) + MAX_SPOTS_PER_REQUEST},
+                      headers=admin)
+    assert resp.status_code == 200, resp.json
+    assert len(lot_state(app, lot_id)[0]) == len(spots) + MAX_SPOTS_PER_REQUEST
@@ -0,0 +1,48 @@
+# backend/tests/test_slow_queries.py
+"""The slow-query log keeps no parameter values unless asked, and never credentials."""
+
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from backend.slow_queries import REDACTED, init_slow_query_log, slow_query_log
+
+
+@pytest.fixture
+def engine():
+    def engine(**config):
+        app = Flask(__name__)
+        app.config.update(SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD_MS=0, **config)
+        db = SimpleNamespace(engine=create_engine('sqlite://'))
+        init_slow_query_log(app, db)
+        slow_query_log.reset()
+        return db.engine
+    yield engine
+    slow_query_log.reset()
+
+
+def last_params(engine):
+    with engine.connect() as conn:
+        conn.execute(text('SELECT :email, :password'), {'email': 'a@example.com', 'password': 'hash'})
+    [entry] = slow_query_log.entries.values()
+    return entry['last']['params']
+
+
+def test_parameters_are_off_by_default(engine):
+    assert last_params(engine()) is None
+
+
+def test_opt_in_parameters_redact_passwords(engine):
+    params = last_params(engine(SLOW_QUERY_LOG_PARAMS=True))
+    assert 'a@example.com' in params and REDACTED in params
+    assert 'hash' not in params
+
+
+def test_failed_statement_does_not_leak_its_start(engine):
+    with engine().connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM missing'))
+        assert conn.info['slow_query_start'] == []